@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Concurrent prompt load on the asyncio backend (src/qgis_mcp/async_server.py).
+
+Runs offline: the protocol-compatible FakePlugin (fake_plugin.py) serves
+synthetic layers in-process and a fake AsyncOpenAI client answers after a fixed delay, standing in for a
+slow LLM round trip.  Every prompt is distinct, so each one misses the
+fast path and the intent cache and holds an LLM call open.  The script
+reports how many prompts were in flight at once, the latency percentiles
+and the throughput.
+
+    python benchmarks/async_load.py --prompts 1000 --concurrency 500 --llm-latency 1.0
+
+With thread-per-request serving, concurrency is capped by the worker pool
+(waitress defaults to 4 threads), so the same load would take roughly
+prompts * llm_latency / threads seconds.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+from types import SimpleNamespace
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.join(HERE, "..", "src", "qgis_mcp"))
+os.environ.setdefault("INTENT_CACHE_DB", "")
+
+import uvicorn
+
+from async_server import AsyncQGISAutomation, AsyncQgisConnection, create_app
+from fake_plugin import FakePlugin
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def post_json(reader, writer, path, body):
+    """One HTTP/1.1 request on a kept-alive connection; returns (status code, decoded body)"""
+    payload = json.dumps(body).encode('utf-8')
+    writer.write(
+        f"POST {path} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(payload)}\r\n\r\n".encode('ascii') + payload
+    )
+    await writer.drain()
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode('latin-1').split("\r\n")
+    headers = dict(line.split(": ", 1) for line in lines[1:] if ": " in line)
+    length = int({key.lower(): value for key, value in headers.items()}["content-length"])
+    return int(lines[0].split()[1]), json.loads(await reader.readexactly(length))
+
+
+class FakeCompletions:
+    """AsyncOpenAI stand-in that takes a fixed time per call and counts calls in flight"""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.in_flight = 0
+        self.peak = 0
+
+    async def create(self, **kwargs):
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency)
+        finally:
+            self.in_flight -= 1
+        content = json.dumps({"command": "get_layer_features", "params": {"layer_id": "points_0", "limit": 5}})
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+async def run(args):
+    plugin = FakePlugin(port=args.plugin_port, layers=2, features=1000).start()
+    completions = FakeCompletions(args.llm_latency)
+    openai_client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    app = create_app(lambda: AsyncQGISAutomation(
+        openai_client=openai_client,
+        qgis=AsyncQgisConnection(port=plugin.port)
+    ))
+    server = uvicorn.Server(uvicorn.Config(
+        app, host="127.0.0.1", port=args.port, log_level="warning", backlog=4096
+    ))
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+
+    # Each worker keeps one connection and sends its share of the prompts back to back
+    prompts = iter(range(args.prompts))
+    latencies = []
+    errors = 0
+
+    async def worker():
+        nonlocal errors
+        reader, writer = await asyncio.open_connection("127.0.0.1", args.port)
+        for index in prompts:
+            started = time.perf_counter()
+            code, result = await post_json(reader, writer, "/api/command", {"prompt": f"buffer points 0 by {index} metres"})
+            latencies.append(time.perf_counter() - started)
+            if code != 200 or result.get("status") != "success":
+                errors += 1
+        writer.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+    routes = app.state.status.automation.route_counts
+
+    server.should_exit = True
+    await serving
+    plugin.stop()
+
+    print(f"prompts               {args.prompts}")
+    print(f"client concurrency    {args.concurrency}")
+    print(f"peak LLM calls open   {completions.peak}")
+    print(f"LLM latency           {args.llm_latency * 1000:.0f} ms")
+    print(f"errors                {errors}")
+    print(f"routes                {routes}")
+    print(f"elapsed               {elapsed:.2f} s")
+    print(f"throughput            {args.prompts / elapsed:.1f} prompts/s")
+    for pct in (50, 95, 99):
+        print(f"p{pct:<20} {percentile(latencies, pct) * 1000:.0f} ms")
+    print(f"mean                  {statistics.mean(latencies) * 1000:.0f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--prompts", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=500, help="prompts in flight at once")
+    parser.add_argument("--llm-latency", type=float, default=1.0, help="seconds per fake OpenAI call")
+    parser.add_argument("--port", type=int, default=9890, help="HTTP port of the backend under test")
+    parser.add_argument("--plugin-port", type=int, default=0, help="port of the fake plugin (0 picks a free one)")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
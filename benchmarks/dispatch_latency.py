@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Round-trip latency of the QGIS MCP plugin in timer polling vs event-driven dispatch.
+
+Start one plugin server per mode from the QGIS Python console, e.g.
+
+    from qgis_mcp_plugin.qgis_mcp_plugin import QgisMCPServer
+    poll = QgisMCPServer(port=9877, dispatch="poll"); poll.start()
+    notifier = QgisMCPServer(port=9878, dispatch="notifier"); notifier.start()
+
+then run this script from a shell:
+
+    python benchmarks/dispatch_latency.py poll=localhost:9877 notifier=localhost:9878
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "qgis_mcp"))
+
+from qgis_socket_client import QgisMCPClient
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def measure(host, port, count, command):
+    """Time ``count`` sequential round trips of ``command`` and return the samples in ms"""
+    client = QgisMCPClient(host=host, port=port)
+    if not client.connect():
+        raise SystemExit(f"Could not connect to {host}:{port}")
+    try:
+        client.send_command(command)  # warm up
+        samples = []
+        for _ in range(count):
+            start = time.perf_counter()
+            response = client.send_command(command)
+            samples.append((time.perf_counter() - start) * 1000)
+            if not response or response.get("status") != "success":
+                raise SystemExit(f"Unexpected response from {host}:{port}: {response}")
+        return samples
+    finally:
+        client.disconnect()
+
+
+def parse_target(value):
+    label, _, address = value.partition("=")
+    host, _, port = address.rpartition(":")
+    if not label or not port:
+        raise argparse.ArgumentTypeError(f"Expected label=host:port, got {value!r}")
+    return label, host or "localhost", int(port)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("targets", nargs="+", type=parse_target, help="label=host:port of a running plugin server")
+    parser.add_argument("-n", "--count", type=int, default=200, help="round trips per target")
+    parser.add_argument("--command", default="ping", help="command to time")
+    args = parser.parse_args()
+
+    print(f"{'mode':<12}{'mean':>10}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}   (ms, {args.count} x {args.command})")
+    for label, host, port in args.targets:
+        samples = measure(host, port, args.count, args.command)
+        print(f"{label:<12}{statistics.mean(samples):>10.2f}{percentile(samples, 50):>10.2f}"
+              f"{percentile(samples, 95):>10.2f}{percentile(samples, 99):>10.2f}{max(samples):>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+End-to-end latency and throughput of the backend-to-plugin path, offline.
+
+Starts the protocol-compatible FakePlugin (fake_plugin.py) with synthetic
+layers, then drives it at a fixed concurrency through one or both of:
+
+  client  QgisMCPClient connections straight to the plugin socket
+  api     /api/command on the Flask backend (served by waitress in-process),
+          with the OpenAI client replaced by a stub that answers after
+          --llm-latency seconds
+
+and reports p50/p95/p99 latency, throughput and bytes per command type,
+plus the traffic the plugin saw.  Nothing needs QGIS, an API key or the
+network.
+
+    python benchmarks/end_to_end.py --target both --requests 2000 --concurrency 8 \\
+        --features 50000 --delay get_layer_features=2 --llm-latency 0.05
+
+Prompts are unique per request by default, so every /api/command goes to
+the (stubbed) LLM; --repeat-prompts reuses one prompt per command type to
+measure the intent cache instead.
+"""
+import argparse
+import http.client
+import json
+import logging
+import os
+import statistics
+import sys
+import threading
+import time
+from collections import defaultdict
+from types import SimpleNamespace
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.join(HERE, "..", "src", "qgis_mcp"))
+os.environ.setdefault("INTENT_CACHE_DB", "")
+os.environ.setdefault("OPENAI_API_KEY", "sk-offline-benchmark")
+
+from fake_plugin import FakePlugin, parse_delays
+from qgis_socket_client import QgisMCPClient
+
+DEFAULT_MIX = ["get_layers=1", "get_layer_features=3", "aggregate=1", "spatial_query=2", "ping=1"]
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def command_params(command, page_size):
+    """Parameters sent for each command type of the mix"""
+    return {
+        "get_layer_features": {"layer_id": "points_0", "limit": page_size},
+        "aggregate": {"layer_id": "points_0", "fields": ["population"]},
+        "spatial_query": {"layer_id": "points_0", "bbox": [-10, -10, 10, 10], "limit": 1000},
+        "render_map": {"width": 800, "height": 600}
+    }.get(command, {})
+
+
+def parse_mix(items):
+    """"command=weight" pairs into the repeating command sequence"""
+    sequence = []
+    for item in items:
+        command, _, weight = item.partition("=")
+        sequence += [command] * int(weight or 1)
+    return sequence
+
+
+class Recorder:
+    """Latency, errors and bytes per command type, shared by the worker threads"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.bytes = defaultdict(int)
+
+    def add(self, command, elapsed, ok, size):
+        with self.lock:
+            self.latencies[command].append(elapsed)
+            self.bytes[command] += size
+            if not ok:
+                self.errors[command] += 1
+
+
+def run_workers(total, concurrency, worker):
+    """Call worker(index, state) for every request index from `concurrency` threads; returns elapsed seconds
+
+    state is a dict private to each thread, for its connection; a "close"
+    entry is called when the thread runs out of requests.
+    """
+    counter = iter(range(total))
+    lock = threading.Lock()
+
+    def loop():
+        state = {}
+        while True:
+            with lock:
+                index = next(counter, None)
+            if index is None:
+                break
+            worker(index, state)
+        if "close" in state:
+            state["close"]()
+
+    threads = [threading.Thread(target=loop) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started
+
+
+def bench_client(plugin, args, mix):
+    recorder = Recorder()
+
+    def worker(index, state):
+        if "client" not in state:
+            client = QgisMCPClient(port=plugin.port)
+            if not client.connect():
+                raise SystemExit("Could not connect to the fake plugin")
+            state["client"] = client
+            state["close"] = client.disconnect
+        command = mix[index % len(mix)]
+        started = time.perf_counter()
+        response = state["client"].send_command(command, command_params(command, args.page_size))
+        elapsed = time.perf_counter() - started
+        if not response:
+            recorder.add(command, elapsed, False, 0)
+            return
+        body = response.pop("body", None)
+        size = len(json.dumps(response)) + (len(body) if body is not None else 0)
+        recorder.add(command, elapsed, response.get("status") == "success", size)
+
+    return recorder, run_workers(args.requests, args.concurrency, worker)
+
+
+class StubCompletions:
+    """OpenAI chat.completions stand-in: returns the command named in the prompt after a fixed delay"""
+
+    def __init__(self, latency, page_size):
+        self.latency = latency
+        self.page_size = page_size
+
+    def create(self, messages, **kwargs):
+        time.sleep(self.latency)
+        command = messages[-1]["content"].rsplit(" ", 1)[-1]
+        content = json.dumps({"command": command, "params": command_params(command, self.page_size)})
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+def bench_api(plugin, args, mix):
+    # Importing the server starts its status monitor; keep its connection noise out of the report
+    logging.disable(logging.CRITICAL)
+    import qgis_mcp_server
+    from waitress import create_server
+    logging.disable(logging.NOTSET)
+    logging.getLogger().setLevel(getattr(logging, args.log_level))
+    logging.getLogger("waitress.queue").setLevel(logging.ERROR)
+
+    automation = qgis_mcp_server.status.automation
+    automation.openai_client = SimpleNamespace(chat=SimpleNamespace(
+        completions=StubCompletions(args.llm_latency, args.page_size)))
+    # The layer watcher reads the pool's address on every reconnect, so it follows the fake plugin
+    automation.qgis = qgis_mcp_server.QgisConnectionPool(port=plugin.port, size=args.concurrency)
+    automation.qgis.connect()
+    deadline = time.monotonic() + 10
+    while not automation.layer_index.ready and time.monotonic() < deadline:
+        time.sleep(0.1)
+
+    server = create_server(qgis_mcp_server.app, host="127.0.0.1", port=args.port, threads=args.concurrency)
+    threading.Thread(target=server.run, daemon=True).start()
+    recorder = Recorder()
+
+    def worker(index, state):
+        if "http" not in state:
+            state["http"] = http.client.HTTPConnection("127.0.0.1", args.port, timeout=120)
+            state["close"] = state["http"].close
+        command = mix[index % len(mix)]
+        prompt = f"bench {command}" if args.repeat_prompts else f"bench {index} {command}"
+        started = time.perf_counter()
+        state["http"].request("POST", "/api/command", body=json.dumps({"prompt": prompt}),
+                              headers={"Content-Type": "application/json"})
+        response = state["http"].getresponse()
+        body = response.read()
+        elapsed = time.perf_counter() - started
+        ok = response.status == 200 and json.loads(body).get("status") == "success"
+        recorder.add(command, elapsed, ok, len(body))
+
+    # The server thread is a daemon and goes away with the process
+    elapsed = run_workers(args.requests, args.concurrency, worker)
+    return recorder, elapsed, dict(automation.route_counts), automation.layer_index.ready
+
+
+def report(title, recorder, elapsed, size_label):
+    total = sum(len(samples) for samples in recorder.latencies.values())
+    print(f"\n{title}: {total} requests in {elapsed:.2f} s, {total / elapsed:.1f} requests/s")
+    print(f"{'command':<20} {'n':>6} {'errors':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'mean ms':>8} {size_label:>12}")
+    for command, samples in sorted(recorder.latencies.items()):
+        print(f"{command:<20} {len(samples):>6} {recorder.errors[command]:>6} "
+              f"{percentile(samples, 50) * 1000:>8.2f} {percentile(samples, 95) * 1000:>8.2f} "
+              f"{percentile(samples, 99) * 1000:>8.2f} {statistics.mean(samples) * 1000:>8.2f} "
+              f"{recorder.bytes[command] / len(samples):>12.0f}")
+
+
+def report_plugin(plugin):
+    print("\nplugin traffic")
+    print(f"{'command':<20} {'n':>6} {'in B/cmd':>10} {'out B/cmd':>12} {'out MB':>8}")
+    for command, stats in sorted(plugin.stats.items()):
+        count = stats["commands"]
+        print(f"{command:<20} {count:>6} {stats['bytes_in'] / count:>10.0f} {stats['bytes_out'] / count:>12.0f} "
+              f"{stats['bytes_out'] / 1e6:>8.2f}")
+    plugin.stats.clear()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", choices=("client", "api", "both"), default="both")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--mix", nargs="+", default=DEFAULT_MIX, metavar="COMMAND=WEIGHT")
+    parser.add_argument("--layers", type=int, default=3)
+    parser.add_argument("--features", type=int, default=10000, help="features per synthetic layer")
+    parser.add_argument("--page-size", type=int, default=100, help="limit of get_layer_features")
+    parser.add_argument("--delay", action="append", metavar="COMMAND=MS", help="fake QGIS time per command type")
+    parser.add_argument("--parallel-plugin", action="store_true",
+                        help="let the fake plugin run commands concurrently instead of one at a time")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="seconds per stubbed OpenAI call")
+    parser.add_argument("--repeat-prompts", action="store_true", help="reuse prompts so the intent cache answers")
+    parser.add_argument("--port", type=int, default=9892, help="HTTP port of the backend under test")
+    parser.add_argument("--log-level", default="WARNING", help="backend log level during the api run")
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    plugin = FakePlugin(layers=args.layers, features=args.features, delays=parse_delays(args.delay),
+                        serialize=not args.parallel_plugin).start()
+    print(f"fake plugin on port {plugin.port}: {args.layers} layers x {args.features} features, "
+          f"concurrency {args.concurrency}, mix {' '.join(args.mix)}")
+
+    if args.target in ("client", "both"):
+        recorder, elapsed = bench_client(plugin, args, mix)
+        report("QgisMCPClient -> plugin", recorder, elapsed, "reply B/cmd")
+        report_plugin(plugin)
+
+    if args.target in ("api", "both"):
+        recorder, elapsed, routes, index_ready = bench_api(plugin, args, mix)
+        report(f"/api/command -> backend -> plugin (LLM {args.llm_latency * 1000:.0f} ms)", recorder, elapsed,
+               "HTTP B/cmd")
+        print(f"routes {routes}, layer index {'ready' if index_ready else 'not ready'}")
+        report_plugin(plugin)
+
+    plugin.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+"""
+Protocol-compatible stand-in for the QGIS plugin server, for offline benchmarks.
+
+FakePlugin speaks the same socket protocol as QgisMCPServer (bare JSON
+hello, then length-prefixed frames; bare JSON throughout for legacy
+clients) and answers the common commands from synthetic point layers:
+get_layers, subscribe_layers, get_layer_features (JSON, columnar or Arrow
+pages), aggregate, spatial_query, render_map, render_tile, batch, get_metrics, ping
+and get_qgis_info.  Other commands succeed without doing anything.
+
+Commands are executed one at a time by default, like the plugin's GUI
+thread, and each command type can be given a fixed delay to stand in for
+QGIS work.  Bytes received and sent are counted per command type, and
+execution times are kept in the same histograms as the real plugin's.
+
+    python benchmarks/fake_plugin.py --port 9876 --layers 3 --features 100000 --delay get_layer_features=5
+"""
+import argparse
+import base64
+import json
+import os
+import socket
+import struct
+import sys
+import threading
+import time
+from collections import defaultdict
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from qgis_mcp_plugin import protocol
+from qgis_mcp_plugin.columnar import ColumnarEncoder
+from qgis_mcp_plugin.metrics import Metrics
+
+COLUMNS = [("id", "int64"), ("name", "string"), ("population", "int64"), ("density", "float64")]
+FIELD_NAMES = [name for name, _ in COLUMNS]
+
+
+class SyntheticLayer:
+    """A point layer whose features are computed from their ID"""
+
+    def __init__(self, index, count):
+        self.id = f"points_{index}"
+        self.name = f"points {index}"
+        self.count = count
+
+    def info(self, details=False):
+        info = {"id": self.id, "name": self.name, "type": "VectorLayer", "crs": "EPSG:4326"}
+        if details:
+            info.update(
+                provider="memory",
+                extent=[-180.0, -90.0, 180.0, 90.0],
+                geometry_type="Point",
+                fields=[{"name": name, "type": kind} for name, kind in COLUMNS]
+            )
+        return info
+
+    @staticmethod
+    def feature(fid):
+        x, y = (fid % 3600) / 10 - 180, (fid % 1800) / 10 - 90
+        return [fid, f"place {fid}", fid * 7 % 100000, fid * 0.37], x, y
+
+
+class FakePlugin:
+    """Serves the plugin protocol on a background thread; port 0 picks a free port"""
+
+    def __init__(self, host="127.0.0.1", port=0, layers=3, features=10000, delays=None, serialize=True):
+        self.host = host
+        self.port = port
+        self.layers = {layer.id: layer for layer in (SyntheticLayer(i, features) for i in range(layers))}
+        self.delays = delays or {}
+        self.serialize = serialize
+        self.execution_lock = threading.Lock()
+        self.stats_lock = threading.Lock()
+        self.stats = defaultdict(lambda: {"commands": 0, "bytes_in": 0, "bytes_out": 0})
+        self.metrics = Metrics()
+        self.socket = None
+        self.running = False
+
+    def start(self):
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.bind((self.host, self.port))
+        self.socket.listen(256)
+        self.port = self.socket.getsockname()[1]
+        self.running = True
+        threading.Thread(target=self.accept_clients, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.running = False
+        self.socket.close()
+
+    def accept_clients(self):
+        while self.running:
+            try:
+                sock, _ = self.socket.accept()
+            except OSError:
+                return
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            threading.Thread(target=self.serve_client, args=(sock,), daemon=True).start()
+
+    def record(self, command_type, bytes_in, bytes_out):
+        with self.stats_lock:
+            stats = self.stats[command_type]
+            stats["commands"] += 1
+            stats["bytes_in"] += bytes_in
+            stats["bytes_out"] += bytes_out
+
+    def serve_client(self, sock):
+        framed = False
+        buffer = b''
+        decoder = protocol.FrameDecoder()
+        try:
+            while True:
+                data = sock.recv(65536)
+                if not data:
+                    return
+                if framed or (not buffer and protocol.looks_framed(data)):
+                    framed = True
+                    for kind, payload in decoder.feed(data):
+                        command = protocol.decode_json(payload)
+                        reply = self.encode(self.run(command), command.get("id"), framed=True)
+                        self.record(command.get("type"), protocol.HEADER_SIZE + len(payload), len(reply))
+                        sock.sendall(reply)
+                    continue
+
+                # Legacy bare JSON, including the hello that switches a connection to frames
+                buffer += data
+                try:
+                    command = json.loads(buffer.decode('utf-8'))
+                except json.JSONDecodeError:
+                    continue
+                size, buffer = len(buffer), b''
+                response = self.run(command)
+                reply = self.encode(response, command.get("id"), framed=False)
+                self.record(command.get("type"), size, len(reply))
+                sock.sendall(reply)
+                if command.get("type") == "hello" and response.get("status") == "success":
+                    framed = True
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            sock.close()
+
+    @staticmethod
+    def encode(response, request_id, framed):
+        if isinstance(response, protocol.BinaryMessage):
+            if request_id is not None:
+                response.message["id"] = request_id
+            if framed:
+                return protocol.encode_binary(response.message, response.body)
+            # Legacy clients get the body base64 encoded, as from the plugin
+            response = dict(response.message,
+                            body_base64=base64.b64encode(protocol.body_bytes(response.body)).decode('ascii'))
+        if request_id is not None:
+            response["id"] = request_id
+        if framed:
+            return protocol.encode_json(response)
+        return json.dumps(response).encode('utf-8')
+
+    def run(self, command):
+        with self.metrics.span("execute_seconds", command=command.get("type")):
+            if not self.serialize:
+                return self.execute(command)
+            with self.execution_lock:
+                return self.execute(command)
+
+    def execute(self, command):
+        command_type = command.get("type")
+        params = command.get("params", {})
+        delay = self.delays.get(command_type)
+        if delay:
+            time.sleep(delay)
+        try:
+            handler = getattr(self, f"cmd_{command_type}", None)
+            if handler is None:
+                return {"status": "success", "result": {"command": command_type}}
+            return handler(**params)
+        except Exception as e:
+            return {"status": "error", "message": f"{type(e).__name__}: {e}"}
+
+    def layer(self, layer_id):
+        if layer_id not in self.layers:
+            raise KeyError(f"Vector layer {layer_id} not found")
+        return self.layers[layer_id]
+
+    def cmd_hello(self, **ignored):
+        return {"status": "success", "result": {"protocol": protocol.PROTOCOL_VERSION}}
+
+    def cmd_ping(self):
+        return {"status": "success", "result": {"pong": True}}
+
+    def cmd_get_qgis_info(self):
+        return {"status": "success", "result": {"qgis_version": "fake", "profile_folder": "", "plugins_count": 1}}
+
+    def cmd_get_metrics(self):
+        return {"status": "success", "result": self.metrics.snapshot()}
+
+    def cmd_get_layers(self, details=False):
+        return {
+            "status": "success",
+            "result": {"layers": [layer.info(details) for layer in self.layers.values()], "revision": 0}
+        }
+
+    def cmd_subscribe_layers(self):
+        return {
+            "status": "success",
+            "result": {"layers": [layer.info(True) for layer in self.layers.values()], "revision": 0}
+        }
+
+    def cmd_get_layer_features(self, layer_id, limit=10, offset=0, fields=None, no_geometry=False,
+                               format="json", **ignored):
+        layer = self.layer(layer_id)
+        names = fields or FIELD_NAMES
+        columns = [column for column in COLUMNS if column[0] in names]
+        indexes = [FIELD_NAMES.index(name) for name, _ in columns]
+        end = min(layer.count, offset + limit) if limit else layer.count
+        summary = {
+            "layer": layer.name,
+            "fields": [name for name, _ in columns],
+            "count": max(0, end - offset),
+            "next_page_token": None
+        }
+        if format in ("columnar", "arrow"):
+            encoder = ColumnarEncoder(columns, not no_geometry)
+            for fid in range(offset, end):
+                values, x, y = layer.feature(fid)
+                wkb = None if no_geometry else struct.pack("<BIdd", 1, 1, x, y)
+                encoder.append(fid, [values[i] for i in indexes], wkb)
+            batch, buffers = encoder.finish_arrow() if format == "arrow" else encoder.finish()
+            return protocol.BinaryMessage({"status": "success", "result": dict(summary, batch=batch)}, buffers)
+
+        features = []
+        for fid in range(offset, end):
+            values, x, y = layer.feature(fid)
+            feature = {"id": fid, "attributes": {FIELD_NAMES[i]: values[i] for i in indexes}}
+            if not no_geometry:
+                feature["geometry"] = f"Point ({x} {y})"
+            features.append(feature)
+        return {"status": "success", "result": dict(summary, features=features)}
+
+    def cmd_aggregate(self, layer_id, fields=None, **ignored):
+        layer = self.layer(layer_id)
+        names = fields or ["population", "density"]
+        stats = {}
+        for name in names:
+            index = FIELD_NAMES.index(name)
+            values = [layer.feature(fid)[0][index] for fid in range(layer.count)]
+            stats[name] = {
+                "count": len(values),
+                "sum": sum(values),
+                "mean": sum(values) / len(values) if values else None,
+                "min": min(values, default=None),
+                "max": max(values, default=None)
+            }
+        return {
+            "status": "success",
+            "result": {"layer_id": layer_id, "fields": names, "features": layer.count, "stats": stats, "cached": False}
+        }
+
+    def cmd_spatial_query(self, layer_id, bbox=None, limit=None, **ignored):
+        layer = self.layer(layer_id)
+        xmin, ymin, xmax, ymax = bbox or (-180, -90, 180, 90)
+        ids = []
+        for fid in range(layer.count):
+            _, x, y = layer.feature(fid)
+            if xmin <= x <= xmax and ymin <= y <= ymax:
+                ids.append(fid)
+                if limit and len(ids) >= limit:
+                    break
+        return {
+            "status": "success",
+            "result": {"layer_id": layer_id, "mode": "bbox", "count": len(ids), "ids": ids, "index_built": False}
+        }
+
+    def cmd_render_map(self, width=800, height=600, **ignored):
+        # Roughly the size of a compressed map image
+        body = os.urandom(max(1, width * height // 8))
+        return protocol.BinaryMessage({"status": "success", "result": {
+            "dimensions": f"{width}x{height}", "etag": body[:8].hex(), "cached": False,
+            "mime_type": "image/png", "bytes": len(body)
+        }}, body)
+
+    def cmd_render_tile(self, z, x, y, size=256):
+        body = os.urandom(size * size // 8)
+        return protocol.BinaryMessage({"status": "success", "result": {
+            "tile": f"{z}/{x}/{y}", "mime_type": "image/png", "etag": body[:8].hex(), "cached": False
+        }}, body)
+
+    def cmd_batch(self, steps, stop_on_error=True):
+        responses = []
+        for step in steps:
+            response = self.execute(step)
+            if isinstance(response, protocol.BinaryMessage):
+                response = response.message
+            responses.append(response)
+            if response.get("status") != "success" and stop_on_error:
+                break
+        return {
+            "status": "success",
+            "result": {"steps": responses, "completed": len(responses), "skipped": len(steps) - len(responses),
+                       "failed": [i for i, r in enumerate(responses) if r.get("status") != "success"]}
+        }
+
+
+def parse_delays(items):
+    """"command=milliseconds" pairs into {command: seconds}"""
+    delays = {}
+    for item in items or []:
+        command, _, ms = item.partition("=")
+        delays[command] = float(ms) / 1000
+    return delays
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9876)
+    parser.add_argument("--layers", type=int, default=3)
+    parser.add_argument("--features", type=int, default=10000, help="features per layer")
+    parser.add_argument("--delay", action="append", metavar="COMMAND=MS", help="fixed delay per command type")
+    parser.add_argument("--parallel", action="store_true", help="run commands concurrently instead of one at a time")
+    args = parser.parse_args()
+    plugin = FakePlugin(args.host, args.port, args.layers, args.features, parse_delays(args.delay),
+                        serialize=not args.parallel).start()
+    print(f"Fake QGIS plugin listening on {args.host}:{plugin.port}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        plugin.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+JSON vs columnar vs Arrow encoding of get_layer_features pages.
+
+Runs offline on synthetic point features (four attributes plus geometry)
+and times what each end of the socket does for one page: the plugin's
+encoding into a frame and the client's decoding of that frame.
+
+    python benchmarks/feature_formats.py --sizes 10000 100000 1000000
+"""
+import argparse
+import os
+import struct
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "src", "qgis_mcp"))
+
+import protocol
+from columnar import decode_batch
+from qgis_mcp_plugin import columnar as plugin_columnar
+
+COLUMNS = [("id", "int64"), ("name", "string"), ("population", "int64"), ("density", "float64")]
+
+
+def synthetic_features(count):
+    for fid in range(count):
+        x, y = (fid % 3600) / 10 - 180, (fid % 1800) / 10 - 90
+        yield fid, [fid, f"place {fid}", fid * 7 % 100000, fid * 0.37], x, y
+
+
+def point_wkb(x, y):
+    return struct.pack("<BIdd", 1, 1, x, y)
+
+
+def json_roundtrip(count):
+    start = time.perf_counter()
+    features = [
+        {"id": fid, "attributes": dict(zip((name for name, _ in COLUMNS), values)), "geometry": f"Point ({x} {y})"}
+        for fid, values, x, y in synthetic_features(count)
+    ]
+    frame = protocol.encode_json({"status": "success", "result": {"features": features}})
+    encoded = time.perf_counter()
+    payload = frame[protocol.HEADER_SIZE:]
+    message = protocol.decode_json(payload)
+    assert len(message["result"]["features"]) == count
+    return encoded - start, time.perf_counter() - encoded, len(frame)
+
+
+def binary_roundtrip(count, fmt):
+    start = time.perf_counter()
+    encoder = plugin_columnar.ColumnarEncoder(COLUMNS, with_geometry=True)
+    for fid, values, x, y in synthetic_features(count):
+        encoder.append(fid, values, point_wkb(x, y))
+    batch, buffers = encoder.finish_arrow() if fmt == "arrow" else encoder.finish()
+    frame = protocol.encode_binary({"status": "success", "result": {"batch": batch}}, buffers)
+    encoded = time.perf_counter()
+    message, body = protocol.decode_binary(frame[protocol.HEADER_SIZE:])
+    decoded = decode_batch(message["result"]["batch"], body)
+    assert (decoded.num_rows if fmt == "arrow" else decoded.count) == count
+    return encoded - start, time.perf_counter() - encoded, len(frame)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    args = parser.parse_args()
+
+    formats = [("json", json_roundtrip), ("columnar", lambda n: binary_roundtrip(n, "columnar"))]
+    if plugin_columnar.arrow_available():
+        formats.append(("arrow", lambda n: binary_roundtrip(n, "arrow")))
+
+    print(f"{'features':>10}  {'format':<10}{'encode s':>10}{'decode s':>10}{'total s':>10}{'MB':>10}")
+    for size in args.sizes:
+        for name, roundtrip in formats:
+            encode, decode, nbytes = roundtrip(size)
+            print(f"{size:>10}  {name:<10}{encode:>10.3f}{decode:>10.3f}{encode + decode:>10.3f}{nbytes / 1e6:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 ﻿import React, { useState, useEffect } from 'react';
 import axios from 'axios';
-import { CheckCircle, XCircle, Folder, Send, RefreshCw, Cpu } from 'react-feather';
+import { CheckCircle, XCircle, Folder, Send, RefreshCw, RotateCcw, Cpu } from 'react-feather';
+import { resetSession, streamCommand } from './services/api';
 import './App.css';
 
 function App() {
@@ -46,8 +47,16 @@ function App() {
     setStatus(prev => ({ ...prev, loading: true }));
     
     try {
-      const res = await axios.post('http://localhost:9876/api/command', { prompt });
-      setResponse(JSON.stringify(res.data, null, 2));
+      const steps = [];
+      const result = await streamCommand(prompt, (event, data) => {
+        if (event === 'intent_parsed') steps.push(`Parsed ${data.command.command} (${data.route}, ${data.elapsed_ms} ms)`);
+        else if (event === 'dispatched') steps.push(`Running ${data.command}...`);
+        else if (event === 'progress' && data.stage === 'llm') steps.push('Interpreting request...');
+        else if (event === 'progress' && data.stage === 'features') steps[steps.length - 1] = `Received ${data.count} features`;
+        else if (event === 'progress' && data.stage === 'job') steps[steps.length - 1] = `Job ${data.job.status}: ${data.job.progress}%`;
+        if (event !== 'result') setResponse(steps.join('\n'));
+      });
+      setResponse([...steps, JSON.stringify(result, null, 2)].join('\n'));
       checkStatus(); // Refresh status after command
     } catch (err) {
       setResponse(`Error: ${err.message}`);
@@ -56,6 +65,13 @@ function App() {
     }
   };
 
+  // Forget the conversation so follow-ups no longer refer to earlier commands
+  const handleNewConversation = async () => {
+    await resetSession();
+    setPrompt('');
+    setResponse('');
+  };
+
   return (
     <div className="app-container">
       <div className="status-bar">
@@ -104,6 +120,9 @@ function App() {
                 </>
               )}
             </button>
+            <button type="button" onClick={handleNewConversation} disabled={status.loading}>
+              <RotateCcw size={18} /> New conversation
+            </button>
           </div>
         </form>
 
@@ -1,18 +1,26 @@
 ﻿import React from 'react';
 import { MapContainer, TileLayer } from 'react-leaflet';
 import 'leaflet/dist/leaflet.css';
+import { API_URL } from '../services/api';
 
-const MapView = ({ center = [51.505, -0.09], zoom = 13 }) => {
+// Tiles rendered by QGIS itself through the backend's /api/tiles route
+const QGIS_TILE_URL = `${API_URL}/api/tiles/{z}/{x}/{y}.png`;
+
+const MapView = ({ center = [51.505, -0.09], zoom = 13, tileSource = 'qgis' }) => {
   return (
     <MapContainer
       center={center}
       zoom={zoom}
       style={{ height: '400px', width: '100%', borderRadius: '8px' }}
     >
-      <TileLayer
-        url={process.env.REACT_APP_MAP_TILE_URL}
-        attribution='&copy; <a href="https://www.openstreetmap.org/copyright">OpenStreetMap</a> contributors'
-      />
+      {tileSource === 'qgis' ? (
+        <TileLayer url={QGIS_TILE_URL} attribution="Rendered by QGIS" />
+      ) : (
+        <TileLayer
+          url={process.env.REACT_APP_MAP_TILE_URL}
+          attribution='&copy; <a href="https://www.openstreetmap.org/copyright">OpenStreetMap</a> contributors'
+        />
+      )}
     </MapContainer>
   );
 };
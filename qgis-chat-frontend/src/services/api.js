@@ -4,12 +4,90 @@ const api = axios.create({
   baseURL: process.env.REACT_APP_API_URL,
 });
 
+// Identifies this tab's conversation, so the backend can resolve follow-ups like "now zoom to it"
+const newSessionId = () =>
+  (window.crypto && window.crypto.randomUUID
+    ? window.crypto.randomUUID()
+    : `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`);
+
+export const getSessionId = () => {
+  let sessionId = sessionStorage.getItem('qgisChatSession');
+  if (!sessionId) {
+    sessionId = newSessionId();
+    sessionStorage.setItem('qgisChatSession', sessionId);
+  }
+  return sessionId;
+};
+
 export const sendCommand = async (prompt) => {
   try {
-    const response = await api.post('/', { prompt });
+    const response = await api.post('/', { prompt, session_id: getSessionId() });
     return response.data;
   } catch (error) {
     console.error('API Error:', error);
     return { status: 'error', message: error.message };
   }
 };
+
+// The backend's default address, as used by App.js, when no API URL is configured
+export const API_URL = process.env.REACT_APP_API_URL || 'http://localhost:9876';
+
+// Starts a new conversation: the backend forgets the old session's turns
+export const resetSession = async () => {
+  const sessionId = getSessionId();
+  sessionStorage.removeItem('qgisChatSession');
+  try {
+    await fetch(`${API_URL}/api/sessions/${encodeURIComponent(sessionId)}`, { method: 'DELETE' });
+  } catch (error) {
+    console.error('API Error:', error);
+  }
+};
+
+const parseEvent = (block) => {
+  let event = 'message';
+  const data = [];
+  block.split('\n').forEach((line) => {
+    if (line.startsWith('event:')) event = line.slice(6).trim();
+    else if (line.startsWith('data:')) data.push(line.slice(5).trim());
+  });
+  return data.length ? { event, data: JSON.parse(data.join('\n')) } : null;
+};
+
+// Streams /api/command/stream and calls onEvent(event, data) for every
+// intent_parsed, dispatched, progress and result event; resolves with the result.
+export const streamCommand = async (prompt, onEvent = () => {}) => {
+  try {
+    const response = await fetch(`${API_URL}/api/command/stream`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json', Accept: 'text/event-stream' },
+      body: JSON.stringify({ prompt, session_id: getSessionId() }),
+    });
+    if (!response.ok || !response.body) {
+      return { status: 'error', message: `HTTP ${response.status}` };
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let result = { status: 'error', message: 'Stream ended without a result' };
+    for (;;) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      let boundary = buffer.indexOf('\n\n');
+      while (boundary !== -1) {
+        const parsed = parseEvent(buffer.slice(0, boundary));
+        buffer = buffer.slice(boundary + 2);
+        if (parsed) {
+          onEvent(parsed.event, parsed.data);
+          if (parsed.event === 'result') result = parsed.data;
+        }
+        boundary = buffer.indexOf('\n\n');
+      }
+    }
+    return result;
+  } catch (error) {
+    console.error('API Error:', error);
+    return { status: 'error', message: error.message };
+  }
+};
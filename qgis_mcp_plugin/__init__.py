@@ -1 +1,4 @@
-from .qgis_mcp_plugin import classFactory
+def classFactory(iface):
+    # Imported here so the plugin's pure-Python modules load without QGIS
+    from .qgis_mcp_plugin import classFactory as plugin_factory
+    return plugin_factory(iface)
@@ -0,0 +1,69 @@
+"""
+Step references for batched commands.
+
+A batch is an ordered list of commands run in one main-thread pass.  Any
+string parameter of the form ``"$<step>.<path>"`` is replaced by a value
+from an earlier step's response before the step runs, so "add a layer,
+then zoom to it" can be sent as one message:
+
+    {"type": "batch", "params": {"steps": [
+        {"type": "add_vector_layer", "params": {"path": "/data/roads.shp"}},
+        {"type": "zoom_to_layer", "params": {"layer_id": "$0.layer_id"}}
+    ]}}
+
+The path is looked up in the step's response first and then in its
+"result", so ``$0.layer_id`` and ``$0.result.layer_id`` both work.  List
+items are addressed by index (``$2.layers.0.id``).
+"""
+import re
+
+REFERENCE = re.compile(r'^\$(\d+)((?:\.[^.]+)*)$')
+
+
+class StepReferenceError(ValueError):
+    pass
+
+
+def lookup(value, path):
+    for key in path:
+        if isinstance(value, list):
+            try:
+                value = value[int(key)]
+            except (ValueError, IndexError):
+                raise KeyError(key)
+        elif isinstance(value, dict):
+            value = value[key]
+        else:
+            raise KeyError(key)
+    return value
+
+
+def resolve_reference(text, responses):
+    """Value of one ``$<step>.<path>`` reference"""
+    match = REFERENCE.match(text)
+    index = int(match.group(1))
+    path = [key for key in match.group(2).split('.') if key]
+    if index >= len(responses):
+        raise StepReferenceError(f"{text} refers to step {index}, which has not run")
+    response = responses[index]
+    try:
+        return lookup(response, path)
+    except KeyError:
+        pass
+    if isinstance(response.get("result"), dict):
+        try:
+            return lookup(response["result"], path)
+        except KeyError:
+            pass
+    raise StepReferenceError(f"{text}: step {index} has no {'.'.join(path) or 'value'}")
+
+
+def resolve_references(value, responses):
+    """Copy of a step's params with every reference replaced by its value"""
+    if isinstance(value, str):
+        return resolve_reference(value, responses) if REFERENCE.match(value) else value
+    if isinstance(value, dict):
+        return {key: resolve_references(item, responses) for key, item in value.items()}
+    if isinstance(value, list):
+        return [resolve_references(item, responses) for item in value]
+    return value
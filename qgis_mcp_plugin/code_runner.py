@@ -0,0 +1,126 @@
+"""
+Execution of PyQGIS snippets for the execute_code command.
+
+LLM-generated snippets repeat a lot, so each source text is compiled once
+and its code object kept by SHA-256 of the source.  Snippets run in a
+namespace that already holds the qgis.core names, ``qgis``, ``iface``,
+``processing`` and ``project``; that base namespace is built once and
+copied per run instead of being re-imported.
+
+With a session name the namespace persists between calls, so one snippet
+can define variables or functions that the next one uses.  Sessions are
+dropped least recently used first.
+
+A snippet reports back through a variable named ``result`` and anything it
+prints; both are returned with the execution time.
+"""
+import contextlib
+import hashlib
+import io
+import time
+from collections import OrderedDict
+
+import qgis
+import qgis.core
+from qgis.core import QgsProject
+
+from .features import json_value
+
+# Printed output beyond this is cut off rather than sent back
+MAX_STDOUT = 64 * 1024
+
+
+class CodeRunner:
+    """Compiled-code cache and namespaces for execute_code"""
+
+    def __init__(self, iface=None, max_compiled=256, max_sessions=16):
+        self.iface = iface
+        self.max_compiled = max_compiled
+        self.max_sessions = max_sessions
+        self.compiled = OrderedDict()
+        self.sessions = OrderedDict()
+        self.base = None
+
+    def base_namespace(self):
+        if self.base is None:
+            base = {name: value for name, value in vars(qgis.core).items() if not name.startswith("_")}
+            base.update(qgis=qgis, iface=self.iface, __name__="__qgis_mcp__")
+            try:
+                import processing
+                base["processing"] = processing
+            except ImportError:
+                pass  # the Processing plugin is disabled
+            self.base = base
+        return self.base
+
+    def namespace(self, session=None, reset=False):
+        if session is None:
+            namespace = dict(self.base_namespace())
+        else:
+            namespace = None if reset else self.sessions.get(session)
+            if namespace is None:
+                namespace = self.sessions[session] = dict(self.base_namespace())
+                while len(self.sessions) > self.max_sessions:
+                    self.sessions.popitem(last=False)
+            self.sessions.move_to_end(session)
+        # The project instance can change between runs, so it is looked up every time
+        namespace["project"] = QgsProject.instance()
+        namespace.pop("result", None)
+        return namespace
+
+    def compile(self, code):
+        """Cache entry for the source: its code object and run statistics"""
+        digest = hashlib.sha256(code.encode('utf-8')).hexdigest()
+        entry = self.compiled.get(digest)
+        if entry is not None:
+            self.compiled.move_to_end(digest)
+            return digest, entry, True
+        entry = {
+            "code": compile(code, f"<execute_code {digest[:12]}>", "exec"),
+            "runs": 0,
+            "total_time": 0.0,
+            "last_time": None
+        }
+        self.compiled[digest] = entry
+        while len(self.compiled) > self.max_compiled:
+            self.compiled.popitem(last=False)
+        return digest, entry, False
+
+    def run(self, code, session=None, reset=False):
+        """Execute a snippet and return its result, printed output and timing"""
+        digest, entry, cached = self.compile(code)
+        namespace = self.namespace(session, reset)
+        stdout = io.StringIO()
+        started = time.perf_counter()
+        try:
+            with contextlib.redirect_stdout(stdout):
+                exec(entry["code"], namespace)
+        finally:
+            elapsed = time.perf_counter() - started
+            entry["runs"] += 1
+            entry["total_time"] += elapsed
+            entry["last_time"] = elapsed
+
+        printed = stdout.getvalue()
+        return {
+            "result": json_value(namespace.get("result", "Code executed")),
+            "stdout": printed[:MAX_STDOUT],
+            "stdout_truncated": len(printed) > MAX_STDOUT,
+            "elapsed_ms": round(elapsed * 1000, 3),
+            "code_hash": digest,
+            "compiled_cached": cached,
+            "session": session
+        }
+
+    def end_session(self, session):
+        return self.sessions.pop(session, None) is not None
+
+    def stats(self):
+        """Run counts and timings of the cached snippets, slowest total first"""
+        snippets = [
+            {"code_hash": digest, "runs": entry["runs"], "total_time": entry["total_time"],
+             "last_time": entry["last_time"]}
+            for digest, entry in self.compiled.items()
+        ]
+        snippets.sort(key=lambda snippet: snippet["total_time"], reverse=True)
+        return {"compiled": len(self.compiled), "sessions": len(self.sessions), "snippets": snippets}
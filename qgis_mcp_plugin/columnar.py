@@ -0,0 +1,161 @@
+"""
+Column-oriented binary encoding of feature batches.
+
+A batch is sent as a binary frame whose JSON message describes the
+buffers laid out back to back in the body:
+
+    {"format": "columnar", "count": n, "byte_order": "little",
+     "fids": {"offset", "length"},
+     "columns": [{"name", "type", "values": {...}, "offsets": {...}?, "validity": {...}?}],
+     "geometry": {"encoding": "wkb", "offsets": {...}, "values": {...}} | null}
+
+``int64`` / ``float64`` / ``bool`` columns are plain little-endian arrays,
+``string`` columns are UTF-8 bytes with ``n + 1`` int64 offsets, and the
+geometry is WKB blobs with int64 offsets.  A column that contains nulls
+gets a uint8 validity mask (1 = value present).  Every buffer starts on an
+8 byte boundary so readers can map it without copying.
+
+When pyarrow is installed the same batch can be written as an Arrow IPC
+stream instead (``format: "arrow"``).  This module has no QGIS dependency.
+"""
+import sys
+from array import array
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+ALIGNMENT = 8
+_TYPECODES = {"int64": "q", "float64": "d", "bool": "B"}
+
+
+def arrow_available():
+    return pyarrow is not None
+
+
+class ColumnarEncoder:
+    """Accumulate features column by column and lay them out as buffers"""
+
+    def __init__(self, columns, with_geometry=True):
+        # columns: list of (name, type) with type in int64, float64, bool, string
+        self.columns = list(columns)
+        self.with_geometry = with_geometry
+        self.count = 0
+        self.fids = array("q")
+        self.values = []
+        self.validity = []
+        for name, kind in self.columns:
+            self.values.append(_BlobColumn() if kind == "string" else array(_TYPECODES[kind]))
+            self.validity.append(array("B"))
+        self.geometry = _BlobColumn() if with_geometry else None
+
+    def append(self, fid, values, wkb=None):
+        """Add one feature; ``values`` follows the column order, None marks a null"""
+        self.fids.append(fid)
+        for (name, kind), column, validity, value in zip(self.columns, self.values, self.validity, values):
+            if value is None:
+                validity.append(0)
+                column.append(b"" if kind == "string" else 0)
+                continue
+            validity.append(1)
+            if kind == "string":
+                column.append(str(value).encode("utf-8"))
+            elif kind == "float64":
+                column.append(float(value))
+            else:
+                column.append(int(value))
+        if self.geometry is not None:
+            self.geometry.append(bytes(wkb) if wkb else b"")
+        self.count += 1
+
+    def finish(self):
+        """Return ``(message, buffers)`` ready for protocol.encode_binary"""
+        layout = _Layout()
+        message = {
+            "format": "columnar",
+            "count": self.count,
+            "byte_order": "little",
+            "fids": layout.add(_little_endian(self.fids)),
+            "columns": [],
+            "geometry": None
+        }
+        for (name, kind), column, validity in zip(self.columns, self.values, self.validity):
+            description = {"name": name, "type": kind}
+            if kind == "string":
+                description["offsets"] = layout.add(_little_endian(column.offsets))
+                description["values"] = layout.add(column.data)
+            else:
+                description["values"] = layout.add(_little_endian(column))
+            description["validity"] = layout.add(validity) if 0 in validity else None
+            message["columns"].append(description)
+        if self.geometry is not None:
+            message["geometry"] = {
+                "encoding": "wkb",
+                "offsets": layout.add(_little_endian(self.geometry.offsets)),
+                "values": layout.add(self.geometry.data)
+            }
+        return message, layout.buffers
+
+    def finish_arrow(self):
+        """Return ``(message, buffers)`` with the batch as an Arrow IPC stream"""
+        if pyarrow is None:
+            raise RuntimeError("pyarrow is not installed in the QGIS Python environment")
+        arrays = {"$fid": pyarrow.array(self.fids, type=pyarrow.int64())}
+        arrow_types = {"int64": pyarrow.int64(), "float64": pyarrow.float64(), "bool": pyarrow.bool_()}
+        for (name, kind), column, validity in zip(self.columns, self.values, self.validity):
+            mask = [not valid for valid in validity]
+            if kind == "string":
+                values = [value.decode("utf-8") for value in column.items()]
+                arrays[name] = pyarrow.array(values, type=pyarrow.string(), mask=mask)
+            else:
+                arrays[name] = pyarrow.array(list(column), type=arrow_types[kind], mask=mask)
+        if self.geometry is not None:
+            arrays["geometry"] = pyarrow.array(list(self.geometry.items()), type=pyarrow.binary())
+        table = pyarrow.table(arrays)
+        sink = pyarrow.BufferOutputStream()
+        with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return {"format": "arrow", "count": self.count}, [sink.getvalue()]
+
+
+class _BlobColumn:
+    """Variable-length values stored as one byte buffer plus int64 offsets"""
+
+    def __init__(self):
+        self.offsets = array("q", [0])
+        self.data = bytearray()
+
+    def append(self, value):
+        self.data += value
+        self.offsets.append(len(self.data))
+
+    def items(self):
+        for start, end in zip(self.offsets, self.offsets[1:]):
+            yield bytes(self.data[start:end])
+
+
+class _Layout:
+    """Place buffers back to back, padded to the alignment, and describe where they are"""
+
+    def __init__(self):
+        self.buffers = []
+        self.size = 0
+
+    def add(self, buffer):
+        length = memoryview(buffer).nbytes
+        description = {"offset": self.size, "length": length}
+        self.buffers.append(buffer)
+        self.size += length
+        padding = -self.size % ALIGNMENT
+        if padding:
+            self.buffers.append(bytes(padding))
+            self.size += padding
+        return description
+
+
+def _little_endian(values):
+    if sys.byteorder != "little" and values.itemsize > 1:
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values
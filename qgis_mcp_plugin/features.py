@@ -0,0 +1,171 @@
+"""
+Feature queries for the get_layer_features command.
+
+Queries run on a QgsVectorLayerFeatureSource, a snapshot of the layer's
+data provider, so a streamed query keeps working while it is pumped out
+over several event loop iterations.  Paging is cursor based: the page
+token records the last feature id returned and the next page continues
+with ``$id > last_id``, in the provider's feature id order.
+
+Besides JSON dicts a page can be encoded as a binary columnar batch or an
+Arrow IPC stream (see columnar.py), which skips per-feature JSON work on
+both ends for large pulls.
+"""
+import base64
+import json
+
+from qgis.core import (QgsFeatureRequest, QgsRectangle, QgsVectorLayerFeatureSource)
+from qgis.PyQt.QtCore import QByteArray, QDate, QDateTime, QTime, QVariant, Qt
+
+from .columnar import ColumnarEncoder
+from .protocol import BinaryMessage
+
+FORMATS = ("json", "columnar", "arrow")
+
+_INTEGER_TYPES = (QVariant.Int, QVariant.UInt, QVariant.LongLong, QVariant.ULongLong)
+
+
+def json_value(value):
+    """Convert an attribute value into something json.dumps accepts"""
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, QVariant):
+        return None if value.isNull() else json_value(value.value())
+    if isinstance(value, (QDate, QDateTime, QTime)):
+        return value.toString(Qt.ISODate) if value.isValid() else None
+    if isinstance(value, (bytes, bytearray, QByteArray)):
+        return base64.b64encode(bytes(value)).decode('ascii')
+    if isinstance(value, (list, tuple)):
+        return [json_value(item) for item in value]
+    if isinstance(value, dict):
+        return {str(key): json_value(item) for key, item in value.items()}
+    return str(value)
+
+
+def column_type(field):
+    """Columnar type used for a QgsField"""
+    if field.type() in _INTEGER_TYPES:
+        return "int64"
+    if field.type() == QVariant.Double:
+        return "float64"
+    if field.type() == QVariant.Bool:
+        return "bool"
+    return "string"
+
+
+def encode_page_token(layer_id, last_fid):
+    token = json.dumps({"layer": layer_id, "after": last_fid}).encode('utf-8')
+    return base64.urlsafe_b64encode(token).decode('ascii')
+
+
+def decode_page_token(token, layer_id):
+    """Return the feature id a page token continues after"""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+        after = int(data["after"])
+    except (ValueError, KeyError, TypeError):
+        raise ValueError("Invalid page token")
+    if data.get("layer") != layer_id:
+        raise ValueError("Page token belongs to another layer")
+    return after
+
+
+class FeatureQuery:
+    """One page of features from a vector layer, described by QgsFeatureRequest options"""
+
+    def __init__(self, layer, fields=None, no_geometry=False, expression=None, bbox=None,
+                 offset=0, limit=None, page_token=None):
+        layer_fields = layer.fields()
+        if fields:
+            missing = [name for name in fields if layer_fields.lookupField(name) < 0]
+            if missing:
+                raise ValueError(f"Unknown fields: {', '.join(missing)}")
+            self.field_names = list(fields)
+        else:
+            self.field_names = layer_fields.names()
+
+        self.columns = [(name, column_type(layer_fields.field(name))) for name in self.field_names]
+        self.layer_id = layer.id()
+        self.layer_name = layer.name()
+        self.with_geometry = not no_geometry
+        # A page token already says where the page starts, so offset only applies to the first page
+        self.offset = 0 if page_token else max(0, int(offset or 0))
+        self.limit = int(limit) if limit else None
+        self.count = 0
+        self.last_fid = None
+        self.has_more = False
+
+        filters = []
+        if expression:
+            filters.append(f"({expression})")
+        if page_token:
+            filters.append(f"$id > {decode_page_token(page_token, self.layer_id)}")
+
+        self.request = QgsFeatureRequest()
+        if fields:
+            self.request.setSubsetOfAttributes(self.field_names, layer_fields)
+        if no_geometry:
+            self.request.setFlags(QgsFeatureRequest.NoGeometry)
+        if filters:
+            self.request.setFilterExpression(" AND ".join(filters))
+        if bbox:
+            self.request.setFilterRect(QgsRectangle(*bbox))
+        if self.limit is not None or page_token:
+            # Page tokens continue after a feature ID, which only works if pages are read in ID order
+            self.request.addOrderBy("$id")
+        if self.limit is not None:
+            # One extra feature tells whether another page exists
+            self.request.setLimit(self.offset + self.limit + 1)
+
+        self.source = QgsVectorLayerFeatureSource(layer)
+
+    def features(self):
+        """Yield the page's features as JSON-ready dicts"""
+        for feature in self.iter_features():
+            yield self.to_dict(feature)
+
+    def iter_features(self):
+        """Yield the page's QgsFeature objects"""
+        skipped = 0
+        for feature in self.source.getFeatures(self.request):
+            if skipped < self.offset:
+                skipped += 1
+                continue
+            if self.limit is not None and self.count >= self.limit:
+                self.has_more = True
+                return
+            self.count += 1
+            self.last_fid = feature.id()
+            yield feature
+
+    def to_dict(self, feature):
+        result = {
+            "id": feature.id(),
+            "attributes": {name: json_value(feature[name]) for name in self.field_names}
+        }
+        if self.with_geometry:
+            geometry = feature.geometry()
+            result["geometry"] = None if geometry.isNull() else geometry.asWkt()
+        return result
+
+    def encode_batch(self, features, fmt, status="success"):
+        """Encode QgsFeatures as a binary columnar or Arrow batch message"""
+        encoder = ColumnarEncoder(self.columns, self.with_geometry)
+        for feature in features:
+            values = [json_value(feature[name]) for name in self.field_names]
+            wkb = None
+            if self.with_geometry:
+                geometry = feature.geometry()
+                wkb = None if geometry.isNull() else geometry.asWkb()
+            encoder.append(feature.id(), values, wkb)
+        batch, buffers = encoder.finish_arrow() if fmt == "arrow" else encoder.finish()
+        return BinaryMessage({"status": status, "result": {"batch": batch}}, buffers)
+
+    def summary(self):
+        """Query metadata sent along with, or after, the features"""
+        return {
+            "layer": self.layer_name,
+            "fields": self.field_names,
+            "count": self.count,
+            "next_page_token": encode_page_token(self.layer_id, self.last_fid) if self.has_more else None
+        }
@@ -0,0 +1,154 @@
+"""
+Background processing jobs.
+
+Algorithms run as QgsProcessingAlgRunnerTask on the QGIS task manager, so
+a long buffer or dissolve no longer blocks the socket handler or the GUI.
+Clients submit a job, then poll job_status / job_result or subscribe to the
+progress events pushed by the server.  Other long-running work, such as a
+lazy project load, is tracked the same way through JobManager.track.
+"""
+import uuid
+from collections import OrderedDict
+
+from qgis.core import (QgsApplication, QgsProcessingAlgRunnerTask, QgsProcessingContext,
+                       QgsProcessingFeedback, QgsProject)
+from qgis.PyQt.QtCore import QObject, pyqtSignal
+
+from .features import json_value
+
+
+class Job:
+    """State shared by every kind of job: status, progress, result and subscribed clients"""
+
+    def __init__(self, job_id):
+        self.id = job_id
+        self.status = "queued"
+        self.progress = 0.0
+        self.result = None
+        self.error = None
+        self.subscribers = set()
+
+    @property
+    def finished(self):
+        return self.status in ("succeeded", "failed", "cancelled")
+
+    def cancel(self):
+        """Stop the job; jobs with work in flight override this to stop it too"""
+        if not self.finished:
+            self.status = "cancelled"
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "progress": round(self.progress, 1),
+            "error": self.error
+        }
+
+
+class ProcessingJob(Job):
+    """One submitted algorithm run and everything that must outlive its task"""
+
+    def __init__(self, job_id, algorithm, parameters, task, context, feedback):
+        super().__init__(job_id)
+        self.algorithm = algorithm
+        self.parameters = parameters
+        self.task = task
+        self.context = context
+        self.feedback = feedback
+
+    def cancel(self):
+        if self.task is not None:
+            self.task.cancel()
+
+    def to_dict(self):
+        return dict(super().to_dict(), algorithm=self.algorithm)
+
+
+class JobManager(QObject):
+    """Submit processing algorithms as tasks and keep track of their state"""
+    jobProgress = pyqtSignal(str)
+    jobFinished = pyqtSignal(str)
+
+    # Finished jobs kept around for job_status / job_result
+    MAX_FINISHED = 100
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.jobs = OrderedDict()
+
+    def submit(self, algorithm, parameters):
+        alg = QgsApplication.processingRegistry().createAlgorithmById(algorithm)
+        if alg is None:
+            raise ValueError(f"Unknown processing algorithm: {algorithm}")
+
+        job_id = uuid.uuid4().hex
+        context = QgsProcessingContext()
+        context.setProject(QgsProject.instance())
+        feedback = QgsProcessingFeedback()
+        task = QgsProcessingAlgRunnerTask(alg, parameters or {}, context, feedback)
+
+        job = ProcessingJob(job_id, algorithm, parameters, task, context, feedback)
+        feedback.progressChanged.connect(lambda progress: self._on_progress(job, progress))
+        task.begun.connect(lambda: self._on_begun(job))
+        task.executed.connect(lambda successful, results: self._on_executed(job, successful, results))
+
+        self.track(job)
+        QgsApplication.taskManager().addTask(task)
+        return job
+
+    def track(self, job):
+        """Register a job so job_status, job_result and cancel_job can find it"""
+        self.jobs[job.id] = job
+        self._prune()
+        return job
+
+    def get(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is None:
+            raise KeyError(f"Job {job_id} not found")
+        return job
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if not job.finished:
+            job.cancel()
+        return job
+
+    def cancel_all(self):
+        for job in self.jobs.values():
+            if not job.finished:
+                job.cancel()
+
+    def _on_begun(self, job):
+        if job.status == "queued":
+            job.status = "running"
+            self.jobProgress.emit(job.id)
+
+    def _on_progress(self, job, progress):
+        # Only whole percent steps are worth a push event
+        previous = int(job.progress)
+        job.progress = progress
+        if job.status == "queued":
+            job.status = "running"
+        if int(progress) != previous:
+            self.jobProgress.emit(job.id)
+
+    def _on_executed(self, job, successful, results):
+        if successful:
+            job.status = "succeeded"
+            job.progress = 100.0
+            job.result = json_value(dict(results))
+        elif job.feedback.isCanceled():
+            job.status = "cancelled"
+        else:
+            job.status = "failed"
+            job.error = f"Algorithm {job.algorithm} failed"
+        # The task is deleted by the task manager once it has finished
+        job.task = None
+        self.jobFinished.emit(job.id)
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - self.MAX_FINISHED)]:
+            del self.jobs[job_id]
@@ -0,0 +1,125 @@
+"""
+Cached layer metadata that follows the project as it changes and emits an event per change.
+"""
+from qgis.core import QgsProject, QgsVectorLayer, QgsWkbTypes
+from qgis.PyQt.QtCore import QObject, QTimer, pyqtSignal
+
+# Data edits arrive in bursts; changed layers are reported once per interval
+CHANGE_DELAY_MS = 200
+
+
+def layer_info(layer):
+    """Metadata of one layer, as cached by the index and sent to clients"""
+    extent = layer.extent()
+    info = {
+        "id": layer.id(),
+        "name": layer.name(),
+        "type": layer.type().name,
+        "crs": layer.crs().authid(),
+        "provider": layer.providerType(),
+        "extent": None if extent.isNull() else [
+            extent.xMinimum(), extent.yMinimum(), extent.xMaximum(), extent.yMaximum()
+        ]
+    }
+    if isinstance(layer, QgsVectorLayer):
+        info["geometry_type"] = QgsWkbTypes.displayString(layer.wkbType())
+        info["fields"] = [{"name": field.name(), "type": field.typeName()} for field in layer.fields()]
+    return info
+
+
+class LayerIndex(QObject):
+    """Layer metadata of the current project, kept up to date from project and layer signals"""
+    layerEvent = pyqtSignal(dict)
+
+    def __init__(self, project=None, parent=None):
+        super().__init__(parent)
+        self.project = project or QgsProject.instance()
+        self.layers = {}
+        self.watched = set()
+        self.revision = 0
+        self.changed = set()
+        self.change_timer = QTimer(self)
+        self.change_timer.setSingleShot(True)
+        self.change_timer.timeout.connect(self.flush_changes)
+        self.connections = [
+            (self.project.layersAdded, self.on_layers_added),
+            (self.project.layersRemoved, self.on_layers_removed),
+            (self.project.readProject, self.on_project_read),
+            (self.project.cleared, self.on_project_cleared)
+        ]
+        for signal, slot in self.connections:
+            signal.connect(slot)
+        self.rebuild()
+
+    def close(self):
+        for signal, slot in self.connections:
+            try:
+                signal.disconnect(slot)
+            except TypeError:
+                pass
+        self.change_timer.stop()
+        # Layer signals stay connected; with no entries left they are ignored
+        self.layers = {}
+        self.changed.clear()
+
+    def rebuild(self):
+        self.layers = {}
+        for layer in self.project.mapLayers().values():
+            self.track(layer)
+
+    def track(self, layer):
+        layer_id = layer.id()
+        self.layers[layer_id] = layer_info(layer)
+        if layer_id in self.watched:
+            return
+        self.watched.add(layer_id)
+        layer.willBeDeleted.connect(lambda: self.watched.discard(layer_id))
+        layer.nameChanged.connect(lambda: self.mark_changed(layer_id))
+        layer.crsChanged.connect(lambda: self.mark_changed(layer_id))
+        layer.dataChanged.connect(lambda: self.mark_changed(layer_id))
+        # A lazily loaded project opens its layers' datasources after project_read
+        layer.dataSourceChanged.connect(lambda: self.mark_changed(layer_id))
+        if isinstance(layer, QgsVectorLayer):
+            layer.updatedFields.connect(lambda: self.mark_changed(layer_id))
+
+    def snapshot(self):
+        return {"revision": self.revision, "layers": list(self.layers.values())}
+
+    def publish(self, event, **data):
+        self.revision += 1
+        self.layerEvent.emit(dict(data, event=event, revision=self.revision))
+
+    def on_layers_added(self, layers):
+        for layer in layers:
+            self.track(layer)
+        self.publish("layers_added", layers=[self.layers[layer.id()] for layer in layers])
+
+    def on_layers_removed(self, layer_ids):
+        for layer_id in layer_ids:
+            self.layers.pop(layer_id, None)
+            self.changed.discard(layer_id)
+        self.publish("layers_removed", layer_ids=list(layer_ids))
+
+    def on_project_read(self, *args):
+        self.rebuild()
+        self.publish("project_read", layers=list(self.layers.values()))
+
+    def on_project_cleared(self):
+        self.layers = {}
+        self.changed.clear()
+        self.publish("project_cleared")
+
+    def mark_changed(self, layer_id):
+        if layer_id in self.layers:
+            self.changed.add(layer_id)
+            if not self.change_timer.isActive():
+                self.change_timer.start(CHANGE_DELAY_MS)
+
+    def flush_changes(self):
+        changed, self.changed = self.changed, set()
+        for layer_id in changed:
+            layer = self.project.mapLayer(layer_id)
+            if layer is None or layer_id not in self.layers:
+                continue
+            self.layers[layer_id] = layer_info(layer)
+            self.publish("layer_changed", layer=self.layers[layer_id])
@@ -0,0 +1,115 @@
+"""
+Bulk layer loading for the add_layers command.
+"""
+import glob
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from qgis.core import QgsRasterLayer, QgsVectorLayer
+from qgis.PyQt.QtCore import QCoreApplication
+
+VECTOR_EXTENSIONS = {".gpkg", ".shp", ".geojson", ".json", ".fgb", ".kml", ".gml", ".csv", ".tab", ".sqlite", ".gdb"}
+RASTER_EXTENSIONS = {".tif", ".tiff", ".vrt", ".img", ".jp2", ".asc", ".png", ".jpg", ".jpeg", ".nc", ".dem", ".hgt"}
+KINDS = ("auto", "vector", "raster")
+
+# More paths than this in one request is almost certainly a glob gone wrong
+MAX_PATHS = 2000
+
+
+def expand_paths(paths):
+    """Paths with glob patterns expanded, in order and without duplicates; patterns matching nothing are kept"""
+    if isinstance(paths, str):
+        paths = [paths]
+    expanded = []
+    for path in paths:
+        if glob.has_magic(path):
+            expanded.extend(sorted(glob.glob(path, recursive=True)) or [path])
+        else:
+            expanded.append(path)
+    return list(dict.fromkeys(expanded))
+
+
+def guess_kind(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension in RASTER_EXTENSIONS:
+        return "raster"
+    if extension in VECTOR_EXTENSIONS:
+        return "vector"
+    return None
+
+
+class LayerLoader:
+    """Open a set of paths as layers on worker threads"""
+
+    def __init__(self, paths, kind="auto", provider=None, transform_context=None, max_workers=None):
+        if kind not in KINDS:
+            raise ValueError(f"Unknown kind {kind!r}, expected one of {', '.join(KINDS)}")
+        self.paths = expand_paths(paths)
+        if not self.paths:
+            raise ValueError("No paths given")
+        if len(self.paths) > MAX_PATHS:
+            raise ValueError(f"{len(self.paths)} paths given, at most {MAX_PATHS} can be added at once")
+        self.kind = kind
+        self.provider = provider
+        self.transform_context = transform_context
+        self.max_workers = max_workers or min(8, os.cpu_count() or 1)
+        # Layers created on a worker thread are handed over to the thread that owns the project
+        self.main_thread = QCoreApplication.instance().thread() if QCoreApplication.instance() else None
+
+    def open_vector(self, path, name):
+        options = QgsVectorLayer.LayerOptions()
+        if self.transform_context is not None:
+            options.transformContext = self.transform_context
+        # Never ask the user for a CRS from a worker thread
+        options.skipCrsValidation = True
+        return QgsVectorLayer(path, name, self.provider or "ogr", options)
+
+    def open_raster(self, path, name):
+        options = QgsRasterLayer.LayerOptions()
+        if self.transform_context is not None:
+            options.transformContext = self.transform_context
+        return QgsRasterLayer(path, name, self.provider or "gdal", options)
+
+    def open(self, path):
+        """(layer or None, result entry) for one path; runs on a worker thread"""
+        started = time.perf_counter()
+        name = os.path.splitext(os.path.basename(path.rstrip("/\\")))[0]
+        entry = {"path": path, "name": name}
+        if not os.path.exists(path) and glob.has_magic(path):
+            entry.update(status="error", message="No files match the pattern")
+            return None, entry
+
+        kind = self.kind if self.kind != "auto" else guess_kind(path)
+        openers = {"vector": [self.open_vector], "raster": [self.open_raster]}.get(
+            kind, [self.open_vector, self.open_raster])
+        layer = None
+        try:
+            for opener in openers:
+                layer = opener(path, name)
+                if layer.isValid():
+                    break
+                layer = None
+        except Exception as e:
+            entry.update(status="error", message=str(e))
+            return None, entry
+        entry["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        if layer is None:
+            entry.update(status="error", message=f"Invalid layer: {path}")
+            return None, entry
+
+        if self.main_thread is not None:
+            layer.moveToThread(self.main_thread)
+        entry.update(status="success", layer_id=layer.id(),
+                     type="raster" if isinstance(layer, QgsRasterLayer) else "vector")
+        return layer, entry
+
+    def open_all(self):
+        """Open every path; returns (layers, entries) with entries in the order of the paths"""
+        workers = min(self.max_workers, len(self.paths))
+        if workers == 1:
+            outcomes = [self.open(path) for path in self.paths]
+        else:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="qgis-mcp-load") as executor:
+                outcomes = list(executor.map(self.open, self.paths))
+        return [layer for layer, _ in outcomes if layer is not None], [entry for _, entry in outcomes]
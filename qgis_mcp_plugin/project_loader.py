@@ -0,0 +1,149 @@
+"""
+Lazy, incremental project loading for load_project with lazy=true.
+"""
+import os
+import time
+import uuid
+from collections import deque
+
+from qgis.core import QgsDataProvider, QgsProject
+from qgis.PyQt.QtCore import QObject, QTimer, pyqtSignal
+
+from .jobs import Job
+
+
+class ProjectLoadJob(Job):
+    """A lazy project load, tracked by the JobManager like a processing job"""
+
+    def __init__(self, job_id, path, trust_metadata=True):
+        super().__init__(job_id)
+        self.path = path
+        self.trust_metadata = trust_metadata
+        self.pending = deque()
+        self.total = 0
+        self.loaded = 0
+        self.failed = []
+        self.started = time.perf_counter()
+        self.cancelled = False
+
+    def cancel(self):
+        # Takes effect before the next layer is resolved
+        self.cancelled = True
+
+    def to_dict(self):
+        return dict(
+            super().to_dict(),
+            algorithm="load_project",
+            path=self.path,
+            layers_total=self.total,
+            layers_loaded=self.loaded,
+            layers_failed=len(self.failed)
+        )
+
+
+class ProjectLoader(QObject):
+    """Run lazy project loads on the main thread's event loop"""
+    # job ID and the layer_loaded event to push to the job's subscribers
+    layerLoaded = pyqtSignal(str, dict)
+
+    def __init__(self, jobs, parent=None):
+        super().__init__(parent)
+        self.jobs = jobs
+        self.current = None
+
+    def start(self, path, trust_metadata=True):
+        """Register a load job and start reading once the reply with its ID has been sent"""
+        if not path or not os.path.exists(path):
+            raise FileNotFoundError(f"Project not found: {path}")
+        if self.current is not None and not self.current.finished:
+            # Only one project can be open, so an older load has nothing left to do
+            self.current.cancel()
+        job = self.jobs.track(ProjectLoadJob(uuid.uuid4().hex, path, trust_metadata))
+        self.current = job
+        QTimer.singleShot(0, lambda: self.read(job))
+        return job
+
+    def read(self, job):
+        if job.cancelled:
+            return self.finish(job, "cancelled")
+        job.status = "running"
+        self.jobs.jobProgress.emit(job.id)
+
+        project = QgsProject.instance()
+        flags = QgsProject.ReadFlags()
+        flags |= QgsProject.FlagDontResolveLayers
+        if job.trust_metadata:
+            flags |= QgsProject.FlagTrustLayerMetadata
+        if not project.read(job.path, flags):
+            job.error = project.error() or f"Could not read {job.path}"
+            return self.finish(job, "failed")
+
+        # Top of the layer tree first, since those are the layers users look at
+        ordered = project.layerTreeRoot().findLayerIds()
+        in_tree = set(ordered)
+        ordered += [layer_id for layer_id in project.mapLayers() if layer_id not in in_tree]
+        job.pending = deque(ordered)
+        job.total = len(ordered)
+        QTimer.singleShot(0, lambda: self.resolve_next(job))
+
+    def resolve_next(self, job):
+        """Open one layer's datasource, then yield to the event loop"""
+        if job.cancelled:
+            return self.finish(job, "cancelled")
+        if not job.pending:
+            return self.finish(job, "succeeded")
+
+        layer = QgsProject.instance().mapLayer(job.pending.popleft())
+        if layer is not None:
+            error = None
+            try:
+                if not layer.isValid():
+                    self.resolve(layer, job.trust_metadata)
+                if not layer.isValid():
+                    error = layer.error().summary() or "Datasource could not be opened"
+            except Exception as e:
+                error = str(e)
+            if error is None:
+                job.loaded += 1
+            else:
+                job.failed.append({"layer_id": layer.id(), "name": layer.name(), "error": error})
+            self.layerLoaded.emit(job.id, {
+                "event": "layer_loaded",
+                "job_id": job.id,
+                "layer_id": layer.id(),
+                "name": layer.name(),
+                "valid": error is None,
+                "error": error,
+                "loaded": job.loaded,
+                "failed": len(job.failed),
+                "total": job.total
+            })
+
+        previous = int(job.progress)
+        job.progress = 100.0 * (job.total - len(job.pending)) / job.total
+        if int(job.progress) != previous:
+            self.jobs.jobProgress.emit(job.id)
+        QTimer.singleShot(0, lambda: self.resolve_next(job))
+
+    @staticmethod
+    def resolve(layer, trust_metadata):
+        options = QgsDataProvider.ProviderOptions()
+        options.transformContext = QgsProject.instance().transformContext()
+        flags = QgsDataProvider.ReadFlags()
+        if trust_metadata:
+            flags |= QgsDataProvider.FlagTrustDataSource
+        layer.setDataSource(layer.source(), layer.name(), layer.providerType(), options, flags)
+
+    def finish(self, job, status):
+        job.status = status
+        if status == "succeeded":
+            job.progress = 100.0
+            job.result = {
+                "path": job.path,
+                "layer_count": job.total,
+                "loaded": job.loaded,
+                "failed": job.failed,
+                "elapsed_ms": round((time.perf_counter() - job.started) * 1000, 1)
+            }
+        job.pending.clear()
+        self.jobs.jobFinished.emit(job.id)
@@ -1,27 +1,190 @@
 import os
 import json
+import base64
 import socket
+import select
+import time
 import traceback
+import inspect
+from collections import deque
 from qgis.core import *
 from qgis.gui import *
-from qgis.PyQt.QtCore import QObject, pyqtSignal, QTimer, Qt, QSize
+from qgis.PyQt.QtCore import QObject, pyqtSignal, QTimer, Qt, QSize, QSocketNotifier
 from qgis.PyQt.QtWidgets import (QAction, QDockWidget, QVBoxLayout, 
-                                QLabel, QPushButton, QSpinBox, QWidget)
+                                QLabel, QPushButton, QSpinBox, QWidget, QComboBox)
 from qgis.PyQt.QtGui import QIcon, QColor
 from qgis.utils import active_plugins
+import processing
+
+from . import protocol
+from .batch import StepReferenceError, resolve_references
+from .code_runner import CodeRunner
+from .features import FORMATS, FeatureQuery
+from .jobs import JobManager
+from .layer_index import LayerIndex
+from .loading import LayerLoader
+from .metrics import Metrics
+from .project_loader import ProjectLoader
+from .rendering import MapRenderer, image_format
+from .saving import BackgroundSave, ProjectSaver
+from .spatial import SpatialIndexCache, SpatialQuery
+from .statistics import Aggregation, StatisticsCache
+from .workers import Deferred, ReadPool
+
+class ClientConnection:
+    """State of one connected client: its socket, decoder and pending output"""
+    # Streamed responses are only pulled while less than this is waiting to be sent
+    HIGH_WATER = 1 << 20
+
+    def __init__(self, sock, addr):
+        self.socket = sock
+        self.addr = addr
+        self.framed = None
+        self.buffer = b''
+        self.decoder = protocol.FrameDecoder()
+        self.outbox = bytearray()
+        self.streams = deque()
+        self.closed = False
+        self.read_notifier = None
+        self.write_notifier = None
+    
+    def fileno(self):
+        return self.socket.fileno()
+    
+    def read_commands(self, data):
+        """Decode the complete commands contained in newly received data"""
+        if self.framed is None:
+            self.framed = protocol.looks_framed(data)
+        
+        if self.framed:
+            commands = []
+            for kind, payload in self.decoder.feed(data):
+                if kind != protocol.KIND_JSON:
+                    raise protocol.ProtocolError(f"Unexpected frame kind: {kind}")
+                commands.append(protocol.decode_json(payload))
+            return commands
+        
+        # Legacy bare JSON client: only try to parse once the data could end a document
+        self.buffer += data
+        if not self.buffer.rstrip().endswith(b'}'):
+            return []
+        try:
+            command = json.loads(self.buffer.decode('utf-8'))
+        except json.JSONDecodeError:
+            return []
+        self.buffer = b''
+        return [command]
+    
+    def encode(self, response):
+        """Encode a response the way the client talks"""
+        if isinstance(response, protocol.BinaryMessage):
+            if self.framed:
+                return protocol.encode_binary(response.message, response.body)
+            response = dict(response.message,
+                            body_base64=base64.b64encode(protocol.body_bytes(response.body)).decode('ascii'))
+        if self.framed:
+            return protocol.encode_json(response)
+        return json.dumps(response).encode('utf-8')
+
+    def queue_response(self, response):
+        """Encode a response and queue it for sending"""
+        self.queue_bytes(self.encode(response))
+    
+    def queue_bytes(self, data):
+        self.outbox += data
+        self.flush()
+    
+    def queue_stream(self, request_id, messages):
+        """Send the messages of a streamed response as the socket drains"""
+        self.streams.append((request_id, messages))
+        self.pump()
+    
+    def pump(self):
+        """Move streamed messages into the outbox while it is below the high-water mark"""
+        while self.streams and len(self.outbox) < self.HIGH_WATER:
+            request_id, messages = self.streams[0]
+            try:
+                message = next(messages)
+            except StopIteration:
+                self.streams.popleft()
+                continue
+            except Exception as e:
+                self.streams.popleft()
+                message = {"status": "error", "message": str(e)}
+            if request_id is not None:
+                target = message.message if isinstance(message, protocol.BinaryMessage) else message
+                target["id"] = request_id
+            self.outbox += self.encode(message)
+            self.flush()
+    
+    @property
+    def wants_write(self):
+        return bool(self.outbox or self.streams)
+    
+    def flush(self):
+        """Send as much queued output as the socket accepts without blocking"""
+        while self.outbox:
+            try:
+                sent = self.socket.send(self.outbox)
+            except BlockingIOError:
+                return
+            del self.outbox[:sent]
+    
+    def close(self):
+        self.closed = True
+        # Notifiers must be disabled before their descriptor goes away
+        for notifier in (self.read_notifier, self.write_notifier):
+            if notifier:
+                notifier.setEnabled(False)
+                notifier.deleteLater()
+        self.read_notifier = None
+        self.write_notifier = None
+        self.socket.close()
 
 class QgisMCPServer(QObject):
-    """Server class to handle socket connections"""
-    def __init__(self, host='localhost', port=9876, iface=None):
+    """Server class to handle socket connections
+
+    With ``dispatch="notifier"`` (the default) sockets are watched with
+    QSocketNotifier, so commands are handled as soon as data arrives and the
+    main thread is never woken while the server is idle.  ``dispatch="poll"``
+    keeps the previous behaviour of checking the sockets every 100 ms.
+
+    Read-only commands (feature reads, aggregate, spatial_query) run on a
+    pool of ``read_workers`` threads; with ``read_workers=0`` they run on
+    the main thread like every other command.
+    """
+    DISPATCH_MODES = ("notifier", "poll")
+
+    def __init__(self, host='localhost', port=9876, iface=None, backlog=16, dispatch="notifier",
+                 read_workers=None):
         super().__init__()
+        if dispatch not in self.DISPATCH_MODES:
+            raise ValueError(f"Unknown dispatch mode: {dispatch}")
         self.host = host
         self.port = port
         self.iface = iface
+        self.backlog = backlog
+        self.dispatch = dispatch
         self.running = False
         self.socket = None
-        self.client = None
-        self.buffer = b''
+        self.clients = {}
         self.timer = None
+        self.accept_notifier = None
+        self.jobs = JobManager(self)
+        self.renderer = MapRenderer(iface, parent=self)
+        self.jobs.jobProgress.connect(lambda job_id: self.push_job_event("job_progress", job_id))
+        self.jobs.jobFinished.connect(lambda job_id: self.push_job_event("job_finished", job_id))
+        self.project_loader = ProjectLoader(self.jobs, parent=self)
+        self.saver = ProjectSaver()
+        self.project_loader.layerLoaded.connect(self.push_job_message)
+        self.layer_index = LayerIndex(parent=self)
+        self.layer_index.layerEvent.connect(self.push_layer_event)
+        self.layer_subscribers = set()
+        self.statistics = StatisticsCache()
+        self.spatial_indexes = SpatialIndexCache()
+        self.code_runner = CodeRunner(iface)
+        self.read_pool = ReadPool(read_workers, parent=self) if read_workers != 0 else None
+        self.metrics = Metrics()
     
     def start(self):
         """Start the server"""
@@ -30,14 +193,18 @@ class QgisMCPServer(QObject):
             self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
             self.socket.bind((self.host, self.port))
-            self.socket.listen(1)
+            self.socket.listen(self.backlog)
             self.socket.setblocking(False)
             
-            self.timer = QTimer()
-            self.timer.timeout.connect(self.process_server)
-            self.timer.start(100)
+            if self.dispatch == "notifier":
+                self.accept_notifier = QSocketNotifier(self.socket.fileno(), QSocketNotifier.Read, self)
+                self.accept_notifier.activated.connect(self.accept_clients)
+            else:
+                self.timer = QTimer()
+                self.timer.timeout.connect(self.process_server)
+                self.timer.start(100)
             
-            QgsMessageLog.logMessage(f"Server started on {self.host}:{self.port}", "QGIS MCP")
+            QgsMessageLog.logMessage(f"Server started on {self.host}:{self.port} ({self.dispatch} dispatch)", "QGIS MCP")
             return True
         except Exception as e:
             QgsMessageLog.logMessage(f"Failed to start server: {str(e)}", "QGIS MCP", Qgis.Critical)
@@ -47,60 +214,210 @@ class QgisMCPServer(QObject):
     def stop(self):
         """Stop the server"""
         self.running = False
+        self.jobs.cancel_all()
+        self.layer_index.close()
+        self.layer_subscribers.clear()
+        self.statistics.clear()
+        self.spatial_indexes.clear()
+        if self.read_pool:
+            self.read_pool.shutdown()
         if self.timer:
             self.timer.stop()
+        if self.accept_notifier:
+            self.accept_notifier.setEnabled(False)
+            self.accept_notifier.deleteLater()
+            self.accept_notifier = None
         if self.socket:
             self.socket.close()
-        if self.client:
-            self.client.close()
+        for client in list(self.clients.values()):
+            client.close()
+        self.clients.clear()
         QgsMessageLog.logMessage("Server stopped", "QGIS MCP")
     
     def process_server(self):
-        """Handle incoming connections"""
+        """Accept pending connections and serve every client with data ready"""
         if not self.running:
             return
             
         try:
-            # Accept new connection
-            if not self.client:
-                try:
-                    self.client, addr = self.socket.accept()
-                    self.client.setblocking(False)
-                    QgsMessageLog.logMessage(f"Client connected: {addr}", "QGIS MCP")
-                except BlockingIOError:
-                    pass
-                except Exception as e:
-                    QgsMessageLog.logMessage(f"Connection error: {str(e)}", "QGIS MCP", Qgis.Warning)
+            self.accept_clients()
+            if not self.clients:
+                return
             
-            # Process client
-            if self.client:
-                try:
-                    data = self.client.recv(8192)
-                    if data:
-                        self.buffer += data
-                        try:
-                            command = json.loads(self.buffer.decode('utf-8'))
-                            self.buffer = b''
-                            QgsMessageLog.logMessage(f"Received command: {command}", "QGIS MCP")
-                            response = self.execute_command(command)
-                            self.client.sendall(json.dumps(response).encode('utf-8'))
-                        except json.JSONDecodeError:
-                            pass
-                    else:
-                        self.client.close()
-                        self.client = None
-                        self.buffer = b''
-                except BlockingIOError:
-                    pass
-                except Exception as e:
-                    QgsMessageLog.logMessage(f"Client error: {str(e)}", "QGIS MCP", Qgis.Warning)
-                    self.client.close()
-                    self.client = None
-                    self.buffer = b''
+            clients = list(self.clients.values())
+            pending = [client for client in clients if client.wants_write]
+            readable, writable, _ = select.select(clients, pending, [], 0)
+            for client in writable:
+                self.flush_client(client)
+            for client in readable:
+                self.serve_client(client)
                     
         except Exception as e:
             QgsMessageLog.logMessage(f"Server error: {str(e)}", "QGIS MCP", Qgis.Critical)
 
+    def accept_clients(self, *args):
+        """Accept every connection waiting in the listen backlog"""
+        while True:
+            try:
+                sock, addr = self.socket.accept()
+            except BlockingIOError:
+                return
+            except Exception as e:
+                QgsMessageLog.logMessage(f"Connection error: {str(e)}", "QGIS MCP", Qgis.Warning)
+                return
+            sock.setblocking(False)
+            client = ClientConnection(sock, addr)
+            self.clients[client.fileno()] = client
+            if self.dispatch == "notifier":
+                self.watch_client(client)
+            QgsMessageLog.logMessage(f"Client connected: {addr}", "QGIS MCP")
+
+    def watch_client(self, client):
+        """Serve a client whenever its socket becomes readable or writable"""
+        client.read_notifier = QSocketNotifier(client.fileno(), QSocketNotifier.Read, self)
+        client.read_notifier.activated.connect(lambda *args: self.serve_client(client))
+        client.write_notifier = QSocketNotifier(client.fileno(), QSocketNotifier.Write, self)
+        client.write_notifier.setEnabled(False)
+        client.write_notifier.activated.connect(lambda *args: self.flush_client(client))
+
+    def update_write_notifier(self, client):
+        """Only ask for writability while output is waiting to be sent"""
+        if client.write_notifier and not client.closed:
+            client.write_notifier.setEnabled(client.wants_write)
+
+    def serve_client(self, client):
+        """Drain a readable client socket and answer every complete command"""
+        try:
+            while True:
+                try:
+                    data = client.socket.recv(65536)
+                except BlockingIOError:
+                    break
+                if not data:
+                    self.close_client(client)
+                    return
+                received = time.perf_counter()
+                for command in client.read_commands(data):
+                    self.handle_command(client, command, received)
+            self.update_write_notifier(client)
+        except Exception as e:
+            QgsMessageLog.logMessage(f"Client error: {str(e)}", "QGIS MCP", Qgis.Warning)
+            self.close_client(client)
+
+    def flush_client(self, client):
+        try:
+            client.flush()
+            client.pump()
+            self.update_write_notifier(client)
+        except Exception as e:
+            QgsMessageLog.logMessage(f"Client error: {str(e)}", "QGIS MCP", Qgis.Warning)
+            self.close_client(client)
+
+    def handle_command(self, client, command, received=None):
+        """Execute one command and queue its response, tagged with the request ID"""
+        command_type = command.get("type")
+        started = time.perf_counter()
+        if received is not None:
+            # Commands that arrived together wait for the ones ahead of them
+            self.metrics.observe("queue_wait_seconds", started - received, command=command_type)
+        response = self.execute_command(command)
+        if isinstance(response, Deferred):
+            if self.read_pool is None:
+                response = response.run_inline()
+            else:
+                self.read_pool.submit(response, lambda result: self.finish_deferred(client, command, result, started))
+                return
+        self.metrics.observe("execute_seconds", time.perf_counter() - started, command=command_type)
+        self.send_response(client, command, response)
+
+    def finish_deferred(self, client, command, response, started):
+        """Send the response of a command that ran on the read pool"""
+        self.metrics.observe("execute_seconds", time.perf_counter() - started, command=command.get("type"))
+        if client.closed:
+            return
+        try:
+            self.send_response(client, command, response)
+            self.update_write_notifier(client)
+        except Exception as e:
+            QgsMessageLog.logMessage(f"Client error: {str(e)}", "QGIS MCP", Qgis.Warning)
+            self.close_client(client)
+
+    def send_response(self, client, command, response):
+        if inspect.isgenerator(response):
+            if client.framed:
+                client.queue_stream(command.get("id"), response)
+                return
+            response = self.collect_stream(response)
+        target = response.message if isinstance(response, protocol.BinaryMessage) else response
+        if "id" in command:
+            target["id"] = command["id"]
+        command_type = command.get("type")
+        self.metrics.inc("commands_total", command=command_type, status=target.get("status"))
+        with self.metrics.span("serialize_seconds", command=command_type):
+            data = client.encode(response)
+        client.queue_bytes(data)
+        if command.get("type") == "hello" and response.get("status") == "success":
+            client.framed = True
+        if (command.get("params", {}).get("subscribe") and client.framed and target.get("status") == "success"
+                and command.get("type") in ("submit_job", "load_project")
+                and "job_id" in target["result"]):
+            self.jobs.get(target["result"]["job_id"]).subscribers.add(client)
+        if command.get("type") == "subscribe_layers" and response.get("status") == "success" and client.framed:
+            self.layer_subscribers.add(client)
+
+    def push_job_event(self, event, job_id):
+        """Send a job's progress or completion to the clients subscribed to it"""
+        job = self.jobs.jobs.get(job_id)
+        if job is not None:
+            self.push_job_message(job_id, {"event": event, "job": job.to_dict()})
+    
+    def push_job_message(self, job_id, message):
+        """Send an event to the clients subscribed to a job"""
+        job = self.jobs.jobs.get(job_id)
+        if job is None:
+            return
+        for client in list(job.subscribers):
+            if client.closed:
+                job.subscribers.discard(client)
+                continue
+            client.queue_response(message)
+            self.update_write_notifier(client)
+        if job.finished:
+            job.subscribers.clear()
+
+    def push_layer_event(self, message):
+        """Send a layer index change to the clients subscribed to layer events"""
+        for client in list(self.layer_subscribers):
+            if client.closed:
+                self.layer_subscribers.discard(client)
+                continue
+            client.queue_response(message)
+            self.update_write_notifier(client)
+
+    def collect_stream(self, messages):
+        """Merge a streamed response into one message for clients that cannot take frames"""
+        features = []
+        try:
+            for message in messages:
+                if isinstance(message, protocol.BinaryMessage):
+                    return {"status": "error", "message": "Streaming binary batches needs a framed connection"}
+                if message.get("status") != "partial":
+                    break
+                features.extend(message["result"]["features"])
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+        if message.get("status") == "success":
+            message["result"]["features"] = features
+        return message
+
+    def close_client(self, client):
+        """Drop a client and any partially received message"""
+        if client.closed:
+            return
+        self.clients.pop(client.fileno(), None)
+        client.close()
+        QgsMessageLog.logMessage(f"Client disconnected: {client.addr}", "QGIS MCP")
+
     def execute_command(self, command):
         """Execute QGIS commands"""
         try:
@@ -110,10 +427,8 @@ class QgisMCPServer(QObject):
             # Clean None values from params
             params = {k: v for k, v in params.items() if v is not None}
             
-            QgsMessageLog.logMessage(f"Executing {cmd} with {params}", "QGIS MCP")
-            
             if cmd == "create_new_project":
-                return self.create_project(params.get("path"))
+                return self.create_project(params.get("path"), params.get("mode", "full"))
             elif cmd == "add_vector_layer":
                 return self.add_vector_layer(
                     params.get("path"),
@@ -126,12 +441,28 @@ class QgisMCPServer(QObject):
                     params.get("provider", "gdal"),
                     params.get("name")
                 )
+            elif cmd == "add_layers":
+                return self.add_layers(
+                    params.get("paths"),
+                    params.get("kind", "auto"),
+                    params.get("provider")
+                )
             elif cmd == "load_project":
-                return self.load_project(params.get("path"))
+                return self.load_project(
+                    params.get("path"),
+                    params.get("lazy", False),
+                    params.get("trust_metadata", True)
+                )
             elif cmd == "save_project":
-                return self.save_project(params.get("path"))
+                return self.save_project(
+                    params.get("path"),
+                    params.get("mode", "full"),
+                    params.get("force", False)
+                )
             elif cmd == "get_layers":
-                return self.get_layers()
+                return self.get_layers(params.get("details", False))
+            elif cmd == "subscribe_layers":
+                return {"status": "success", "result": self.layer_index.snapshot()}
             elif cmd == "remove_layer":
                 return self.remove_layer(params.get("layer_id"))
             elif cmd == "zoom_to_layer":
@@ -139,25 +470,96 @@ class QgisMCPServer(QObject):
             elif cmd == "get_layer_features":
                 return self.get_layer_features(
                     params.get("layer_id"),
-                    params.get("limit", 10)
+                    params.get("limit", 10),
+                    offset=params.get("offset", 0),
+                    fields=params.get("fields"),
+                    no_geometry=params.get("no_geometry", False),
+                    expression=params.get("expression"),
+                    bbox=params.get("bbox"),
+                    page_token=params.get("page_token"),
+                    stream=params.get("stream", False),
+                    chunk_size=params.get("chunk_size", 1000),
+                    fmt=params.get("format", "json")
+                )
+            elif cmd == "aggregate":
+                return self.aggregate(
+                    params.get("layer_id"),
+                    fields=params.get("fields"),
+                    group_by=params.get("group_by"),
+                    stats=params.get("stats"),
+                    percentiles=params.get("percentiles"),
+                    expression=params.get("expression"),
+                    max_groups=params.get("max_groups", 1000),
+                    use_cache=params.get("cache", True)
+                )
+            elif cmd == "spatial_query":
+                return self.spatial_query(
+                    params.get("layer_id"),
+                    bbox=params.get("bbox"),
+                    geometry=params.get("geometry"),
+                    point=params.get("point"),
+                    k=params.get("k", 1),
+                    max_distance=params.get("max_distance", 0.0),
+                    crs=params.get("crs"),
+                    fields=params.get("fields"),
+                    returns=params.get("return", "ids"),
+                    limit=params.get("limit")
                 )
             elif cmd == "execute_processing":
                 return self.execute_processing(
                     params.get("algorithm"),
                     params.get("parameters", {})
                 )
+            elif cmd == "submit_job":
+                return self.submit_job(
+                    params.get("algorithm"),
+                    params.get("parameters", {})
+                )
+            elif cmd == "job_status":
+                return self.job_status(params.get("job_id"))
+            elif cmd == "job_result":
+                return self.job_result(params.get("job_id"))
+            elif cmd == "cancel_job":
+                return self.cancel_job(params.get("job_id"))
             elif cmd == "render_map":
                 return self.render_map(
                     params.get("path"),
                     params.get("width", 800),
-                    params.get("height", 600)
+                    params.get("height", 600),
+                    dpi=params.get("dpi", 96),
+                    parallel=params.get("parallel", True),
+                    fmt=params.get("format"),
+                    quality=params.get("quality", -1),
+                    if_none_match=params.get("if_none_match")
+                )
+            elif cmd == "render_tile":
+                return self.render_tile(
+                    params.get("z"),
+                    params.get("x"),
+                    params.get("y"),
+                    params.get("size", 256)
                 )
             elif cmd == "execute_code":
-                return self.execute_code(params.get("code"))
+                return self.execute_code(
+                    params.get("code"),
+                    session=params.get("session"),
+                    reset_session=params.get("reset_session", False)
+                )
+            elif cmd == "end_code_session":
+                return self.end_code_session(params.get("session"))
             elif cmd == "get_qgis_info":
                 return self.get_qgis_info()
+            elif cmd == "batch":
+                return self.run_batch(
+                    params.get("steps", []),
+                    params.get("stop_on_error", True)
+                )
+            elif cmd == "get_metrics":
+                return {"status": "success", "result": self.metrics_snapshot()}
             elif cmd == "ping":
                 return {"status": "success", "result": {"pong": True}}
+            elif cmd == "hello":
+                return {"status": "success", "result": {"protocol": protocol.PROTOCOL_VERSION}}
             else:
                 return {"status": "error", "message": f"Unknown command: {cmd}"}
                 
@@ -165,23 +567,34 @@ class QgisMCPServer(QObject):
             QgsMessageLog.logMessage(f"Command error: {traceback.format_exc()}", "QGIS MCP", Qgis.Critical)
             return {"status": "error", "message": str(e)}
     
-    def create_project(self, path):
+    def metrics_snapshot(self):
+        """Stage timings, plus render cache and code runner state and per-snippet timings"""
+        snapshot = self.metrics.snapshot()
+        render_cache = self.renderer.cache.stats()
+        code_runner = self.code_runner.stats()
+        snapshot["counters"] += [
+            {"name": "render_cache_hits_total", "labels": {}, "value": render_cache["hits"]},
+            {"name": "render_cache_misses_total", "labels": {}, "value": render_cache["misses"]}
+        ]
+        snapshot["gauges"] = [
+            {"name": "render_cache_entries", "labels": {}, "value": render_cache["entries"]},
+            {"name": "render_cache_bytes", "labels": {}, "value": render_cache["bytes"]},
+            {"name": "code_runner_compiled", "labels": {}, "value": code_runner["compiled"]},
+            {"name": "code_runner_sessions", "labels": {}, "value": code_runner["sessions"]}
+        ]
+        snapshot["render_cache"] = render_cache
+        snapshot["code_runner"] = code_runner
+        return snapshot
+    
+    def create_project(self, path, mode="full"):
         try:
             project = QgsProject.instance()
             project.clear()
             project.setFileName(path)
-            if project.write():
-                return {
-                    "status": "success",
-                    "result": {
-                        "created": f"Project created and saved successfully at: {path}",
-                        "layer_count": len(project.mapLayers())
-                    }
-                }
-            return {
-                "status": "error",
-                "message": project.error()
-            }
+            return self.write_project(project, path, mode, True, lambda saved: {
+                "created": f"Project created and saved successfully at: {saved['path']}",
+                "layer_count": len(project.mapLayers())
+            })
         except Exception as e:
             return {"status": "error", "message": str(e)}
     
@@ -221,33 +634,54 @@ class QgisMCPServer(QObject):
         except Exception as e:
             return {"status": "error", "message": str(e)}
     
-    def load_project(self, path):
+    def add_layers(self, paths, kind="auto", provider=None):
+        """Open many layers on worker threads and add the valid ones to the project in one call"""
         try:
-            project = QgsProject.instance()
-            if project.read(path):
+            if not paths:
+                return {"status": "error", "message": "No paths given"}
+            loader = LayerLoader(paths, kind, provider, QgsProject.instance().transformContext())
+            
+            def finish(outcome):
+                layers, entries = outcome
+                canvas = self.iface.mapCanvas() if self.iface else None
+                if canvas is not None:
+                    canvas.freeze(True)
+                try:
+                    added = {layer.id() for layer in QgsProject.instance().addMapLayers(layers)} if layers else set()
+                finally:
+                    if canvas is not None:
+                        canvas.freeze(False)
+                        canvas.refresh()
+                for entry in entries:
+                    if entry["status"] == "success" and entry["layer_id"] not in added:
+                        entry.update(status="error", message="Layer could not be added to the project")
+                        entry.pop("layer_id")
                 return {
                     "status": "success",
                     "result": {
-                        "loaded": f"Project loaded from: {path}",
-                        "layer_count": len(project.mapLayers())
+                        "added": len(added),
+                        "failed": len(entries) - len(added),
+                        "layers": entries
                     }
                 }
-            return {
-                "status": "error",
-                "message": project.error()
-            }
+            return Deferred(loader.open_all, finish)
         except Exception as e:
             return {"status": "error", "message": str(e)}
     
-    def save_project(self, path):
+    def load_project(self, path, lazy=False, trust_metadata=True):
+        """Read a project; lazy returns a job at once and opens the layers one by one afterwards"""
         try:
+            if lazy:
+                return {
+                    "status": "success",
+                    "result": self.project_loader.start(path, trust_metadata).to_dict()
+                }
             project = QgsProject.instance()
-            project.setFileName(path)
-            if project.write():
+            if project.read(path):
                 return {
                     "status": "success",
                     "result": {
-                        "saved": f"Project saved to: {path}",
+                        "loaded": f"Project loaded from: {path}",
                         "layer_count": len(project.mapLayers())
                     }
                 }
@@ -258,21 +692,44 @@ class QgisMCPServer(QObject):
         except Exception as e:
             return {"status": "error", "message": str(e)}
     
-    def get_layers(self):
+    def save_project(self, path=None, mode="full", force=False):
+        """Save the project unless nothing changed since the last save; mode is full, fast or background"""
         try:
-            layers = QgsProject.instance().mapLayers()
+            project = QgsProject.instance()
+            path = path or project.fileName()
+            if not path:
+                return {"status": "error", "message": "The project has no file name yet, give a path"}
+            return self.write_project(project, path, mode, force, lambda saved: {
+                "saved": f"Project {'unchanged at' if saved['skipped'] else 'saved to'}: {saved['path']}",
+                "layer_count": len(project.mapLayers())
+            })
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+    
+    def write_project(self, project, path, mode, force, describe):
+        """Reply for a save through the ProjectSaver; background compression is finished on the read pool"""
+        def reply(saved):
+            return {"status": "success", "result": dict(describe(saved), **saved)}
+        
+        saved = self.saver.save(project, path, mode, force)
+        if isinstance(saved, BackgroundSave):
+            return Deferred(saved.work, lambda size: reply(saved.finish(size)))
+        return reply(saved)
+    
+    def get_layers(self, details=False):
+        """Layers from the layer index; details adds provider, extent, geometry type and fields"""
+        try:
+            layers = self.layer_index.layers.values()
+            if not details:
+                layers = [
+                    {"id": info["id"], "name": info["name"], "type": info["type"], "crs": info["crs"]}
+                    for info in layers
+                ]
             return {
                 "status": "success",
                 "result": {
-                    "layers": [
-                        {
-                            "id": layer.id(),
-                            "name": layer.name(),
-                            "type": layer.type().name,
-                            "crs": layer.crs().authid()
-                        }
-                        for layer in layers.values()
-                    ]
+                    "layers": list(layers),
+                    "revision": self.layer_index.revision
                 }
             }
         except Exception as e:
@@ -311,8 +768,13 @@ class QgisMCPServer(QObject):
         except Exception as e:
             return {"status": "error", "message": str(e)}
     
-    def get_layer_features(self, layer_id, limit=10):
+    def get_layer_features(self, layer_id, limit=10, offset=0, fields=None, no_geometry=False,
+                           expression=None, bbox=None, page_token=None, stream=False, chunk_size=1000,
+                           fmt="json"):
         try:
+            if fmt not in FORMATS:
+                return {"status": "error", "message": f"Unknown format: {fmt}"}
+            
             layer = QgsProject.instance().mapLayer(layer_id)
             if not layer or not isinstance(layer, QgsVectorLayer):
                 return {
@@ -320,24 +782,108 @@ class QgisMCPServer(QObject):
                     "message": f"Vector layer {layer_id} not found"
                 }
             
-            features = []
-            for i, feature in enumerate(layer.getFeatures()):
-                if i >= limit:
-                    break
-                features.append(feature.attributes())
+            query = FeatureQuery(layer, fields, no_geometry, expression, bbox, offset, limit, page_token)
+            if stream:
+                return self.stream_layer_features(query, chunk_size, fmt)
             
-            return {
-                "status": "success",
-                "result": {
-                    "layer": layer.name(),
-                    "features": features,
-                    "count": len(features)
+            def read():
+                if fmt != "json":
+                    response = query.encode_batch(query.iter_features(), fmt)
+                    response.message["result"].update(query.summary())
+                    return response
+                
+                features = list(query.features())
+                result = query.summary()
+                result["features"] = features
+                return {
+                    "status": "success",
+                    "result": result
                 }
-            }
+            return Deferred(read)
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+    
+    def stream_layer_features(self, query, chunk_size, fmt="json"):
+        """Yield features in "partial" messages of chunk_size, then the query summary"""
+        def partial(chunk):
+            if fmt == "json":
+                return {"status": "partial", "result": {"features": [query.to_dict(f) for f in chunk]}}
+            return query.encode_batch(chunk, fmt, status="partial")
+        
+        chunk = []
+        for feature in query.iter_features():
+            chunk.append(feature)
+            if len(chunk) >= chunk_size:
+                yield partial(chunk)
+                chunk = []
+        if chunk:
+            yield partial(chunk)
+        result = query.summary()
+        result["streamed"] = True
+        yield {"status": "success", "result": result}
+    
+    def aggregate(self, layer_id, fields=None, group_by=None, stats=None, percentiles=None,
+                  expression=None, max_groups=1000, use_cache=True):
+        """Summary statistics of a vector layer, computed in one pass and cached until its data changes"""
+        try:
+            layer = QgsProject.instance().mapLayer(layer_id)
+            if not layer or not isinstance(layer, QgsVectorLayer):
+                return {
+                    "status": "error",
+                    "message": f"Vector layer {layer_id} not found"
+                }
+            
+            aggregation = Aggregation(layer, fields, group_by, stats, percentiles, expression, max_groups)
+            key = aggregation.key()
+            result = self.statistics.get(layer_id, key) if use_cache else None
+            if result is not None:
+                return {"status": "success", "result": dict(result, cached=True)}
+            
+            self.statistics.watch(layer)
+            generation = self.statistics.generation(layer_id)
+            
+            def finish(result):
+                if use_cache:
+                    self.statistics.put(layer_id, key, result, generation)
+                return {"status": "success", "result": dict(result, cached=False)}
+            return Deferred(aggregation.run, finish)
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+    
+    def spatial_query(self, layer_id, bbox=None, geometry=None, point=None, k=1, max_distance=0.0,
+                      crs=None, fields=None, returns="ids", limit=None):
+        """Features in a bbox, intersecting a WKT geometry or nearest to a point, via a cached spatial index"""
+        try:
+            layer = QgsProject.instance().mapLayer(layer_id)
+            if not layer or not isinstance(layer, QgsVectorLayer):
+                return {
+                    "status": "error",
+                    "message": f"Vector layer {layer_id} not found"
+                }
+            
+            query = SpatialQuery(layer, bbox, geometry, point, k, max_distance, crs, fields, returns, limit)
+            cached_index = self.spatial_indexes.get(layer_id)
+            self.spatial_indexes.watch(layer)
+            generation = self.spatial_indexes.generation(layer_id)
+            
+            def search():
+                index, build_time = (cached_index, None) if cached_index is not None else query.build_index()
+                return index, build_time, query.result(*query.run(index))
+            
+            def finish(outcome):
+                index, build_time, result = outcome
+                if build_time is not None:
+                    self.spatial_indexes.put(layer_id, index, generation)
+                    QgsMessageLog.logMessage(
+                        f"Built spatial index of {query.layer_name} in {build_time:.2f}s", "QGIS MCP")
+                result["index_built"] = build_time is not None
+                return {"status": "success", "result": result}
+            return Deferred(search, finish)
         except Exception as e:
             return {"status": "error", "message": str(e)}
     
     def execute_processing(self, algorithm, parameters):
+        """Run a processing algorithm to completion and return its outputs; submit_job runs it in the background"""
         try:
             result = processing.run(algorithm, parameters)
             return {
@@ -347,41 +893,163 @@ class QgisMCPServer(QObject):
         except Exception as e:
             return {"status": "error", "message": str(e)}
     
-    def render_map(self, path, width=800, height=600):
+    def submit_job(self, algorithm, parameters):
+        """Queue a processing algorithm on the task manager and return its job ID at once"""
+        try:
+            job = self.jobs.submit(algorithm, parameters)
+            return {
+                "status": "success",
+                "result": job.to_dict()
+            }
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+    
+    def job_status(self, job_id):
+        try:
+            return {
+                "status": "success",
+                "result": self.jobs.get(job_id).to_dict()
+            }
+        except KeyError as e:
+            return {"status": "error", "message": e.args[0]}
+    
+    def job_result(self, job_id):
+        try:
+            job = self.jobs.get(job_id)
+            if not job.finished:
+                return {"status": "error", "message": f"Job {job_id} is still {job.status}"}
+            if job.status != "succeeded":
+                return {"status": "error", "message": job.error or f"Job {job_id} was {job.status}"}
+            result = job.to_dict()
+            result["outputs"] = job.result
+            return {
+                "status": "success",
+                "result": result
+            }
+        except KeyError as e:
+            return {"status": "error", "message": e.args[0]}
+    
+    def cancel_job(self, job_id):
         try:
-            settings = self.iface.mapCanvas().mapSettings()
-            settings.setOutputSize(QSize(width, height))
+            return {
+                "status": "success",
+                "result": self.jobs.cancel(job_id).to_dict()
+            }
+        except KeyError as e:
+            return {"status": "error", "message": e.args[0]}
+    
+    def render_map(self, path=None, width=800, height=600, dpi=96, parallel=True, fmt=None,
+                   quality=-1, if_none_match=None):
+        """Render the canvas to a file, or in memory when no path is given
+
+        In-memory renders come back as a binary message with the encoded image
+        as body.  format is png, jpeg, webp or any other format QImageWriter
+        supports (tif, bmp, ...), by default taken from the path's extension,
+        and quality 0-100 (-1 = Qt default).  A matching if_none_match ETag skips rendering and returns
+        not_modified without a body.
+        """
+        try:
+            if not fmt:
+                fmt = (os.path.splitext(path)[1].lstrip('.') if path else "") or "png"
+            settings = self.renderer.canvas_settings(width, height, dpi)
+            data, etag, cached = self.renderer.render(settings, image_format(fmt), quality, parallel,
+                                                      None if path else if_none_match)
+            result = {
+                "dimensions": f"{width}x{height}",
+                "etag": etag,
+                "cached": cached
+            }
             
-            image = QImage(settings.outputSize(), QImage.Format_ARGB32)
-            image.fill(Qt.white)
+            if path:
+                with open(path, 'wb') as image_file:
+                    image_file.write(data)
+                result["saved"] = f"Map image saved to: {path}"
+                return {"status": "success", "result": result}
             
-            painter = QPainter(image)
-            settings.setOutputDpi(96)
-            mapRenderer = QgsMapRendererCustomPainterJob(settings, painter)
-            mapRenderer.start()
-            mapRenderer.waitForFinished()
-            painter.end()
+            if data is None:
+                result["not_modified"] = True
+                return {"status": "success", "result": result}
             
-            image.save(path)
-            return {
+            result["mime_type"] = f"image/{image_format(fmt).lower()}"
+            result["bytes"] = len(data)
+            return protocol.BinaryMessage({"status": "success", "result": result}, data)
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+    
+    def render_tile(self, z, x, y, size=256):
+        """Render one XYZ (EPSG:3857) tile of the canvas layers as a PNG binary message"""
+        try:
+            settings = self.renderer.tile_settings(int(z), int(x), int(y), size)
+            data, etag, cached = self.renderer.render(settings, "PNG")
+            return protocol.BinaryMessage({
                 "status": "success",
                 "result": {
-                    "saved": f"Map image saved to: {path}",
-                    "dimensions": f"{width}x{height}"
+                    "tile": f"{z}/{x}/{y}",
+                    "mime_type": "image/png",
+                    "etag": etag,
+                    "cached": cached
                 }
-            }
+            }, data)
         except Exception as e:
             return {"status": "error", "message": str(e)}
     
-    def execute_code(self, code):
+    def execute_code(self, code, session=None, reset_session=False):
+        """Run a PyQGIS snippet; with a session its variables are kept for the next snippet"""
         try:
             # Security note: In production, this should have proper sandboxing
-            locals_dict = {}
-            exec(code, {"qgis": qgis, "QgsProject": QgsProject}, locals_dict)
             return {
                 "status": "success",
-                "result": locals_dict.get("result", "Code executed")
+                "result": self.code_runner.run(code, session, reset_session)
             }
+        except Exception as e:
+            return {"status": "error", "message": f"{type(e).__name__}: {e}"}
+    
+    def end_code_session(self, session):
+        if self.code_runner.end_session(session):
+            return {"status": "success", "result": f"Session {session} ended"}
+        return {"status": "error", "message": f"Session {session} not found"}
+    
+    def run_batch(self, steps, stop_on_error=True):
+        """Run a list of commands in order in one pass, with $<step>.<path> references between them"""
+        try:
+            responses = []
+            failed = []
+            for index, step in enumerate(steps):
+                if step.get("type") == "batch":
+                    response = {"status": "error", "message": "Batches cannot be nested"}
+                else:
+                    try:
+                        step = dict(step, params=resolve_references(step.get("params", {}), responses))
+                        response = self.execute_command(step)
+                        if isinstance(response, Deferred):
+                            # Later steps may refer to this one, so it cannot wait for the pool
+                            response = response.run_inline()
+                    except StepReferenceError as e:
+                        response = {"status": "error", "message": str(e)}
+                if inspect.isgenerator(response):
+                    response = self.collect_stream(response)
+                if isinstance(response, protocol.BinaryMessage):
+                    # Binary bodies are only returned by single commands
+                    response = response.message
+                responses.append(response)
+                if response.get("status") != "success":
+                    failed.append(index)
+                    if stop_on_error:
+                        break
+            
+            result = {
+                "steps": responses,
+                "completed": len(responses),
+                "skipped": len(steps) - len(responses),
+                "failed": failed
+            }
+            if failed:
+                return {
+                    "status": "error",
+                    "message": f"Step {failed[0]} failed: {responses[failed[0]].get('message')}",
+                    "result": result
+                }
+            return {"status": "success", "result": result}
         except Exception as e:
             return {"status": "error", "message": str(e)}
     
@@ -417,8 +1085,14 @@ class QgisMCPDockWidget(QDockWidget):
         self.port_input.setRange(1024, 65535)
         self.port_input.setValue(9876)
         
+        self.dispatch_input = QComboBox()
+        self.dispatch_input.addItem("Event-driven", "notifier")
+        self.dispatch_input.addItem("Timer polling (100 ms)", "poll")
+        
         layout.addWidget(QLabel("Port:"))
         layout.addWidget(self.port_input)
+        layout.addWidget(QLabel("Dispatch:"))
+        layout.addWidget(self.dispatch_input)
         layout.addWidget(self.status_label)
         layout.addWidget(self.toggle_button)
         widget.setLayout(layout)
@@ -432,7 +1106,8 @@ class QgisMCPDockWidget(QDockWidget):
         else:
             self.server = QgisMCPServer(
                 iface=self.iface,
-                port=self.port_input.value()
+                port=self.port_input.value(),
+                dispatch=self.dispatch_input.currentData()
             )
             if self.server.start():
                 self.status_label.setText(f"Server running on port {self.server.port}")
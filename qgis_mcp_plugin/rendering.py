@@ -0,0 +1,189 @@
+"""
+Map rendering with an in-memory cache of encoded images.
+
+Renders are keyed by everything that changes the picture: extent, output
+size, DPI, destination CRS, the ordered set of rendered layers and a
+per-layer generation counter bumped whenever a layer asks to be repainted
+(edits, style or data changes).  Encoded images are kept in an LRU cache
+bounded by a byte budget, so repeated render_map calls and map tiles for
+an unchanged project cost a dictionary lookup.
+"""
+import hashlib
+from collections import OrderedDict
+
+from qgis.core import (QgsCoordinateReferenceSystem, QgsMapRendererCustomPainterJob,
+                       QgsMapRendererParallelJob, QgsRectangle)
+from qgis.PyQt.QtCore import QBuffer, QByteArray, QIODevice, QObject, QSize
+from qgis.PyQt.QtGui import QColor, QImage, QImageWriter, QPainter
+
+# Half the width of the EPSG:3857 world, in metres
+WEB_MERCATOR_HALF_WORLD = 20037508.342789244
+
+IMAGE_FORMATS = {"png": "PNG", "jpeg": "JPEG", "jpg": "JPEG", "webp": "WEBP"}
+
+
+def image_format(name):
+    """Qt image format name for png / jpeg / webp, or any other format Qt can write (tif, bmp, ...)"""
+    name = name.lower()
+    if name in IMAGE_FORMATS:
+        return IMAGE_FORMATS[name]
+    if name.encode('ascii', 'ignore') in {bytes(fmt).lower() for fmt in QImageWriter.supportedImageFormats()}:
+        return name.upper()
+    raise ValueError(f"Unsupported image format: {name}")
+
+
+def encode_image(image, fmt="PNG", quality=-1):
+    """Encode a QImage in memory and return the bytes"""
+    data = QByteArray()
+    buffer = QBuffer(data)
+    buffer.open(QIODevice.WriteOnly)
+    ok = image.save(buffer, fmt, quality)
+    buffer.close()
+    if not ok:
+        raise RuntimeError(f"Could not encode image as {fmt}")
+    return bytes(data)
+
+
+def tile_extent(z, x, y):
+    """EPSG:3857 extent of an XYZ tile"""
+    if z < 0 or not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        raise ValueError(f"Invalid tile {z}/{x}/{y}")
+    span = 2 * WEB_MERCATOR_HALF_WORLD / 2 ** z
+    xmin = -WEB_MERCATOR_HALF_WORLD + x * span
+    ymax = WEB_MERCATOR_HALF_WORLD - y * span
+    return QgsRectangle(xmin, ymax - span, xmin + span, ymax)
+
+
+class RenderCache:
+    """LRU cache of encoded images bounded by total size in bytes"""
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        data = self.entries.get(key)
+        if data is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return data
+
+    def put(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        if key in self.entries:
+            self.size -= len(self.entries.pop(key))
+        self.entries[key] = data
+        self.size += len(data)
+        while self.size > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= len(evicted)
+
+    def clear(self):
+        self.entries.clear()
+        self.size = 0
+
+    def stats(self):
+        return {
+            "entries": len(self.entries),
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+
+class MapRenderer(QObject):
+    """Render map settings to encoded images, through the render cache"""
+
+    def __init__(self, iface, cache_bytes=64 * 1024 * 1024, parent=None):
+        super().__init__(parent)
+        self.iface = iface
+        self.cache = RenderCache(cache_bytes)
+        self.generations = {}
+
+    def layer_generation(self, layer):
+        """Number of repaints a layer has requested since we started watching it"""
+        layer_id = layer.id()
+        if layer_id not in self.generations:
+            self.generations[layer_id] = 0
+            layer.repaintRequested.connect(lambda *args: self._bump(layer_id))
+            layer.willBeDeleted.connect(lambda: self.generations.pop(layer_id, None))
+        return self.generations[layer_id]
+
+    def _bump(self, layer_id):
+        self.generations[layer_id] = self.generations.get(layer_id, 0) + 1
+
+    def cache_key(self, settings, fmt, quality):
+        extent = settings.extent()
+        size = settings.outputSize()
+        return (
+            round(extent.xMinimum(), 6), round(extent.yMinimum(), 6),
+            round(extent.xMaximum(), 6), round(extent.yMaximum(), 6),
+            size.width(), size.height(), settings.outputDpi(),
+            settings.destinationCrs().authid(), settings.backgroundColor().name(QColor.HexArgb),
+            tuple((layer.id(), self.layer_generation(layer)) for layer in settings.layers()),
+            fmt, quality
+        )
+
+    @staticmethod
+    def etag(key):
+        return hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+
+    def canvas_settings(self, width, height, dpi=96):
+        """Settings of the current map canvas at the requested size"""
+        settings = self.iface.mapCanvas().mapSettings()
+        settings.setOutputSize(QSize(width, height))
+        settings.setOutputDpi(dpi)
+        return settings
+
+    def tile_settings(self, z, x, y, size=256):
+        """Settings for an XYZ tile of the canvas layers, with a transparent background"""
+        settings = self.iface.mapCanvas().mapSettings()
+        settings.setDestinationCrs(QgsCoordinateReferenceSystem("EPSG:3857"))
+        settings.setOutputSize(QSize(size, size))
+        settings.setOutputDpi(96)
+        settings.setExtent(tile_extent(z, x, y))
+        settings.setBackgroundColor(QColor(0, 0, 0, 0))
+        return settings
+
+    def render(self, settings, fmt="PNG", quality=-1, parallel=True, if_none_match=None):
+        """Return ``(image bytes, etag, cached)`` for the given settings
+
+        When ``if_none_match`` equals the current ETag nothing is rendered or
+        encoded and the bytes are None: the caller's copy is still valid.
+        """
+        key = self.cache_key(settings, fmt, quality)
+        etag = self.etag(key)
+        if if_none_match and if_none_match == etag:
+            return None, etag, True
+        data = self.cache.get(key)
+        if data is not None:
+            return data, etag, True
+
+        image = self.render_image(settings, parallel)
+        data = encode_image(image, fmt, quality)
+        self.cache.put(key, data)
+        return data, etag, False
+
+    def render_image(self, settings, parallel=True):
+        """Render settings into a QImage, on QGIS's parallel renderer by default"""
+        if parallel:
+            job = QgsMapRendererParallelJob(settings)
+            job.start()
+            job.waitForFinished()
+            return job.renderedImage()
+
+        image = QImage(settings.outputSize(), QImage.Format_ARGB32_Premultiplied)
+        image.fill(settings.backgroundColor())
+        painter = QPainter(image)
+        job = QgsMapRendererCustomPainterJob(settings, painter)
+        job.start()
+        job.waitForFinished()
+        painter.end()
+        return image
@@ -0,0 +1,123 @@
+"""
+Project saves for save_project and create_project, in full, fast and background modes.
+"""
+import os
+import threading
+import time
+import uuid
+import zipfile
+
+MODES = ("full", "fast", "background")
+
+
+def file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+class ProjectSaver:
+    """Write the project, skipping unchanged saves and compressing .qgz files off the GUI thread"""
+
+    def __init__(self):
+        # Background compressions of the same file must not overtake each other
+        self.lock = threading.Lock()
+        self.sequence = 0
+        self.replaced = {}
+
+    @staticmethod
+    def unchanged(project, path):
+        return (not project.isDirty() and os.path.exists(path)
+                and os.path.abspath(path) == os.path.abspath(project.fileName()))
+
+    def save(self, project, path, mode="full", force=False):
+        """Save the project; returns the reply's result, or a BackgroundSave that finishes it"""
+        if mode not in MODES:
+            raise ValueError(f"Unknown save mode {mode!r}, expected one of {', '.join(MODES)}")
+        started = time.perf_counter()
+        if mode == "fast" and path.lower().endswith(".qgz"):
+            path = path[:-4] + ".qgs"
+        if not force and self.unchanged(project, path):
+            return self.result(path, mode, 0, started, skipped=True)
+
+        if mode != "background" or not path.lower().endswith(".qgz"):
+            if not project.write(path):
+                raise RuntimeError(project.error() or f"Could not write {path}")
+            return self.result(path, mode, file_size(path), started)
+
+        directory, name = os.path.split(os.path.abspath(path))
+        base = os.path.splitext(name)[0]
+        temporary = os.path.join(directory, f".{base}~{uuid.uuid4().hex[:8]}.qgs")
+        if not project.write(temporary):
+            raise RuntimeError(project.error() or f"Could not write {temporary}")
+        # write() switched the project over to the temporary file; it belongs to the .qgz
+        project.setFileName(path)
+        # Clean from here, so edits made while compressing mark it dirty again; a failed compression does too
+        project.setDirty(False)
+        self.sequence += 1
+        return BackgroundSave(self, project, temporary, path, base, self.sequence, started)
+
+    def compress(self, qgs_path, path, base, sequence):
+        """Zip the .qgs (and its auxiliary storage) into the .qgz, unless a newer save got there first"""
+        partial = f"{path}.{sequence}.part"
+        with zipfile.ZipFile(partial, "w", zipfile.ZIP_DEFLATED) as archive:
+            archive.write(qgs_path, f"{base}.qgs")
+            auxiliary = qgs_path[:-4] + ".qgd"
+            if os.path.exists(auxiliary):
+                archive.write(auxiliary, f"{base}.qgd")
+        with self.lock:
+            if self.replaced.get(path, 0) > sequence:
+                os.remove(partial)
+                return 0
+            os.replace(partial, path)
+            self.replaced[path] = sequence
+        return file_size(path)
+
+    @staticmethod
+    def result(path, mode, size, started, skipped=False, **timings):
+        return dict(
+            path=path,
+            mode=mode,
+            skipped=skipped,
+            bytes_written=size,
+            elapsed_ms=round((time.perf_counter() - started) * 1000, 1),
+            **timings
+        )
+
+
+class BackgroundSave:
+    """The .qgz half of a background save: work() runs on a worker thread, finish() back on the main thread"""
+
+    def __init__(self, saver, project, temporary, path, base, sequence, started):
+        self.saver = saver
+        self.project = project
+        self.temporary = temporary
+        self.path = path
+        self.base = base
+        self.sequence = sequence
+        self.started = started
+        self.written = time.perf_counter()
+        self.compressed = None
+        self.error = None
+
+    def work(self):
+        try:
+            return self.saver.compress(self.temporary, self.path, self.base, self.sequence)
+        except Exception as e:
+            self.error = e
+            return 0
+        finally:
+            self.compressed = time.perf_counter()
+            for leftover in (self.temporary, self.temporary[:-4] + ".qgd"):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+
+    def finish(self, size):
+        if self.error is not None:
+            # The .qgz on disk is stale, so the next save must not be skipped as unchanged
+            self.project.setDirty(True)
+            raise self.error
+        return self.saver.result(self.path, "background", size, self.started,
+                                 write_ms=round((self.written - self.started) * 1000, 1),
+                                 compress_ms=round((self.compressed - self.written) * 1000, 1))
@@ -0,0 +1,163 @@
+"""
+Spatial lookups for the spatial_query command.
+
+A QgsSpatialIndex is built for a layer on its first query, with the feature
+geometries stored in the index, and kept until the layer reports a data
+change.  Later bbox, intersects and nearest-neighbour queries then touch
+only the index and the matching features instead of scanning the layer.
+
+Query geometries are in the layer's CRS unless a crs is given, in which
+case they are transformed first.  Indexes are built from, and attributes
+read through, a QgsVectorLayerFeatureSource, so a query can run on a
+worker thread once it has been set up.
+"""
+import time
+from collections import OrderedDict
+
+from qgis.core import (QgsCoordinateReferenceSystem, QgsCoordinateTransform, QgsFeatureRequest,
+                       QgsGeometry, QgsPointXY, QgsProject, QgsRectangle, QgsSpatialIndex,
+                       QgsVectorLayerFeatureSource)
+
+from .features import json_value
+
+RETURNS = ("ids", "attributes")
+
+
+class SpatialIndexCache:
+    """Spatial indexes of the most recently queried layers, dropped when a layer's data changes"""
+
+    def __init__(self, max_layers=8):
+        self.max_layers = max_layers
+        self.indexes = OrderedDict()
+        self.watched = set()
+        self.generations = {}
+        self.builds = 0
+
+    def get(self, layer_id):
+        index = self.indexes.get(layer_id)
+        if index is not None:
+            self.indexes.move_to_end(layer_id)
+        return index
+
+    def generation(self, layer_id):
+        """Bumped on every invalidation; an index built under an older generation is stale"""
+        return self.generations.get(layer_id, 0)
+
+    def put(self, layer_id, index, generation):
+        if layer_id not in self.watched or generation != self.generation(layer_id):
+            return
+        self.builds += 1
+        self.indexes[layer_id] = index
+        while len(self.indexes) > self.max_layers:
+            self.indexes.popitem(last=False)
+
+    def watch(self, layer):
+        layer_id = layer.id()
+        if layer_id in self.watched:
+            return
+        self.watched.add(layer_id)
+        layer.dataChanged.connect(lambda: self.invalidate(layer_id))
+        layer.willBeDeleted.connect(lambda: self.forget(layer_id))
+
+    def invalidate(self, layer_id):
+        self.indexes.pop(layer_id, None)
+        self.generations[layer_id] = self.generation(layer_id) + 1
+
+    def forget(self, layer_id):
+        self.invalidate(layer_id)
+        self.watched.discard(layer_id)
+
+    def clear(self):
+        # Layer signals stay connected; they only drop indexes that no longer exist
+        self.indexes.clear()
+
+
+class SpatialQuery:
+    """One bbox, intersects or nearest-neighbour query against a layer's spatial index"""
+
+    def __init__(self, layer, bbox=None, geometry=None, point=None, k=1, max_distance=0.0, crs=None,
+                 fields=None, returns="ids", limit=None):
+        given = [name for name, value in (("bbox", bbox), ("intersects", geometry), ("nearest", point))
+                 if value is not None]
+        if len(given) != 1:
+            raise ValueError("Give exactly one of bbox, geometry or point")
+        if returns not in RETURNS:
+            raise ValueError(f"Unknown return type: {returns}")
+        self.mode = given[0]
+
+        if fields:
+            layer_fields = layer.fields()
+            missing = [name for name in fields if layer_fields.lookupField(name) < 0]
+            if missing:
+                raise ValueError(f"Unknown fields: {', '.join(missing)}")
+
+        self.layer_id = layer.id()
+        self.layer_name = layer.name()
+        self.source = QgsVectorLayerFeatureSource(layer)
+        self.layer_fields = layer.fields()
+        self.fields = list(fields) if fields else layer.fields().names()
+        self.returns = returns
+        self.limit = int(limit) if limit else None
+        self.k = max(1, int(k))
+        self.max_distance = float(max_distance or 0.0)
+
+        if self.mode == "bbox":
+            query_geometry = QgsGeometry.fromRect(QgsRectangle(*bbox))
+        elif self.mode == "intersects":
+            query_geometry = QgsGeometry.fromWkt(geometry)
+            if query_geometry.isNull():
+                raise ValueError("Invalid WKT geometry")
+        else:
+            query_geometry = QgsGeometry.fromPointXY(QgsPointXY(*point))
+
+        if crs:
+            source_crs = QgsCoordinateReferenceSystem(crs)
+            if not source_crs.isValid():
+                raise ValueError(f"Unknown CRS: {crs}")
+            if source_crs != layer.crs():
+                query_geometry.transform(QgsCoordinateTransform(source_crs, layer.crs(), QgsProject.instance()))
+        self.geometry = query_geometry
+
+    def build_index(self):
+        """(spatial index of the layer with its geometries stored, seconds spent building it)"""
+        started = time.perf_counter()
+        request = QgsFeatureRequest().setNoAttributes()
+        index = QgsSpatialIndex(self.source.getFeatures(request), None, QgsSpatialIndex.FlagStoreFeatureGeometries)
+        return index, time.perf_counter() - started
+
+    def run(self, index):
+        """Matching feature IDs, nearest first for nearest queries"""
+        distances = None
+        if self.mode == "nearest":
+            ids = index.nearestNeighbor(self.geometry, self.k, self.max_distance)
+            distances = {fid: index.geometry(fid).distance(self.geometry) for fid in ids}
+            ids = sorted(ids, key=distances.get)[:self.k]
+        else:
+            candidates = index.intersects(self.geometry.boundingBox())
+            # Overlapping bounding boxes are only candidates; the geometries themselves must meet
+            engine = QgsGeometry.createGeometryEngine(self.geometry.constGet())
+            engine.prepareGeometry()
+            ids = sorted(fid for fid in candidates if engine.intersects(index.geometry(fid).constGet()))
+
+        if self.limit is not None:
+            ids = ids[:self.limit]
+        return ids, distances
+
+    def result(self, ids, distances):
+        result = {
+            "layer_id": self.layer_id,
+            "mode": self.mode,
+            "count": len(ids),
+            "ids": ids
+        }
+        if distances is not None:
+            result["distances"] = [distances[fid] for fid in ids]
+        if self.returns == "attributes" and ids:
+            request = QgsFeatureRequest().setFilterFids(ids).setFlags(QgsFeatureRequest.NoGeometry)
+            request.setSubsetOfAttributes(self.fields, self.layer_fields)
+            features = {
+                feature.id(): {name: json_value(feature[name]) for name in self.fields}
+                for feature in self.source.getFeatures(request)
+            }
+            result["features"] = [{"id": fid, "attributes": features.get(fid)} for fid in ids]
+        return result
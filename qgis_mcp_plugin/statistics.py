@@ -0,0 +1,249 @@
+"""
+Feature statistics for the aggregate command.
+
+Summaries are computed inside QGIS in one pass over the layer, reading only
+the fields involved and no geometry, so a question like "average population
+by region" returns a few numbers instead of every row.  Numeric fields are
+summarised with QgsStatisticalSummary and other fields with
+QgsStringStatisticalSummary.  Percentiles need the values themselves, so
+they are only collected when asked for.
+
+Features are read from a QgsVectorLayerFeatureSource taken when the
+request is made, so the pass itself can run on a worker thread.  Results
+are cached per layer and dropped as soon as the layer reports a data change
+(edits, subset string, reload).
+"""
+import json
+import math
+from collections import OrderedDict
+
+from qgis.core import (QgsFeatureRequest, QgsStatisticalSummary, QgsStringStatisticalSummary,
+                       QgsVectorLayerFeatureSource)
+from qgis.PyQt.QtCore import QVariant
+
+from .features import json_value
+
+DEFAULT_STATS = ("count", "sum", "mean", "min", "max")
+
+# Statistic name -> QgsStatisticalSummary getter
+NUMERIC_STATS = {
+    "count": "count",
+    "missing": "countMissing",
+    "count_distinct": "variety",
+    "sum": "sum",
+    "mean": "mean",
+    "min": "min",
+    "max": "max",
+    "range": "range",
+    "stdev": "sampleStDev",
+    "median": "median",
+    "first_quartile": "firstQuartile",
+    "third_quartile": "thirdQuartile"
+}
+
+# Statistic name -> QgsStringStatisticalSummary getter; other statistics do not apply to text
+STRING_STATS = {
+    "count": "count",
+    "missing": "countMissing",
+    "count_distinct": "countDistinct",
+    "min": "min",
+    "max": "max"
+}
+
+_NUMERIC_TYPES = (QVariant.Int, QVariant.UInt, QVariant.LongLong, QVariant.ULongLong, QVariant.Double)
+
+
+def percentile(ordered, pct):
+    """Linearly interpolated percentile of sorted values"""
+    if not ordered:
+        return None
+    position = (len(ordered) - 1) * pct / 100
+    lower = math.floor(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def finite(value):
+    """Statistics of empty groups come back as NaN, which JSON cannot carry"""
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return json_value(value)
+
+
+def as_list(value):
+    if value is None:
+        return []
+    return [value] if isinstance(value, str) else list(value)
+
+
+class FieldSummary:
+    """Running statistics of one field within one group"""
+
+    def __init__(self, numeric, keep_values):
+        self.numeric = numeric
+        self.summary = QgsStatisticalSummary() if numeric else QgsStringStatisticalSummary()
+        self.values = [] if keep_values else None
+
+    def add(self, value):
+        if self.numeric:
+            self.summary.addVariant(value)
+            if self.values is not None and isinstance(value, (int, float)) and not isinstance(value, bool):
+                self.values.append(value)
+        else:
+            self.summary.addValue(value)
+
+    def result(self, stats, percentiles):
+        self.summary.finalize()
+        getters = NUMERIC_STATS if self.numeric else STRING_STATS
+        result = {name: finite(getattr(self.summary, getters[name])()) for name in stats if name in getters}
+        if self.values is not None:
+            ordered = sorted(self.values)
+            result["percentiles"] = {f"{pct:g}": percentile(ordered, pct) for pct in percentiles}
+        return result
+
+
+class Aggregation:
+    """Statistics of some fields of a vector layer, optionally grouped by other fields"""
+
+    def __init__(self, layer, fields=None, group_by=None, stats=None, percentiles=None,
+                 expression=None, max_groups=1000):
+        layer_fields = layer.fields()
+        self.group_by = as_list(group_by)
+        if fields:
+            self.fields = as_list(fields)
+        else:
+            # Without a field list every numeric field that is not a grouping key is summarised
+            self.fields = [
+                field.name() for field in layer_fields
+                if field.type() in _NUMERIC_TYPES and field.name() not in self.group_by
+            ]
+        missing = [name for name in self.fields + self.group_by if layer_fields.lookupField(name) < 0]
+        if missing:
+            raise ValueError(f"Unknown fields: {', '.join(missing)}")
+
+        self.stats = as_list(stats) or list(DEFAULT_STATS)
+        unknown = [name for name in self.stats if name not in NUMERIC_STATS]
+        if unknown:
+            raise ValueError(f"Unknown statistics: {', '.join(unknown)}")
+        self.percentiles = [float(pct) for pct in as_list(percentiles)]
+        if any(not 0 <= pct <= 100 for pct in self.percentiles):
+            raise ValueError("Percentiles must be between 0 and 100")
+
+        self.layer_id = layer.id()
+        self.source = QgsVectorLayerFeatureSource(layer)
+        self.numeric = {name: layer_fields.field(name).type() in _NUMERIC_TYPES for name in self.fields}
+        self.expression = expression
+        self.max_groups = int(max_groups)
+
+        self.request = QgsFeatureRequest()
+        self.request.setFlags(QgsFeatureRequest.NoGeometry)
+        self.request.setSubsetOfAttributes(list(dict.fromkeys(self.fields + self.group_by)), layer_fields)
+        if expression:
+            self.request.setFilterExpression(expression)
+
+    def key(self):
+        """Cache key of the request, independent of parameter order"""
+        return json.dumps({
+            "fields": self.fields,
+            "group_by": self.group_by,
+            "stats": sorted(self.stats),
+            "percentiles": self.percentiles,
+            "expression": self.expression,
+            "max_groups": self.max_groups
+        }, sort_keys=True)
+
+    def new_group(self):
+        keep_values = bool(self.percentiles)
+        return {name: FieldSummary(self.numeric[name], keep_values and self.numeric[name]) for name in self.fields}
+
+    def run(self):
+        """Read the layer once and summarise every group"""
+        groups = OrderedDict()
+        counts = {}
+        for feature in self.source.getFeatures(self.request):
+            key = tuple(json_value(feature[name]) for name in self.group_by)
+            group = groups.get(key)
+            if group is None:
+                group = groups[key] = self.new_group()
+                counts[key] = 0
+            counts[key] += 1
+            for name in self.fields:
+                group[name].add(feature[name])
+
+        def summarise(key):
+            return {name: group_field.result(self.stats, self.percentiles)
+                    for name, group_field in groups[key].items()}
+
+        result = {
+            "layer_id": self.layer_id,
+            "fields": self.fields,
+            "features": sum(counts.values())
+        }
+        if not self.group_by:
+            # An empty selection still reports a count of 0 for every field
+            if not groups:
+                groups[()] = self.new_group()
+            result["stats"] = summarise(())
+            return result
+
+        keys = list(groups)[:self.max_groups]
+        result["group_by"] = self.group_by
+        result["group_count"] = len(groups)
+        result["groups"] = [
+            {"key": dict(zip(self.group_by, key)), "features": counts[key], "stats": summarise(key)}
+            for key in keys
+        ]
+        return result
+
+
+class StatisticsCache:
+    """Aggregation results per layer, dropped when the layer's data changes"""
+
+    def __init__(self, max_entries_per_layer=32):
+        self.max_entries_per_layer = max_entries_per_layer
+        self.entries = {}
+        self.watched = set()
+        self.generations = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, layer_id, key):
+        entries = self.entries.get(layer_id)
+        if entries is None or key not in entries:
+            self.misses += 1
+            return None
+        entries.move_to_end(key)
+        self.hits += 1
+        return entries[key]
+
+    def generation(self, layer_id):
+        """Bumped on every invalidation; a result computed under an older generation is stale"""
+        return self.generations.get(layer_id, 0)
+
+    def put(self, layer_id, key, result, generation):
+        if layer_id not in self.watched or generation != self.generation(layer_id):
+            return
+        entries = self.entries.setdefault(layer_id, OrderedDict())
+        entries[key] = result
+        while len(entries) > self.max_entries_per_layer:
+            entries.popitem(last=False)
+
+    def watch(self, layer):
+        layer_id = layer.id()
+        if layer_id in self.watched:
+            return
+        self.watched.add(layer_id)
+        layer.dataChanged.connect(lambda: self.invalidate(layer_id))
+        layer.willBeDeleted.connect(lambda: self.forget(layer_id))
+
+    def invalidate(self, layer_id):
+        self.entries.pop(layer_id, None)
+        self.generations[layer_id] = self.generation(layer_id) + 1
+
+    def forget(self, layer_id):
+        self.invalidate(layer_id)
+        self.watched.discard(layer_id)
+
+    def clear(self):
+        # Layer signals stay connected; they only drop entries that no longer exist
+        self.entries.clear()
@@ -0,0 +1,65 @@
+"""
+Read-only commands off the GUI thread: prepare on the main thread, read on a worker pool.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from qgis.PyQt.QtCore import QObject, pyqtSignal
+
+
+class Deferred:
+    """A command response computed on the read pool
+
+    ``work`` runs on a worker thread and may only use thread-safe objects
+    such as feature sources and spatial indexes.  ``finish`` runs back on
+    the main thread with work's return value and returns the response; it
+    is where caches owned by the main thread are updated.
+    """
+
+    def __init__(self, work, finish=None):
+        self.work = work
+        self.finish = finish or (lambda response: response)
+
+    def run_inline(self):
+        """Compute the response on the calling thread, e.g. inside a batch"""
+        try:
+            return self.finish(self.work())
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+
+
+class ReadPool(QObject):
+    """Worker threads for Deferred commands; completions are delivered on the main thread"""
+    completed = pyqtSignal(object, object, object)
+
+    def __init__(self, max_workers=None, parent=None):
+        super().__init__(parent)
+        self.max_workers = max_workers or min(4, os.cpu_count() or 1)
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="qgis-mcp-read")
+        # Emitted from worker threads, so the slot is queued onto this object's (the main) thread
+        self.completed.connect(self.deliver)
+
+    def submit(self, deferred, callback):
+        """Run a Deferred's work on the pool and pass the finished response to callback"""
+        def task():
+            try:
+                outcome = (deferred.work(), None)
+            except Exception as e:
+                outcome = (None, e)
+            self.completed.emit(deferred, outcome, callback)
+
+        self.executor.submit(task)
+
+    def deliver(self, deferred, outcome, callback):
+        value, error = outcome
+        if error is None:
+            try:
+                response = deferred.finish(value)
+            except Exception as e:
+                error = e
+        if error is not None:
+            response = {"status": "error", "message": str(error)}
+        callback(response)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,589 @@
+#!/usr/bin/env python3
+"""
+Asyncio (ASGI) mode of the QGIS MCP backend.
+
+qgis_mcp_server.py runs Flask under waitress, where every request holds a
+worker thread for the whole OpenAI and plugin latency.  Here the same
+/api/status, /api/command, /api/command/stream, /api/layers, /api/sessions,
+/api/metrics, /api/tiles, /api/render, /api/llm_test and
+/api/check_connection routes run on one event loop:
+OpenAI is called through AsyncOpenAI and the plugin through a single
+asyncio connection on which any number of commands can be in flight,
+matched to their replies by request ID.  A slow prompt costs a suspended coroutine rather than a thread.
+
+    python async_server.py            # or: uvicorn async_server:app --port 9876
+
+The /api/features NDJSON stream and the /api/jobs routes remain on the Flask server.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict
+
+import openai
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+import protocol
+from automation import METRICS, APIKeyManager, AutomationBase, is_idempotent, timeout_for, to_plugin_command
+from metrics import prometheus_text
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("QgisGPTMCPAsyncServer")
+
+
+class AsyncQgisConnection:
+    """One asyncio connection to the plugin, shared by every request
+
+    With the framed protocol each command carries an ID that the plugin
+    echoes, so commands from concurrent requests are written back to back
+    and a reader task hands each reply to the request waiting for it.  A
+    command that times out only abandons its own reply.  Plugins without
+    framing answer strictly in order, so their commands are serialised.
+
+    Messages the plugin pushes without an ID, such as layer events, are
+    passed to event_handler, which also gets {"event": "disconnected"}
+    when the connection drops.
+    """
+
+    def __init__(self, host='localhost', port=9876, max_retries=2, backoff=0.2, event_handler=None):
+        self.host = host
+        self.port = port
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.event_handler = event_handler
+        self.reader = None
+        self.writer = None
+        self.framed = False
+        self.connected = False
+        self.next_id = 0
+        self.pending = {}
+        self.reader_task = None
+        self.connect_lock = asyncio.Lock()
+        self.legacy_lock = asyncio.Lock()
+
+    async def connect(self):
+        async with self.connect_lock:
+            if self.connected:
+                return True
+            try:
+                self.reader, self.writer = await asyncio.wait_for(
+                    asyncio.open_connection(self.host, self.port), 2)
+                self.framed = await asyncio.wait_for(self._handshake(), 2)
+                self.connected = True
+                if self.framed:
+                    self.reader_task = asyncio.create_task(self._read_replies())
+                logger.info(f"Connected to QGIS plugin ({'framed' if self.framed else 'legacy'} protocol)")
+                return True
+            except asyncio.TimeoutError:
+                logger.warning("Connection timed out - is QGIS plugin running?")
+            except Exception as e:
+                logger.error(f"Connection failed: {str(e)}")
+            self._disconnect()
+            return False
+
+    async def _handshake(self):
+        """Ask the plugin for framed messages; older plugins reject the hello command"""
+        hello = {"type": "hello", "params": {"protocol": protocol.PROTOCOL_VERSION}}
+        self.writer.write(json.dumps(hello).encode('utf-8'))
+        await self.writer.drain()
+        reply = await self._recv_legacy()
+        return reply.get("status") == "success" and reply.get("result", {}).get("protocol", 0) >= 1
+
+    async def _recv_legacy(self):
+        """Read one bare JSON document, for plugins that predate framing"""
+        response = b''
+        while True:
+            chunk = await self.reader.read(65536)
+            if not chunk:
+                raise ConnectionError("Connection closed by QGIS")
+            response += chunk
+            if not response.rstrip().endswith(b'}'):
+                continue
+            try:
+                return json.loads(response.decode('utf-8'))
+            except json.JSONDecodeError:
+                continue
+
+    async def _read_replies(self):
+        """Resolve pending commands as their framed replies arrive"""
+        try:
+            while True:
+                kind, length = protocol.parse_header(await self.reader.readexactly(protocol.HEADER_SIZE))
+                message, body = protocol.decode_message(kind, await self.reader.readexactly(length))
+                if body is not None:
+                    message["body"] = body
+                # Job events carry no ID, and partial messages belong to streams
+                if message.get("status") == "partial":
+                    continue
+                if "id" not in message and "event" in message:
+                    if self.event_handler:
+                        self.event_handler(message)
+                    continue
+                future = self.pending.pop(message.get("id"), None)
+                if future is not None and not future.done():
+                    future.set_result(message)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Lost connection to QGIS: {str(e)}")
+        self._disconnect()
+
+    def _disconnect(self):
+        if self.connected and self.event_handler:
+            self.event_handler({"event": "disconnected"})
+        self.connected = False
+        if self.writer:
+            self.writer.close()
+        self.reader = self.writer = None
+        if self.reader_task and self.reader_task is not asyncio.current_task():
+            self.reader_task.cancel()
+        self.reader_task = None
+        for future in self.pending.values():
+            if not future.done():
+                future.set_exception(ConnectionError("Connection to QGIS lost"))
+        self.pending.clear()
+
+    async def close(self):
+        self._disconnect()
+
+    async def _send_framed(self, plugin_command, timeout):
+        self.next_id += 1
+        request_id = self.next_id
+        future = asyncio.get_running_loop().create_future()
+        self.pending[request_id] = future
+        command_type = plugin_command["type"]
+        try:
+            with METRICS.span("serialize_seconds", command=command_type):
+                data = protocol.encode_json(dict(plugin_command, id=request_id))
+            with METRICS.span("send_seconds", command=command_type):
+                self.writer.write(data)
+                await self.writer.drain()
+            with METRICS.span("receive_seconds", command=command_type):
+                message = await asyncio.wait_for(future, timeout)
+            message.pop("id", None)
+            return message
+        finally:
+            self.pending.pop(request_id, None)
+
+    async def _send_legacy(self, plugin_command, timeout):
+        async with self.legacy_lock:
+            if not self.connected:
+                raise ConnectionError("Connection to QGIS lost")
+            command_type = plugin_command["type"]
+            try:
+                with METRICS.span("serialize_seconds", command=command_type):
+                    data = json.dumps(plugin_command).encode('utf-8')
+                with METRICS.span("send_seconds", command=command_type):
+                    self.writer.write(data)
+                    await self.writer.drain()
+                with METRICS.span("receive_seconds", command=command_type):
+                    return await asyncio.wait_for(self._recv_legacy(), timeout)
+            except asyncio.TimeoutError:
+                # A late reply would desynchronise the stream, so start over on a new socket
+                self._disconnect()
+                raise
+
+    async def send_command(self, command: Dict[str, Any]):
+        """Send a command and wait for its reply, retrying idempotent commands on transport errors"""
+        retries = self.max_retries if is_idempotent(command) else 0
+        plugin_command = to_plugin_command(command)
+        for attempt in range(retries + 1):
+            if not self.connected and not await self.connect():
+                result = {"status": "error", "message": "Not connected to QGIS"}
+            else:
+                try:
+                    if self.framed:
+                        return await self._send_framed(plugin_command, timeout_for(command))
+                    return await self._send_legacy(plugin_command, timeout_for(command))
+                except asyncio.TimeoutError:
+                    return {"status": "error", "message": "No response from QGIS"}
+                except Exception as e:
+                    logger.error(f"Command failed: {str(e)}")
+                    self._disconnect()
+                    result = {"status": "error", "message": str(e)}
+            if attempt < retries:
+                delay = self.backoff * (2 ** attempt)
+                logger.warning(f"Retrying {command['command']} in {delay:.1f}s: {result['message']}")
+                await asyncio.sleep(delay)
+        return result
+
+
+class AsyncQGISAutomation(AutomationBase):
+    def __init__(self, openai_client=None, qgis=None):
+        super().__init__()
+        self.openai_client = openai_client or openai.AsyncOpenAI(api_key=APIKeyManager.get_key())
+        self.qgis = qgis or AsyncQgisConnection()
+        self.qgis.event_handler = self.on_plugin_event
+        self.subscribing = None
+
+    def on_plugin_event(self, message):
+        """Keep the layer index current from events the plugin pushes"""
+        if message["event"] == "disconnected":
+            self.layer_index.invalidate()
+        elif not self.layer_index.apply(message):
+            logger.warning("Layer index out of step, subscribing again")
+            self.subscribing = asyncio.ensure_future(self.subscribe_layers())
+
+    async def subscribe_layers(self):
+        """Load a layer snapshot and have the plugin push changes from then on"""
+        if not self.qgis.connected and not await self.qgis.connect():
+            return False
+        if not self.qgis.framed:
+            return False  # plugins without framing cannot push events
+        result = await self.qgis.send_command({"command": "subscribe_layers", "params": {}})
+        if result.get("status") != "success":
+            return False
+        try:
+            self.layer_index.load(result.get("result"))
+        except ValueError as e:
+            # Leave the index unready; requests fall back to get_layers
+            logger.warning(f"Ignoring layer subscription: {str(e)}")
+            return False
+        return True
+
+    async def _layer_context(self):
+        """(id, name) of the project's layers; part of the intent cache key"""
+        if not self.layer_index.ready:
+            # Concurrent requests share one subscription rather than each sending their own
+            if self.subscribing is None or self.subscribing.done():
+                self.subscribing = asyncio.ensure_future(self.subscribe_layers())
+            await asyncio.shield(self.subscribing)
+        if self.layer_index.ready:
+            return self.layer_index.context()
+        return self._layers_from_result(await self.qgis.send_command({"command": "get_layers", "params": {}}))
+
+    async def _parse_with_llm(self, prompt: str, session=None):
+        """Ask the LLM to turn a prompt into a {command, params} object"""
+        with METRICS.span("llm_seconds", mode="complete"):
+            response = await self.openai_client.chat.completions.create(
+                model=self.LLM_MODEL,
+                messages=self._llm_messages(prompt, session),
+                temperature=0.1
+            )
+        with METRICS.span("json_extract_seconds"):
+            return self._validate_command(self._extract_json(response.choices[0].message.content))
+
+    async def parse_command(self, prompt: str, session=None):
+        """Turn a prompt into a command: fast-path matcher, then intent cache, then LLM
+
+        Returns (command, cache key); the key is set for LLM-parsed commands
+        that may be cached once they have run successfully.
+        """
+        layers = await self._layer_context()
+        command, route = self._parse_without_llm(prompt, layers, session)
+        cache_key = None
+        if command is None:
+            command = await self._parse_with_llm(prompt, session)
+            cache_key = self._intent_key(prompt, layers, session)
+        self._count_route(route)
+        return command, cache_key
+
+    async def process_request(self, prompt: str, session_id: str = None):
+        """Process natural language prompt with LLM; with a session ID, earlier turns are part of the context"""
+        session = self.chat_sessions.get(session_id)
+        command = cache_key = None
+        try:
+            command, cache_key = await self.parse_command(prompt, session)
+            logger.info(f"Executing command: {command}")
+            result = self._answer_locally(command) or await self.qgis.send_command(command)
+        except Exception as e:
+            logger.error(f"Processing failed: {str(e)}", exc_info=True)
+            result = {"status": "error", "message": str(e)}
+        self._cache_intent(cache_key, command, result)
+        self._remember(session, prompt, command, result)
+        return result
+
+
+    async def process_request_stream(self, prompt: str, session_id: str = None):
+        """Process a prompt, yielding (event, data) pairs as each stage completes
+
+        The same events as the Flask server's stream: progress while the LLM
+        parses and while a job runs, intent_parsed, dispatched and finally
+        result.  Features come back in one reply rather than in chunks.
+        """
+        session = self.chat_sessions.get(session_id)
+        command = cache_key = None
+        try:
+            started = time.monotonic()
+            layers = await self._layer_context()
+            command, route = self._parse_without_llm(prompt, layers, session)
+            if command is None:
+                yield "progress", {"stage": "llm"}
+                command = await self._parse_with_llm(prompt, session)
+                cache_key = self._intent_key(prompt, layers, session)
+            self._count_route(route)
+            yield "intent_parsed", {
+                "command": command,
+                "route": route,
+                "elapsed_ms": round((time.monotonic() - started) * 1000, 1)
+            }
+
+            logger.info(f"Executing command: {command}")
+            yield "dispatched", {"command": command["command"]}
+            if (command["command"] == "submit_job"
+                    or command["command"] == "load_project" and command["params"].get("lazy")):
+                async for event, data in self._follow_job(command):
+                    if event == "result":
+                        result = data
+                    else:
+                        yield event, data
+            else:
+                result = self._answer_locally(command) or await self.qgis.send_command(command)
+        except Exception as e:
+            logger.error(f"Processing failed: {str(e)}", exc_info=True)
+            result = {"status": "error", "message": str(e)}
+        result.pop('body', None)
+        self._cache_intent(cache_key, command, result)
+        self._remember(session, prompt, command, result)
+        yield "result", result
+
+    async def _follow_job(self, command, poll_interval: float = 0.5):
+        """Submit a job and yield its progress, then ("result", job_result reply) once it finishes"""
+        submitted = await self.qgis.send_command(command)
+        if submitted.get("status") != "success":
+            yield "result", submitted
+            return
+        job_id = submitted["result"]["job_id"]
+        progress = None
+        while True:
+            job = await self.qgis.send_command({"command": "job_status", "params": {"job_id": job_id}})
+            if job.get("status") != "success":
+                yield "result", job
+                return
+            if job["result"]["progress"] != progress:
+                progress = job["result"]["progress"]
+                yield "progress", {"stage": "job", "job": job["result"]}
+            if job["result"]["status"] in ("succeeded", "failed", "cancelled"):
+                yield "result", await self.qgis.send_command({"command": "job_result", "params": {"job_id": job_id}})
+                return
+            await asyncio.sleep(poll_interval)
+
+
+class AsyncSystemStatus:
+    def __init__(self, automation_factory):
+        self.automation_factory = automation_factory
+        self.automation = None
+        self.current_directory = os.getcwd()
+        self.last_activity = None
+        self.monitor_task = None
+
+    def update_directory(self, path):
+        if os.path.exists(path):
+            self.current_directory = path
+            return True
+        return False
+
+    async def start(self):
+        try:
+            self.automation = self.automation_factory()
+            await self.automation.qgis.connect()  # Try initial connection but don't fail if it doesn't work
+        except Exception as e:
+            logger.error(f"Failed to initialize QGIS automation: {str(e)}", exc_info=True)
+        self.monitor_task = asyncio.create_task(self.monitor_connection())
+
+    async def stop(self):
+        if self.monitor_task:
+            self.monitor_task.cancel()
+        if self.automation:
+            await self.automation.qgis.close()
+
+    async def monitor_connection(self):
+        while True:
+            try:
+                if not self.automation:
+                    self.automation = self.automation_factory()
+                elif not self.automation.qgis.connected:
+                    await self.automation.qgis.connect()
+            except Exception as e:
+                logger.warning(f"Connection attempt failed: {str(e)}")
+            await asyncio.sleep(5)
+
+
+def create_app(automation_factory=AsyncQGISAutomation):
+    """ASGI app serving the backend's core routes; automation is created at startup"""
+    status = AsyncSystemStatus(automation_factory)
+
+    @asynccontextmanager
+    async def lifespan(app):
+        await status.start()
+        yield
+        await status.stop()
+
+    def unavailable():
+        return JSONResponse({"status": "error", "message": "QGIS connection not available"}, status_code=503)
+
+    async def get_status(request):
+        automation = status.automation
+        return JSONResponse({
+            "qgis_connected": bool(automation and automation.qgis.connected),
+            "current_directory": status.current_directory,
+            "last_activity": status.last_activity,
+            "intent_cache": automation.intent_cache.stats() if automation else None,
+            "intent_routes": dict(automation.route_counts) if automation else None,
+            "layer_index": automation.layer_index.stats() if automation else None,
+            "chat_sessions": automation.chat_sessions.stats() if automation else None
+        })
+
+    async def handle_command(request):
+        if not status.automation:
+            return unavailable()
+        try:
+            data = await request.json()
+        except ValueError:
+            data = None
+        if not data or 'prompt' not in data:
+            return JSONResponse({"status": "error", "message": "Missing prompt"}, status_code=400)
+
+        status.last_activity = time.strftime("%Y-%m-%d %H:%M:%S")
+        with METRICS.span("request_seconds", route="command"):
+            result = await status.automation.process_request(data['prompt'], data.get('session_id'))
+        METRICS.inc("requests_total", route="command", status=result.get('status', 'unknown'))
+        result.pop('body', None)  # binary payloads are served by dedicated routes
+
+        if result.get('status') == 'success' and 'params' in result and 'path' in result['params']:
+            status.update_directory(result['params']['path'])
+        return JSONResponse(result)
+
+    async def handle_command_stream(request):
+        """Same as /api/command, reported as Server-Sent Events while the request progresses"""
+        if not status.automation:
+            return unavailable()
+        try:
+            data = await request.json()
+        except ValueError:
+            data = None
+        if not data or 'prompt' not in data:
+            return JSONResponse({"status": "error", "message": "Missing prompt"}, status_code=400)
+
+        status.last_activity = time.strftime("%Y-%m-%d %H:%M:%S")
+
+        async def generate():
+            async for event, payload in status.automation.process_request_stream(data['prompt'],
+                                                                                  data.get('session_id')):
+                if event == 'result' and payload.get('status') == 'success' and 'path' in payload.get('params', {}):
+                    status.update_directory(payload['params']['path'])
+                yield f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+        return StreamingResponse(generate(), media_type='text/event-stream',
+                                 headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+    async def map_tile(request):
+        """XYZ tiles of the QGIS canvas layers, for the frontend's Leaflet map"""
+        if not status.automation:
+            return unavailable()
+        result = await status.automation.qgis.send_command({"command": "render_tile", "params": dict(request.path_params)})
+        body = result.pop('body', None)
+        if result.get('status') != 'success' or body is None:
+            return JSONResponse(result, status_code=502)
+        return Response(bytes(body), media_type=result['result']['mime_type'], headers={'Cache-Control': 'no-cache'})
+
+    async def render_map_image(request):
+        """Render the QGIS canvas in memory and return the image, honouring If-None-Match"""
+        if not status.automation:
+            return unavailable()
+        args = request.query_params
+        try:
+            params = {
+                "width": int(args.get('width', 800)),
+                "height": int(args.get('height', 600)),
+                "dpi": int(args.get('dpi', 96)),
+                "format": args.get('format', 'png'),
+                "quality": int(args.get('quality', -1))
+            }
+        except ValueError:
+            return JSONResponse({"status": "error", "message": "width, height, dpi and quality must be integers"},
+                                status_code=400)
+        if_none_match = request.headers.get('if-none-match', '').strip('"')
+        if if_none_match:
+            params["if_none_match"] = if_none_match
+
+        result = await status.automation.qgis.send_command({"command": "render_map", "params": params})
+        body = result.pop('body', None)
+        if result.get('status') != 'success':
+            return JSONResponse(result, status_code=502)
+        headers = {'ETag': f'"{result["result"]["etag"]}"', 'Cache-Control': 'no-cache'}
+        if result['result'].get('not_modified'):
+            return Response(status_code=304, headers=headers)
+        if body is None:
+            return JSONResponse({"status": "error", "message": "QGIS returned no image"}, status_code=502)
+        return Response(bytes(body), media_type=result['result']['mime_type'], headers=headers)
+
+    async def get_layers(request):
+        if not status.automation:
+            return unavailable()
+        automation = status.automation
+        if automation.layer_index.ready:
+            return JSONResponse(automation.layer_index.get_layers_result(details=True))
+        result = await automation.qgis.send_command({"command": "get_layers", "params": {"details": True}})
+        return JSONResponse(result, status_code=200 if result.get("status") == "success" else 502)
+
+    async def end_session(request):
+        if not status.automation:
+            return unavailable()
+        ended = status.automation.chat_sessions.drop(request.path_params['session_id'])
+        return JSONResponse({"status": "success", "result": {"ended": ended}})
+
+    async def get_metrics(request):
+        text = prometheus_text(METRICS.snapshot(), "qgis_mcp_backend_")
+        plugin = None
+        if status.automation and status.automation.qgis.connected:
+            plugin = await status.automation.qgis.send_command({"command": "get_metrics", "params": {}})
+        up = bool(plugin) and plugin.get("status") == "success"
+        if up:
+            text += prometheus_text(plugin["result"], "qgis_mcp_plugin_")
+        text += f"# TYPE qgis_mcp_plugin_up gauge\nqgis_mcp_plugin_up {int(up)}\n"
+        return PlainTextResponse(text, media_type="text/plain; version=0.0.4")
+
+    async def test_llm(request):
+        try:
+            data = await request.json()
+            response = await status.automation.openai_client.chat.completions.create(
+                model="gpt-4o-mini",
+                messages=[{"role": "user", "content": data.get('prompt', 'Test connection')}],
+                max_tokens=50
+            )
+            return JSONResponse({"status": "success", "response": response.choices[0].message.content})
+        except Exception as e:
+            return JSONResponse({"status": "error", "message": str(e)}, status_code=500)
+
+    async def check_connection(request):
+        if status.automation:
+            return JSONResponse({"connected": await status.automation.qgis.connect()})  # Attempt reconnect
+        return JSONResponse({"connected": False})
+
+    app = Starlette(
+        routes=[
+            Route('/api/status', get_status, methods=['GET']),
+            Route('/api/command', handle_command, methods=['POST']),
+            Route('/api/command/stream', handle_command_stream, methods=['POST']),
+            Route('/api/layers', get_layers, methods=['GET']),
+            Route('/api/sessions/{session_id}', end_session, methods=['DELETE']),
+            Route('/api/metrics', get_metrics, methods=['GET']),
+            Route('/api/tiles/{z:int}/{x:int}/{y:int}.png', map_tile, methods=['GET']),
+            Route('/api/render', render_map_image, methods=['GET']),
+            Route('/api/llm_test', test_llm, methods=['POST']),
+            Route('/api/check_connection', check_connection, methods=['GET'])
+        ],
+        middleware=[Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])],
+        lifespan=lifespan
+    )
+    app.state.status = status
+    return app
+
+
+app = create_app()
+
+if __name__ == "__main__":
+    import uvicorn
+    logger.info("Starting QGIS MCP async server on port 9876")
+    uvicorn.run(app, host="0.0.0.0", port=9876)
@@ -0,0 +1,283 @@
+"""
+Transport-independent parts of the backend, shared by the threaded Flask
+server (qgis_mcp_server.py) and the asyncio server (async_server.py).
+
+Both servers parse prompts the same way, through the fast-path matcher,
+the intent cache and then the LLM, and send the same plugin commands with
+the same timeouts and retry policy; only the HTTP and socket I/O differ.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+from typing import Any, Dict
+
+from dotenv import load_dotenv, find_dotenv, set_key
+
+from chat_sessions import ChatSessions
+from intent_cache import IntentCache
+from intent_parser import FastIntentParser
+from layer_index import LayerIndex
+from metrics import Metrics
+
+# Stage timings and counters of this backend, served by /api/metrics
+METRICS = Metrics()
+
+# Commands that can safely be sent again when the transport fails
+IDEMPOTENT_COMMANDS = {
+    "ping", "hello", "get_layers", "get_layer_features", "aggregate", "spatial_query",
+    "get_qgis_info", "zoom_to_layer", "render_map", "render_tile", "job_status", "job_result",
+    "get_metrics"
+}
+COMMAND_TIMEOUTS = {
+    "get_layer_features": 60.0,
+    "aggregate": 60.0,
+    "spatial_query": 30.0,
+    "render_map": 60.0,
+    "render_tile": 30.0,
+    "load_project": 120.0,
+    "save_project": 60.0,
+    "create_project": 60.0,
+    "execute_code": 30.0,
+    "execute_processing": 600.0,
+    "add_vector_layer": 30.0,
+    "add_raster_layer": 30.0,
+    "add_layers": 600.0
+}
+DEFAULT_TIMEOUT = 10.0
+
+# Words that point back at earlier turns, so the prompt alone does not say what it means
+CONTEXT_REFERENCE = re.compile(
+    r"\b(it|its|they|them|their|this|that|these|those|same|again|previous|last|earlier|"
+    r"above|other|another|instead|too|also|one|ones)\b",
+    re.IGNORECASE
+)
+
+
+class APIKeyManager:
+    @staticmethod
+    def get_key():
+        """Secure API key handling with .env storage"""
+        env_path = find_dotenv()
+        if not env_path:
+            env_path = os.path.join(os.path.expanduser("~"), ".env")
+            open(env_path, 'a').close()
+
+        load_dotenv(env_path)
+        api_key = os.getenv('OPENAI_API_KEY')
+
+        if api_key:
+            return api_key
+
+        print("\nAPI Key Required")
+        print("1. Get your key from https://platform.openai.com/api-keys")
+        print("2. The key starts with 'sk-'")
+
+        while True:
+            api_key = input("Enter OpenAI API Key: ").strip()
+            if api_key.startswith("sk-"):
+                set_key(env_path, "OPENAI_API_KEY", api_key)
+                print(f"API key stored securely in {env_path}")
+                return api_key
+            print("Invalid API key format. Must start with 'sk-'. Try again.")
+
+
+def to_plugin_command(command: Dict[str, Any]):
+    """Translate a {command, params} object into the plugin's {type, params} message"""
+    plugin_command = {
+        "type": command["command"],
+        "params": command["params"]
+    }
+
+    if plugin_command["type"] == "create_project":
+        plugin_command["type"] = "create_new_project"
+    elif plugin_command["type"] == "batch":
+        plugin_command["params"] = dict(
+            command["params"],
+            steps=[to_plugin_command(step) for step in command["params"].get("steps", [])]
+        )
+    return plugin_command
+
+
+def timeout_for(command: Dict[str, Any]):
+    if command.get("timeout"):
+        return command["timeout"]
+    if command["command"] == "batch":
+        return sum(timeout_for(step) for step in command["params"].get("steps", [])) or DEFAULT_TIMEOUT
+    return COMMAND_TIMEOUTS.get(command["command"], DEFAULT_TIMEOUT)
+
+
+def is_idempotent(command: Dict[str, Any]):
+    if command["command"] == "batch":
+        return all(is_idempotent(step) for step in command["params"].get("steps", []))
+    return command["command"] in IDEMPOTENT_COMMANDS
+
+
+class AutomationBase:
+    """Prompt handling that does not depend on how the LLM and plugin are reached"""
+    LLM_MODEL = "gpt-4o-mini"
+    SYSTEM_PROMPT = """You are a QGIS automation assistant. Respond ONLY with JSON:
+            {
+                "command": "create_project|add_vector_layer|add_raster_layer|add_layers|load_project|save_project|get_layers|remove_layer|zoom_to_layer|get_layer_features|aggregate|spatial_query|execute_processing|submit_job|job_status|job_result|cancel_job|render_map|execute_code",
+                "params": {
+                    "path": "string",
+                    "paths": ["file path or glob pattern"],
+                    "kind": "auto|vector|raster",
+                    "lazy": boolean,
+                    "mode": "full|fast|background",
+                    "force": boolean,
+                    "name": "string",
+                    "provider": "string",
+                    "layer_id": "string",
+                    "limit": integer,
+                    "offset": integer,
+                    "fields": ["string"],
+                    "no_geometry": boolean,
+                    "expression": "string",
+                    "bbox": [xmin, ymin, xmax, ymax],
+                    "group_by": ["string"],
+                    "stats": ["count|sum|mean|min|max|range|stdev|median|count_distinct|missing"],
+                    "percentiles": [number],
+                    "geometry": "WKT string",
+                    "point": [x, y],
+                    "k": integer,
+                    "crs": "string",
+                    "algorithm": "string",
+                    "parameters": {},
+                    "job_id": "string",
+                    "width": integer,
+                    "height": integer,
+                    "code": "string"
+                }
+            }
+            When the request needs several commands, respond instead with an ordered plan:
+            {
+                "steps": [{"command": "...", "params": {...}}, ...],
+                "stop_on_error": boolean
+            }
+            A step can use a value returned by an earlier step with a string "$<step index>.<field>",
+            e.g. {"command": "zoom_to_layer", "params": {"layer_id": "$0.layer_id"}} after an add_vector_layer step.
+            Use add_layers with a list of paths or a glob pattern such as "data/*.gpkg" to add several files at once.
+            execute_processing waits for the algorithm and returns its outputs; for long-running algorithms
+            use submit_job instead, which returns a job_id to check with job_status and job_result.
+            Use load_project with "lazy": true for large projects; it returns a job_id and opens the layers in the background.
+            save_project skips the write when nothing changed; use "mode": "background" for large .qgz projects.
+            Use aggregate, not get_layer_features, for counts, totals, averages and other statistics.
+            Use spatial_query for features within a bbox, intersecting a geometry or nearest to a point;
+            give exactly one of bbox, geometry or point, and "return": "attributes" to get attributes as well as IDs.
+            Earlier turns of the conversation may follow; resolve references such as "it" or "that layer" from them."""
+
+    def __init__(self):
+        self.intent_cache = IntentCache(
+            max_entries=int(os.getenv('INTENT_CACHE_SIZE', '512')),
+            ttl=float(os.getenv('INTENT_CACHE_TTL', str(24 * 3600))),
+            db_path=os.getenv('INTENT_CACHE_DB') or None,
+            namespace=hashlib.sha256(f"{self.LLM_MODEL}\n{self.SYSTEM_PROMPT}".encode('utf-8')).hexdigest()[:16]
+        )
+        self.fast_parser = FastIntentParser()
+        self.fast_path_threshold = float(os.getenv('FAST_PATH_THRESHOLD', '0.85'))
+        self.route_counts = {"fast_path": 0, "cache": 0, "llm": 0}
+        self.route_lock = threading.Lock()
+        self.layer_index = LayerIndex()
+        self.chat_sessions = ChatSessions(
+            token_budget=int(os.getenv('CHAT_TOKEN_BUDGET', '2000')),
+            recent_turns=int(os.getenv('CHAT_RECENT_TURNS', '6')),
+            max_sessions=int(os.getenv('CHAT_MAX_SESSIONS', '500')),
+            ttl=float(os.getenv('CHAT_SESSION_TTL', '3600'))
+        )
+
+    def _extract_json(self, text: str):
+        """Robust JSON extraction from text"""
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError:
+            json_match = re.search(r'\{.*\}', text, re.DOTALL)
+            if json_match:
+                try:
+                    return json.loads(json_match.group())
+                except json.JSONDecodeError:
+                    pass
+        raise ValueError("No valid JSON found in response")
+
+    @staticmethod
+    def _layers_from_result(result):
+        """(id, name) pairs from a get_layers response"""
+        if result.get("status") != "success":
+            return []
+        return [(layer["id"], layer["name"]) for layer in result["result"]["layers"]]
+
+    def _llm_messages(self, prompt: str, session=None):
+        # Layers let the model use real layer IDs and field names instead of guessing
+        layers = self.layer_index.describe() if self.layer_index.ready else None
+        system = [{"role": "system", "content": self.SYSTEM_PROMPT}]
+        return self.chat_sessions.messages(session, system, layers, prompt)
+
+    def _remember(self, session, prompt: str, command, result):
+        """Add a finished request to its chat session"""
+        if session is not None and command is not None:
+            self.chat_sessions.record(session, prompt, command, result)
+
+    def _answer_locally(self, command):
+        """Response for commands the layer index can answer without asking the plugin, else None"""
+        if command["command"] == "get_layers" and self.layer_index.ready:
+            return self.layer_index.get_layers_result(command["params"].get("details", False))
+        return None
+
+    def _validate_command(self, command):
+        """Check the LLM's output and turn a multi-step plan into one batch command"""
+        if "steps" not in command:
+            return self._validate_step(command)
+
+        steps = command["steps"]
+        if not isinstance(steps, list) or not steps:
+            raise ValueError("A plan needs a non-empty list of steps")
+        steps = [self._validate_step(step) for step in steps]
+        if len(steps) == 1:
+            return steps[0]
+        return {
+            "command": "batch",
+            "params": {"steps": steps, "stop_on_error": command.get("stop_on_error", True)}
+        }
+
+    def _validate_step(self, command):
+        if not isinstance(command, dict) or not all(k in command for k in ["command", "params"]):
+            raise ValueError("Missing required fields in command")
+        if command["command"] == "batch":
+            raise ValueError("Batches cannot be nested")
+        return command
+
+    def _count_route(self, route: str):
+        with self.route_lock:
+            self.route_counts[route] += 1
+        METRICS.inc("intent_routes_total", route=route)
+
+    @staticmethod
+    def _cacheable(prompt: str, session):
+        """Whether a prompt's meaning depends only on itself and the layers, not on earlier turns"""
+        return session is None or session.empty or not CONTEXT_REFERENCE.search(prompt)
+
+    def _intent_key(self, prompt: str, layers, session=None):
+        """Cache key for an LLM-parsed command, or None when the prompt must not be cached"""
+        return self.intent_cache.key(prompt, layers) if self._cacheable(prompt, session) else None
+
+    def _cache_intent(self, key, command, result):
+        """Keep an LLM-parsed command once it has run successfully, so a bad parse is asked again"""
+        if key is None or command is None or result.get("status") != "success":
+            return
+        if isinstance(result.get("result"), dict) and result["result"].get("failed"):
+            return  # a batch with failed steps
+        self.intent_cache.put(key, command)
+
+    def _parse_without_llm(self, prompt: str, layers, session=None):
+        """Try the fast-path matcher, then the intent cache; returns (command or None, route)"""
+        command, confidence = self.fast_parser.parse(prompt, layers)
+        if command is not None and confidence >= self.fast_path_threshold:
+            return command, "fast_path"
+        key = self._intent_key(prompt, layers, session)
+        if key is None:
+            return None, "llm"
+        command = self.intent_cache.get(key)
+        if command is not None:
+            return command, "cache"
+        return None, "llm"
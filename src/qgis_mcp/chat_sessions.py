@@ -0,0 +1,208 @@
+"""
+Per-session conversation state for the LLM prompt.
+
+Without it every prompt reached the model on its own, so follow-ups such
+as "now zoom to it" had nothing to refer to.  The frontend now sends a
+session ID, and each session keeps its most recent turns (the prompt, the
+command the model produced and a short digest of the plugin's reply) plus
+a rolling summary of older turns, one line each.
+
+Messages are ordered from the most to the least stable, so OpenAI's
+automatic prompt caching can reuse the longest possible prefix from one
+turn to the next:
+
+    system prompt  >  layer context  >  summary  >  recent turns  >  prompt
+
+Turns are folded into the summary in batches rather than one per request,
+which keeps the summary, and everything before the recent turns, unchanged
+for several turns in a row.
+
+Layer context, summary, turns and the prompt are kept within a token
+budget.  Tokens are counted with tiktoken when it is installed and
+estimated from the text length otherwise; either way nothing leaves the
+process.
+"""
+import json
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Dict, List, Optional
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Tokens added by the chat format around every message
+MESSAGE_OVERHEAD = 4
+# Longest prompt or digest text kept in a summary line
+SUMMARY_TEXT = 120
+
+_encoding = None
+
+
+def count_tokens(text: str) -> int:
+    """Tokens in text for gpt-4o-mini: tiktoken's o200k_base if available, else about 4 characters a token"""
+    global _encoding
+    if tiktoken is not None:
+        if _encoding is None:
+            try:
+                _encoding = tiktoken.get_encoding("o200k_base")
+            except Exception:
+                _encoding = False  # the encoding could not be loaded, e.g. offline
+        if _encoding:
+            return len(_encoding.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+
+def message_tokens(messages: List[Dict[str, str]]) -> int:
+    return sum(count_tokens(message["content"]) + MESSAGE_OVERHEAD for message in messages)
+
+
+def _clip(text: str, limit: int) -> str:
+    return text if len(text) <= limit else text[:limit - 3] + "..."
+
+
+def digest_result(result: Dict[str, Any]) -> str:
+    """A one-line account of a plugin reply: its error, or its scalar fields such as layer_id"""
+    if result.get("status") != "success":
+        return "error: " + _clip(str(result.get("message", "unknown error")), SUMMARY_TEXT)
+    body = result.get("result")
+    if not isinstance(body, dict):
+        # Older commands answer at the top level, e.g. {"status", "layer", "layer_id"}
+        body = {key: value for key, value in result.items() if key not in ("status", "id", "body")}
+    fields = {}
+    for key, value in body.items():
+        if isinstance(value, str):
+            fields[key] = _clip(value, 80)
+        elif isinstance(value, (bool, int, float)) or value is None:
+            fields[key] = value
+        elif isinstance(value, list):
+            fields[key] = f"[{len(value)} items]"
+        if len(fields) == 8:
+            break
+    return "ok " + json.dumps(fields, separators=(",", ":"))
+
+
+class ChatTurn:
+    def __init__(self, prompt: str, command: Dict[str, Any], outcome: str):
+        self.prompt = prompt
+        self.command = json.dumps(command, separators=(",", ":"))
+        self.outcome = outcome
+        self.messages = [
+            {"role": "user", "content": prompt},
+            {"role": "assistant", "content": self.command},
+            {"role": "system", "content": "Result: " + outcome}
+        ]
+        self.tokens = message_tokens(self.messages)
+
+    def summary_line(self) -> str:
+        return (f'- "{_clip(self.prompt, SUMMARY_TEXT)}" -> {_clip(self.command, SUMMARY_TEXT)}'
+                f' ({_clip(self.outcome, SUMMARY_TEXT)})')
+
+
+class ChatSession:
+    def __init__(self, session_id: str):
+        self.id = session_id
+        self.turns = deque()
+        self.summary = deque()
+        self.lock = threading.Lock()
+        self.updated = time.monotonic()
+
+    @property
+    def empty(self) -> bool:
+        return not self.turns and not self.summary
+
+
+class ChatSessions:
+    """Conversation state by session ID, trimmed to a token budget"""
+
+    def __init__(self, token_budget: int = 2000, recent_turns: int = 6, max_sessions: int = 500,
+                 ttl: float = 3600.0):
+        self.token_budget = token_budget
+        self.recent_turns = recent_turns
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.sessions = OrderedDict()
+        self.lock = threading.Lock()
+        self.folded = 0
+
+    def get(self, session_id: Optional[str]) -> Optional[ChatSession]:
+        """The session for an ID, created on first use; None without an ID"""
+        if not session_id:
+            return None
+        now = time.monotonic()
+        with self.lock:
+            session = self.sessions.get(session_id)
+            if session is None or now - session.updated > self.ttl:
+                session = self.sessions[session_id] = ChatSession(session_id)
+            self.sessions.move_to_end(session_id)
+            session.updated = now
+            while len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+        return session
+
+    def drop(self, session_id: str) -> bool:
+        with self.lock:
+            return self.sessions.pop(session_id, None) is not None
+
+    def record(self, session: ChatSession, prompt: str, command: Dict[str, Any], result: Dict[str, Any]):
+        """Add a finished turn; past recent_turns, the older half of the turns goes into the summary"""
+        with session.lock:
+            session.turns.append(ChatTurn(prompt, command, digest_result(result)))
+            if len(session.turns) > self.recent_turns:
+                self._fold(session, len(session.turns) - max(1, self.recent_turns // 2))
+
+    def _fold(self, session: ChatSession, count: int):
+        for _ in range(min(count, len(session.turns))):
+            session.summary.append(session.turns.popleft().summary_line())
+            self.folded += 1
+
+    def messages(self, session: ChatSession, system: List[Dict[str, str]], layers: Optional[str],
+                 prompt: str) -> List[Dict[str, str]]:
+        """Chat messages for a prompt: fixed system messages, then layers, summary, turns and the prompt"""
+        user = {"role": "user", "content": prompt}
+        budget = self.token_budget - message_tokens([user])
+        messages = list(system)
+        if layers:
+            # Layers get at most half of the whole budget, whatever the prompt's length, so this part of
+            # the prefix only changes with the project; the model can still ask for the rest with get_layers
+            content = "Layers in the current project:\n"
+            for line in layers.splitlines():
+                if count_tokens(content + line) + MESSAGE_OVERHEAD > self.token_budget // 2:
+                    content += "(more layers not listed)"
+                    break
+                content += line + "\n"
+            messages.append({"role": "system", "content": content.rstrip("\n")})
+            budget -= message_tokens(messages[-1:])
+
+        if session is not None:
+            with session.lock:
+                # Turns that no longer fit are folded for good, so the prefix stays stable on the next turn
+                while session.turns and sum(turn.tokens for turn in session.turns) > budget * 3 // 4:
+                    self._fold(session, max(1, len(session.turns) // 2))
+                turns_tokens = sum(turn.tokens for turn in session.turns)
+                summary_budget = budget - turns_tokens
+                while session.summary and count_tokens("\n".join(session.summary)) + 32 > summary_budget:
+                    session.summary.popleft()
+                if session.summary:
+                    messages.append({
+                        "role": "system",
+                        "content": "Earlier in this conversation:\n" + "\n".join(session.summary)
+                    })
+                for turn in session.turns:
+                    messages.extend(turn.messages)
+        messages.append(user)
+        return messages
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            sessions = list(self.sessions.values())
+        return {
+            "sessions": len(sessions),
+            "turns": sum(len(session.turns) for session in sessions),
+            "summary_lines": sum(len(session.summary) for session in sessions),
+            "folded": self.folded,
+            "token_budget": self.token_budget,
+            "tokenizer": "tiktoken" if tiktoken is not None and _encoding else "estimate"
+        }
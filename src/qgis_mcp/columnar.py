@@ -0,0 +1,104 @@
+"""
+Readers for the binary feature formats of get_layer_features.
+
+``decode_columnar`` maps the buffers of a "columnar" batch (see
+qgis_mcp_plugin/columnar.py for the layout) straight onto NumPy arrays with
+``numpy.frombuffer``, so numeric columns, feature ids and WKB offsets are
+views of the received frame rather than copies.  Without NumPy the same
+views are returned as typed memoryviews.  ``decode_arrow`` reads the Arrow
+IPC variant when pyarrow is installed.
+"""
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+_DTYPES = {"int64": ("<i8", "q"), "float64": ("<f8", "d"), "bool": ("?", "?"), "uint8": ("u1", "B")}
+
+
+class ColumnarBatch:
+    """A decoded feature batch; arrays share memory with the frame they came from"""
+
+    def __init__(self, count, fids, columns, validity, geometry_offsets, geometry_data):
+        self.count = count
+        self.fids = fids
+        self.columns = columns
+        self.validity = validity
+        self._geometry_offsets = geometry_offsets
+        self._geometry_data = geometry_data
+
+    @property
+    def field_names(self):
+        return list(self.columns)
+
+    @property
+    def has_geometry(self):
+        return self._geometry_offsets is not None
+
+    def wkb(self, index):
+        """WKB of one feature as a memoryview, or None for a null geometry"""
+        start, end = int(self._geometry_offsets[index]), int(self._geometry_offsets[index + 1])
+        return self._geometry_data[start:end] if end > start else None
+
+    def geometries(self):
+        return [self.wkb(index) for index in range(self.count)]
+
+
+def _view(body, spec, dtype):
+    numpy_dtype, typecode = _DTYPES[dtype]
+    chunk = body[spec["offset"]:spec["offset"] + spec["length"]]
+    if numpy is not None:
+        return numpy.frombuffer(chunk, dtype=numpy_dtype)
+    return chunk.cast(typecode)
+
+
+def _strings(body, column):
+    offsets = _view(body, column["offsets"], "int64")
+    data = body[column["values"]["offset"]:column["values"]["offset"] + column["values"]["length"]]
+    text = bytes(data)
+    values = [text[int(start):int(end)].decode("utf-8") for start, end in zip(offsets[:-1], offsets[1:])]
+    return numpy.array(values, dtype=object) if numpy is not None else values
+
+
+def decode_columnar(message, body):
+    """Build a ColumnarBatch from the message and body of a "columnar" binary frame"""
+    body = memoryview(body)
+    columns = {}
+    validity = {}
+    for column in message["columns"]:
+        name = column["name"]
+        if column["type"] == "string":
+            columns[name] = _strings(body, column)
+        else:
+            columns[name] = _view(body, column["values"], column["type"])
+        if column.get("validity"):
+            validity[name] = _view(body, column["validity"], "uint8")
+
+    geometry = message.get("geometry")
+    geometry_offsets = geometry_data = None
+    if geometry:
+        geometry_offsets = _view(body, geometry["offsets"], "int64")
+        values = geometry["values"]
+        geometry_data = body[values["offset"]:values["offset"] + values["length"]]
+
+    return ColumnarBatch(message["count"], _view(body, message["fids"], "int64"),
+                         columns, validity, geometry_offsets, geometry_data)
+
+
+def decode_arrow(body):
+    """Read an "arrow" batch into a pyarrow.Table without copying the buffers"""
+    if pyarrow is None:
+        raise RuntimeError("pyarrow is required to read Arrow batches")
+    return pyarrow.ipc.open_stream(pyarrow.py_buffer(body)).read_all()
+
+
+def decode_batch(batch, body):
+    """Decode a batch described by a get_layer_features result"""
+    if batch["format"] == "arrow":
+        return decode_arrow(body)
+    return decode_columnar(batch, body)
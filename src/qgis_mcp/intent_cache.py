@@ -0,0 +1,108 @@
+"""
+Cache of LLM-parsed commands, keyed by the normalized prompt and the project's layers.
+
+The same prompt against the same set of layers always maps to the same
+command, so the OpenAI round trip is only paid once.  Callers only add a
+command once it has run successfully.  Entries expire after
+a TTL, the in-memory table is bounded with LRU eviction, and an optional
+SQLite file keeps the cache across backend restarts.
+"""
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional
+
+
+class IntentCache:
+    def __init__(self, max_entries: int = 512, ttl: float = 24 * 3600, db_path: Optional[str] = None,
+                 namespace: str = ""):
+        # Part of every key, e.g. a hash of the model and system prompt, so persisted entries
+        # made under another prompt or model are never served
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.db = None
+        if db_path:
+            self.db = sqlite3.connect(db_path, check_same_thread=False)
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS intents (key TEXT PRIMARY KEY, command TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            self.db.execute("DELETE FROM intents WHERE created < ?", (time.time() - ttl,))
+            self.db.commit()
+
+    @staticmethod
+    def normalize(prompt: str) -> str:
+        """Lower-case, collapse whitespace and drop trailing punctuation"""
+        return re.sub(r'\s+', ' ', prompt.strip().lower()).rstrip(' .!?')
+
+    def key(self, prompt: str, layers: Iterable = ()) -> str:
+        layer_part = json.dumps(sorted(list(layer) for layer in layers))
+        text = f"{self.namespace}\n{self.normalize(prompt)}\n{layer_part}"
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None and self.db is not None:
+                row = self.db.execute("SELECT command, created FROM intents WHERE key = ?", (key,)).fetchone()
+                if row:
+                    entry = (json.loads(row[0]), row[1])
+                    self._remember(key, entry)
+            if entry is None or now - entry[1] > self.ttl:
+                if entry is not None:
+                    self._forget(key)
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            # Callers may add to the command, so never hand out the cached dict itself
+            return json.loads(json.dumps(entry[0]))
+
+    def put(self, key: str, command: Dict[str, Any]):
+        entry = (json.loads(json.dumps(command)), time.time())
+        with self.lock:
+            self._remember(key, entry)
+            if self.db is not None:
+                self.db.execute(
+                    "INSERT OR REPLACE INTO intents (key, command, created) VALUES (?, ?, ?)",
+                    (key, json.dumps(entry[0]), entry[1])
+                )
+                self.db.commit()
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            if self.db is not None:
+                self.db.execute("DELETE FROM intents")
+                self.db.commit()
+
+    def _remember(self, key, entry):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def _forget(self, key):
+        self.entries.pop(key, None)
+        if self.db is not None:
+            self.db.execute("DELETE FROM intents WHERE key = ?", (key,))
+            self.db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "persistent": self.db is not None
+        }
@@ -0,0 +1,135 @@
+"""
+Deterministic fast path for prompts that map directly onto one plugin command.
+
+Prompts like "zoom to roads", "remove layer parcels" or "save project to
+/tmp/a.qgz" do not need an LLM: a handful of patterns recognise them in
+microseconds and layer names are resolved to IDs from the plugin's
+get_layers data.  Every match carries a confidence; callers fall back to
+the LLM when it is below their threshold.
+"""
+import difflib
+import os
+import re
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+RASTER_EXTENSIONS = {".tif", ".tiff", ".jp2", ".img", ".vrt", ".asc", ".dem", ".ecw", ".nc"}
+PROJECT_EXTENSIONS = {".qgz", ".qgs"}
+VECTOR_EXTENSIONS = {".shp", ".gpkg", ".geojson", ".json", ".kml", ".gml", ".csv", ".tab", ".fgb", ".sqlite"}
+
+_PATH = r'["\']?(?P<path>[^"\']+?)["\']?'
+_LAYER = r'(?P<phrase>(?:the\s+)?(?:layer\s+)?["\']?(?P<layer>.+?)["\']?(?:\s+layer)?)'
+
+
+class FastIntentParser:
+    """Match prompts against fixed patterns and build commands without the LLM"""
+
+    def __init__(self, fuzzy_cutoff: float = 0.8):
+        self.fuzzy_cutoff = fuzzy_cutoff
+        self.rules = [
+            (r'(?:list|show|get|what are)(?: me)?(?: all)?(?: the)?(?: project)? layers', self._get_layers),
+            (rf'(?:zoom|go)(?: in)? to {_LAYER}', self._zoom_to_layer),
+            (rf'(?:remove|delete|drop) {_LAYER}', self._remove_layer),
+            (rf'(?:create|start|make) (?:a )?new project (?:at|in|as) {_PATH}', self._create_project),
+            (rf'save (?:the )?project (?:to|as|in) {_PATH}', self._save_project),
+            (r'save(?: the)?(?: current)? project', self._save_project),
+            (rf'(?:load|open) (?:the )?project (?:from )?{_PATH}', self._load_project),
+            (rf'(?:add|load|open) (?:the )?(?:vector |raster |shapefile |layer |file )*(?:from )?{_PATH}'
+             rf'(?: as ["\']?(?P<name>[^"\']+?)["\']?)?', self._add_layer),
+            (rf'(?:show|get|list) (?:me )?(?:the )?(?:first )?(?P<limit>\d+) features (?:from|of|in) {_LAYER}',
+             self._get_layer_features),
+            (rf'(?:render|export) (?:the )?map (?:to|as) {_PATH}', self._render_map),
+        ]
+        self.rules = [(re.compile(rf'^{pattern}$', re.IGNORECASE), builder) for pattern, builder in self.rules]
+
+    def parse(self, prompt: str, layers: Iterable[Tuple[str, str]] = ()) -> Tuple[Optional[Dict[str, Any]], float]:
+        """Return ``(command, confidence)``; command is None when nothing matched"""
+        text = re.sub(r'\s+', ' ', prompt.strip()).rstrip(' .!?')
+        layers = list(layers)
+        for pattern, builder in self.rules:
+            match = pattern.match(text)
+            if match:
+                result = builder(match, layers)
+                if result[0] is not None:
+                    return result
+        return None, 0.0
+
+    def resolve_layer(self, name: str, layers) -> Tuple[Optional[str], float]:
+        """Find a layer ID by ID, exact name or close name; returns (id, confidence)"""
+        name = name.strip()
+        for layer_id, layer_name in layers:
+            if name == layer_id:
+                return layer_id, 1.0
+        lowered = {layer_name.lower(): layer_id for layer_id, layer_name in layers}
+        if name.lower() in lowered:
+            return lowered[name.lower()], 1.0
+        close = difflib.get_close_matches(name.lower(), list(lowered), n=1, cutoff=self.fuzzy_cutoff)
+        if close:
+            ratio = difflib.SequenceMatcher(None, name.lower(), close[0]).ratio()
+            return lowered[close[0]], round(ratio * 0.95, 3)
+        return None, 0.0
+
+    @staticmethod
+    def _layer_names(match):
+        """Names to look up: the whole phrase first, so a layer named "Layer 1" is found, then the bare name"""
+        phrase = match.group('phrase').strip('"\'')
+        return list(dict.fromkeys([phrase, re.sub(r'^the\s+', '', phrase, flags=re.IGNORECASE), match.group('layer')]))
+
+    def _layer_command(self, command, match, layers, exact=False, **params):
+        """Command on the layer the prompt names; with exact, a close name is not enough"""
+        layer_id, confidence = None, 0.0
+        for name in self._layer_names(match):
+            candidate, score = self.resolve_layer(name, layers)
+            if score > confidence:
+                layer_id, confidence = candidate, score
+            if confidence == 1.0:
+                break
+        if layer_id is None or exact and confidence < 1.0:
+            return None, 0.0
+        return {"command": command, "params": dict(params, layer_id=layer_id)}, confidence
+
+    def _get_layers(self, match, layers):
+        return {"command": "get_layers", "params": {}}, 1.0
+
+    def _zoom_to_layer(self, match, layers):
+        return self._layer_command("zoom_to_layer", match, layers)
+
+    def _remove_layer(self, match, layers):
+        # Removing the wrong layer cannot be undone, so fuzzy matches are left to the LLM
+        return self._layer_command("remove_layer", match, layers, exact=True)
+
+    def _get_layer_features(self, match, layers):
+        return self._layer_command("get_layer_features", match, layers, limit=int(match.group('limit')))
+
+    def _create_project(self, match, layers):
+        return {"command": "create_project", "params": {"path": match.group('path')}}, 1.0
+
+    def _save_project(self, match, layers):
+        params = {"path": match.group('path')} if 'path' in match.groupdict() else {}
+        return {"command": "save_project", "params": params}, 1.0
+
+    def _load_project(self, match, layers):
+        return {"command": "load_project", "params": {"path": match.group('path')}}, 1.0
+
+    def _render_map(self, match, layers):
+        return {"command": "render_map", "params": {"path": match.group('path')}}, 1.0
+
+    def _add_layer(self, match, layers):
+        path = match.group('path')
+        extension = os.path.splitext(path)[1].lower()
+        if extension in PROJECT_EXTENSIONS:
+            return {"command": "load_project", "params": {"path": path}}, 1.0
+        if any(char in path for char in "*?["):
+            # A glob such as data/*.gpkg; a name cannot apply to several layers
+            if match.group('name'):
+                return None, 0.0
+            return {"command": "add_layers", "params": {"paths": [path]}}, 1.0
+        if extension in RASTER_EXTENSIONS:
+            command = "add_raster_layer"
+        elif extension in VECTOR_EXTENSIONS:
+            command = "add_vector_layer"
+        else:
+            return None, 0.0
+        params = {"path": path}
+        if match.group('name'):
+            params["name"] = match.group('name')
+        return {"command": command, "params": params}, 1.0
@@ -0,0 +1,71 @@
+"""
+Incremental JSON extraction from a streamed LLM reply.
+
+The model's answer arrives as small text deltas.  Instead of waiting for
+the whole reply and searching it with a regex, the parser tracks string
+and brace state as each delta arrives, so it knows the moment the first
+top-level JSON object is complete and the rest of the stream can be
+dropped.  Prose or code fences around the object are skipped.  The
+command name is reported as soon as its value has been streamed, well
+before the params are.
+"""
+import json
+import re
+from typing import Any, Dict, Optional
+
+_COMMAND = re.compile(r'"command"\s*:\s*"([^"\\]+)"')
+
+
+class IncrementalJSONParser:
+    def __init__(self):
+        self.text = ''
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.start = None
+        self.result = None
+        self.command = None
+
+    @property
+    def done(self) -> bool:
+        return self.result is not None
+
+    def feed(self, delta: str) -> Optional[Dict[str, Any]]:
+        """Consume a delta; returns the parsed object once it is complete"""
+        if self.done or not delta:
+            return self.result
+
+        offset = len(self.text)
+        self.text += delta
+        for position in range(offset, len(self.text)):
+            char = self.text[position]
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == '\\':
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"' and self.start is not None:
+                self.in_string = True
+            elif char == '{':
+                if self.start is None:
+                    self.start = position
+                self.depth += 1
+            elif char == '}' and self.start is not None:
+                self.depth -= 1
+                if self.depth == 0:
+                    self.result = json.loads(self.text[self.start:position + 1])
+                    return self.result
+
+        if self.command is None and self.start is not None:
+            match = _COMMAND.search(self.text, self.start)
+            if match:
+                self.command = match.group(1)
+        return None
+
+    def close(self) -> Dict[str, Any]:
+        """The parsed object, or ValueError if the stream ended without one"""
+        if self.result is None:
+            raise ValueError("No valid JSON found in response")
+        return self.result
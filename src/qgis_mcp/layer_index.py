@@ -0,0 +1,145 @@
+"""
+Backend copy of the plugin's layer index.
+
+The plugin sends a snapshot when a connection subscribes to layer events,
+then pushes every change (layers_added, layers_removed, layer_changed,
+project_read, project_cleared).  Applying those events keeps an in-memory
+index of layer names, types, CRS, extents and fields, so prompts can be
+matched to layers and the LLM can be told what the project contains
+without a get_layers round trip per request.
+
+Each event carries the plugin's revision number.  A gap in the sequence
+means the copy is out of step, and the index reports itself not ready
+until a new snapshot is loaded.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+# Events received while waiting for a snapshot, replayed once it arrives
+MAX_BACKLOG = 1000
+
+
+class LayerIndex:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.layers = OrderedDict()
+        self.revision = None
+        self.ready = False
+        self.updated = None
+        self.backlog = []
+        self.events = 0
+
+    def load(self, snapshot: Dict[str, Any]):
+        """Replace the index with a subscribe_layers snapshot; ValueError if it is malformed"""
+        try:
+            layers = OrderedDict((layer["id"], layer) for layer in snapshot["layers"])
+            revision = int(snapshot["revision"])
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"Malformed layer snapshot: {type(e).__name__}: {e}") from e
+        with self.lock:
+            self.layers = layers
+            self.revision = revision
+            self.ready = True
+            self.updated = time.time()
+            backlog, self.backlog = self.backlog, []
+        for message in backlog:
+            if message["revision"] > self.revision:
+                self.apply(message)
+
+    def invalidate(self):
+        with self.lock:
+            self.ready = False
+            self.backlog = []
+
+    def apply(self, message: Dict[str, Any]) -> bool:
+        """Apply a pushed layer event; False when the index has fallen out of step"""
+        event = message.get("event")
+        if event not in ("layers_added", "layers_removed", "layer_changed", "project_read", "project_cleared"):
+            return True
+        with self.lock:
+            if not self.ready:
+                if len(self.backlog) < MAX_BACKLOG:
+                    self.backlog.append(message)
+                return True
+            if message["revision"] != self.revision + 1:
+                self.ready = False
+                return False
+
+            if event == "layers_added":
+                for layer in message["layers"]:
+                    self.layers[layer["id"]] = layer
+            elif event == "layers_removed":
+                for layer_id in message["layer_ids"]:
+                    self.layers.pop(layer_id, None)
+            elif event == "layer_changed":
+                self.layers[message["layer"]["id"]] = message["layer"]
+            elif event == "project_read":
+                self.layers = OrderedDict((layer["id"], layer) for layer in message["layers"])
+            elif event == "project_cleared":
+                self.layers = OrderedDict()
+            self.revision = message["revision"]
+            self.updated = time.time()
+            self.events += 1
+        return True
+
+    def context(self) -> List[Tuple[str, str]]:
+        """(id, name) of every layer, as used by the intent cache and fast-path matcher"""
+        with self.lock:
+            return [(layer["id"], layer["name"]) for layer in self.layers.values()]
+
+    def get(self, layer_id: str) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            return self.layers.get(layer_id)
+
+    def find(self, name: str) -> Optional[Dict[str, Any]]:
+        """Layer by ID or by case-insensitive name"""
+        with self.lock:
+            if name in self.layers:
+                return self.layers[name]
+            lowered = name.lower()
+            for layer in self.layers.values():
+                if layer["name"].lower() == lowered:
+                    return layer
+        return None
+
+    def get_layers_result(self, details: bool = False) -> Dict[str, Any]:
+        """The plugin's get_layers response, built from the index"""
+        with self.lock:
+            layers = list(self.layers.values())
+            revision = self.revision
+        if not details:
+            layers = [
+                {"id": layer["id"], "name": layer["name"], "type": layer["type"], "crs": layer["crs"]}
+                for layer in layers
+            ]
+        return {"status": "success", "result": {"layers": layers, "revision": revision}}
+
+    def describe(self, max_fields: int = 25) -> str:
+        """One line per layer for the LLM: ID, name, type, CRS and field names"""
+        with self.lock:
+            layers = list(self.layers.values())
+        if not layers:
+            return "The project has no layers."
+        lines = []
+        for layer in layers:
+            line = f'- id="{layer["id"]}" name="{layer["name"]}" type={layer["type"]} crs={layer["crs"]}'
+            if layer.get("geometry_type"):
+                line += f' geometry={layer["geometry_type"]}'
+            fields = [field["name"] for field in layer.get("fields", [])]
+            if fields:
+                more = f", ... ({len(fields) - max_fields} more)" if len(fields) > max_fields else ""
+                line += f' fields=[{", ".join(fields[:max_fields])}{more}]'
+            lines.append(line)
+        return "\n".join(lines)
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "ready": self.ready,
+                "layers": len(self.layers),
+                "revision": self.revision,
+                "events_applied": self.events,
+                "updated": self.updated
+            }
@@ -0,0 +1,134 @@
+"""
+Latency histograms and counters for the plugin and the backend.
+
+Each stage of a command (LLM call, JSON extraction, socket send, plugin
+queue wait, QGIS execution, serialization, receive) is timed as a span and
+recorded in a histogram keyed by metric name and labels.  Recording takes
+one lock and a bisect; nothing is formatted until the metrics are read.
+
+snapshot() returns the metrics as JSON (the plugin's get_metrics command
+sends it, with gauges read from its caches added), and prometheus_text()
+renders a snapshot in the Prometheus text exposition format, so the backend can serve its own metrics and the
+plugin's on one page.
+
+This module has no QGIS dependency and is shared with the backend.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds in seconds, from sub-millisecond socket work to long renders
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def to_dict(self):
+        cumulative, total = [], 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            cumulative.append([bound, total])
+        return {"buckets": cumulative, "sum": self.sum, "count": self.count}
+
+
+class Metrics:
+    """Histograms and counters, thread safe"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+        self.started = time.time()
+
+    @staticmethod
+    def _key(name, labels):
+        # Label values are kept as strings so keys always sort, e.g. command=None from a malformed request
+        return name, tuple(sorted((label, str(value)) for label, value in labels.items()))
+
+    def observe(self, name, seconds, **labels):
+        key = self._key(name, labels)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def span(self, name, **labels):
+        """Time the enclosed block into the histogram `name`"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def inc(self, name, value=1, **labels):
+        key = self._key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "uptime": time.time() - self.started,
+                "histograms": [
+                    dict(histogram.to_dict(), name=name, labels=dict(labels))
+                    for (name, labels), histogram in sorted(self.histograms.items())
+                ],
+                "counters": [
+                    {"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in sorted(self.counters.items())
+                ]
+            }
+
+
+def _labels(labels, extra=None):
+    items = list(labels.items()) + ([extra] if extra else [])
+    if not items:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in items)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(items, escaped)) + "}"
+
+
+def prometheus_text(snapshot, prefix):
+    """Render a snapshot in the Prometheus text format, metric names prefixed with `prefix`"""
+    lines = []
+    declared = set()
+    for histogram in snapshot["histograms"]:
+        name = prefix + histogram["name"]
+        if name not in declared:
+            declared.add(name)
+            lines.append(f"# TYPE {name} histogram")
+        labels = histogram["labels"]
+        for bound, count in histogram["buckets"]:
+            lines.append(f"{name}_bucket{_labels(labels, ('le', repr(float(bound))))} {count}")
+        lines.append(f"{name}_bucket{_labels(labels, ('le', '+Inf'))} {histogram['count']}")
+        lines.append(f"{name}_sum{_labels(labels)} {histogram['sum']}")
+        lines.append(f"{name}_count{_labels(labels)} {histogram['count']}")
+    for counter in snapshot["counters"]:
+        name = prefix + counter["name"]
+        if name not in declared:
+            declared.add(name)
+            lines.append(f"# TYPE {name} counter")
+        lines.append(f"{name}{_labels(counter['labels'])} {counter['value']}")
+    for gauge in snapshot.get("gauges", []):
+        name = prefix + gauge["name"]
+        if name not in declared:
+            declared.add(name)
+            lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name}{_labels(gauge['labels'])} {gauge['value']}")
+    name = prefix + "uptime_seconds"
+    lines.append(f"# TYPE {name} gauge")
+    lines.append(f"{name} {snapshot['uptime']}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,193 @@
+"""
+Wire protocol shared by the QGIS MCP plugin and its clients.
+
+Every message is sent as a frame: a fixed 8 byte header followed by the
+payload.
+
+    magic (2 bytes, b"QM") | version (1 byte) | kind (1 byte) | length (4 bytes, big endian)
+
+A JSON frame carries one UTF-8 JSON message.  A binary frame carries a JSON
+message plus a raw body (column buffers, encoded images):
+
+    message length (4 bytes, big endian) | JSON message | body
+
+Old clients that send bare JSON documents are still understood; the server
+tells them apart by the magic prefix (a JSON document never starts with
+"Q").  A client upgrades its connection by sending a bare JSON ``hello``
+command first: servers that know about framing answer with their protocol
+version, older servers answer with an "Unknown command" error and the
+client keeps talking bare JSON.
+
+The plugin and the backend are deployed separately, so this module exists
+twice: ``qgis_mcp_plugin/protocol.py`` and ``src/qgis_mcp/protocol.py``.
+Keep both copies identical.
+"""
+import json
+import struct
+
+MAGIC = b"QM"
+PROTOCOL_VERSION = 1
+
+KIND_JSON = 0
+KIND_BINARY = 1
+
+HEADER = struct.Struct("!2sBBI")
+HEADER_SIZE = HEADER.size
+MAX_FRAME_SIZE = 0xFFFFFFFF
+BINARY_PREFIX = struct.Struct("!I")
+
+
+class ProtocolError(Exception):
+    """Raised when the peer sends bytes that are not a valid frame"""
+
+
+class BinaryMessage:
+    """A JSON message sent together with a raw binary body"""
+
+    def __init__(self, message, body):
+        self.message = message
+        self.body = body
+
+
+def encode_frame(payload, kind=KIND_JSON):
+    """Prefix a payload with a frame header"""
+    if len(payload) > MAX_FRAME_SIZE:
+        raise ProtocolError(f"Frame too large: {len(payload)} bytes")
+    return HEADER.pack(MAGIC, PROTOCOL_VERSION, kind, len(payload)) + payload
+
+
+def encode_json(message):
+    """Encode a message as a JSON frame"""
+    return encode_frame(json.dumps(message, separators=(",", ":")).encode("utf-8"))
+
+
+def decode_json(payload):
+    """Decode the payload of a JSON frame"""
+    return json.loads(payload)
+
+
+def body_parts(body):
+    """The parts of a binary body: a bytes-like object or a list of them"""
+    return body if isinstance(body, (list, tuple)) else [body]
+
+
+def body_bytes(body):
+    """A binary body joined into one bytes object, e.g. for base64 to legacy clients"""
+    return b"".join(bytes(part) for part in body_parts(body))
+
+
+def encode_binary(message, body):
+    """Encode a message and its body as a binary frame
+
+    ``body`` is a bytes-like object or a list of them, written back to back.
+    """
+    header = json.dumps(message, separators=(",", ":")).encode("utf-8")
+    parts = body_parts(body)
+    length = BINARY_PREFIX.size + len(header) + sum(memoryview(part).nbytes for part in parts)
+    if length > MAX_FRAME_SIZE:
+        raise ProtocolError(f"Frame too large: {length} bytes")
+    frame = bytearray(HEADER.pack(MAGIC, PROTOCOL_VERSION, KIND_BINARY, length))
+    frame += BINARY_PREFIX.pack(len(header))
+    frame += header
+    for part in parts:
+        frame += part
+    return frame
+
+
+def decode_binary(payload):
+    """Split a binary frame payload into its message and a zero-copy view of the body"""
+    view = memoryview(payload)
+    (length,) = BINARY_PREFIX.unpack_from(view)
+    start = BINARY_PREFIX.size
+    message = json.loads(bytes(view[start:start + length]))
+    return message, view[start + length:]
+
+
+def decode_message(kind, payload):
+    """Decode any frame into ``(message, body)``; body is None for JSON frames"""
+    if kind == KIND_JSON:
+        return decode_json(payload), None
+    if kind == KIND_BINARY:
+        return decode_binary(payload)
+    raise ProtocolError(f"Unknown frame kind: {kind}")
+
+
+def parse_header(header):
+    """Validate a frame header and return ``(kind, length)``"""
+    magic, version, kind, length = HEADER.unpack_from(header)
+    if magic != MAGIC:
+        raise ProtocolError(f"Bad frame magic: {bytes(magic)!r}")
+    if version > PROTOCOL_VERSION:
+        raise ProtocolError(f"Unsupported protocol version: {version}")
+    return kind, length
+
+
+def looks_framed(data):
+    """Tell whether the first bytes of a connection start a frame"""
+    prefix = bytes(data[:len(MAGIC)])
+    return bool(prefix) and MAGIC.startswith(prefix)
+
+
+def recv_exact(sock, size):
+    """Read exactly ``size`` bytes from a blocking socket into one buffer"""
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        count = sock.recv_into(view[received:], size - received)
+        if not count:
+            raise ConnectionError("Connection closed by peer")
+        received += count
+    return buffer
+
+
+def recv_frame(sock):
+    """Read one frame from a blocking socket and return ``(kind, payload)``"""
+    kind, length = parse_header(recv_exact(sock, HEADER_SIZE))
+    return kind, recv_exact(sock, length)
+
+
+class FrameDecoder:
+    """Incremental frame decoder for non-blocking sockets.
+
+    Bytes are copied once into a buffer preallocated from the frame header,
+    so a large payload is assembled in a single linear pass.
+    """
+
+    def __init__(self):
+        self._header = bytearray()
+        self._kind = None
+        self._payload = None
+        self._received = 0
+
+    @property
+    def idle(self):
+        """True when no partial frame is buffered"""
+        return not self._header and self._payload is None
+
+    def feed(self, data):
+        """Consume received bytes and return the completed ``(kind, payload)`` frames"""
+        frames = []
+        view = memoryview(data)
+        offset = 0
+        while offset < len(view):
+            if self._payload is None:
+                needed = HEADER_SIZE - len(self._header)
+                self._header += view[offset:offset + needed]
+                offset += min(needed, len(view) - offset)
+                if len(self._header) < HEADER_SIZE:
+                    break
+                self._kind, length = parse_header(self._header)
+                self._header = bytearray()
+                self._payload = bytearray(length)
+                self._received = 0
+            else:
+                count = min(len(self._payload) - self._received, len(view) - offset)
+                self._payload[self._received:self._received + count] = view[offset:offset + count]
+                self._received += count
+                offset += count
+            if self._payload is not None and self._received == len(self._payload):
+                frames.append((self._kind, self._payload))
+                self._kind = None
+                self._payload = None
+        return frames
@@ -2,7 +2,7 @@
 """
 QGIS MCP Server with LLM Integration and HTTP API
 """
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 import os
 import socket
@@ -10,11 +10,15 @@ import threading
 import time
 import json
 import logging
-import re
+from contextlib import contextmanager
 from typing import Dict, Any
-from dotenv import load_dotenv, find_dotenv, set_key
 import openai
 
+import protocol
+from automation import METRICS, APIKeyManager, AutomationBase, is_idempotent, timeout_for, to_plugin_command
+from metrics import prometheus_text
+from json_stream import IncrementalJSONParser
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -25,39 +29,14 @@ logger = logging.getLogger("QgisGPTMCPServer")
 app = Flask(__name__)
 CORS(app)
 
-class APIKeyManager:
-    @staticmethod
-    def get_key():
-        """Secure API key handling with .env storage"""
-        env_path = find_dotenv()
-        if not env_path:
-            env_path = os.path.join(os.path.expanduser("~"), ".env")
-            open(env_path, 'a').close()
-            
-        load_dotenv(env_path)
-        api_key = os.getenv('OPENAI_API_KEY')
-        
-        if api_key:
-            return api_key
-            
-        print("\nAPI Key Required")
-        print("1. Get your key from https://platform.openai.com/api-keys")
-        print("2. The key starts with 'sk-'")
-        
-        while True:
-            api_key = input("Enter OpenAI API Key: ").strip()
-            if api_key.startswith("sk-"):
-                set_key(env_path, "OPENAI_API_KEY", api_key)
-                print(f"API key stored securely in {env_path}")
-                return api_key
-            print("Invalid API key format. Must start with 'sk-'. Try again.")
-
 class QgisConnection:
     def __init__(self, host='localhost', port=9876):
         self.host = host
         self.port = port
         self.socket = None
         self.connected = False
+        self.framed = False
+        self.last_used = 0.0
         
     def connect(self):
         try:
@@ -67,8 +46,10 @@ class QgisConnection:
             self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.socket.settimeout(2)
             self.socket.connect((self.host, self.port))
+            self.framed = self._handshake()
             self.connected = True
-            logger.info("Connected to QGIS plugin")
+            self.last_used = time.monotonic()
+            logger.info(f"Connected to QGIS plugin ({'framed' if self.framed else 'legacy'} protocol)")
             return True
         except socket.timeout:
             logger.warning("Connection timed out - is QGIS plugin running?")
@@ -79,104 +60,408 @@ class QgisConnection:
             logger.error(f"Connection failed: {str(e)}", exc_info=True)
             return False
 
-    def send_command(self, command: Dict[str, Any]):
+    def _handshake(self):
+        """Ask the plugin for framed messages; older plugins reject the hello command"""
+        hello = {"type": "hello", "params": {"protocol": protocol.PROTOCOL_VERSION}}
+        self.socket.sendall(json.dumps(hello).encode('utf-8'))
+        reply = self._recv_legacy()
+        return reply.get("status") == "success" and reply.get("result", {}).get("protocol", 0) >= 1
+
+    def _recv_legacy(self):
+        """Read one bare JSON document, for plugins that predate framing"""
+        response = b''
+        while True:
+            chunk = self.socket.recv(65536)
+            if not chunk:
+                raise ConnectionError("Connection closed by QGIS")
+            response += chunk
+            if not response.rstrip().endswith(b'}'):
+                continue
+            try:
+                return json.loads(response.decode('utf-8'))
+            except json.JSONDecodeError:
+                continue
+
+    def _recv_message(self):
+        """Read one framed reply; a binary body is attached under "body" as a memoryview"""
+        kind, payload = protocol.recv_frame(self.socket)
+        message, body = protocol.decode_message(kind, payload)
+        if body is not None:
+            message["body"] = body
+        return message
+
+    def _disconnect(self):
+        if self.socket:
+            self.socket.close()
+        self.socket = None
+        self.connected = False
+
+    def send_command(self, command: Dict[str, Any], timeout: float = 2.0):
         """Send command in plugin-compatible format"""
         if not self.connected and not self.connect():
             return {"status": "error", "message": "Not connected to QGIS"}
             
         try:
-            plugin_command = {
-                "type": command["command"],
-                "params": command["params"]
-            }
-            
-            if plugin_command["type"] == "create_project":
-                plugin_command["type"] = "create_new_project"
-            
-            logger.info(f"Sending to plugin: {json.dumps(plugin_command, indent=2)}")
-            self.socket.sendall(json.dumps(plugin_command).encode('utf-8'))
-            
-            response = b''
-            while True:
-                try:
-                    chunk = self.socket.recv(4096)
-                    if not chunk:
-                        break
-                    response += chunk
-                    try:
-                        return json.loads(response.decode('utf-8'))
-                    except json.JSONDecodeError:
-                        continue
-                except socket.timeout:
-                    break
-                    
-            if response:
-                return json.loads(response.decode('utf-8'))
+            self.socket.settimeout(timeout)
+            self.last_used = time.monotonic()
+            plugin_command = to_plugin_command(command)
+            command_type = plugin_command["type"]
+            logger.debug("Sending to plugin: %s", command_type)
+            with METRICS.span("serialize_seconds", command=command_type):
+                if self.framed:
+                    data = protocol.encode_json(plugin_command)
+                else:
+                    data = json.dumps(plugin_command).encode('utf-8')
+            with METRICS.span("send_seconds", command=command_type):
+                self.socket.sendall(data)
+            # From the end of the send to the decoded reply, so it includes the plugin's own time
+            with METRICS.span("receive_seconds", command=command_type):
+                return self._recv_message() if self.framed else self._recv_legacy()
+        except socket.timeout:
+            # A late reply would desynchronise the stream, so start over on a new socket
+            self._disconnect()
             return {"status": "error", "message": "No response from QGIS"}
         except Exception as e:
             logger.error(f"Command failed: {str(e)}", exc_info=True)
+            self._disconnect()
             return {"status": "error", "message": str(e)}
 
-class QGISAutomation:
-    def __init__(self):
-        self.openai_client = openai.OpenAI(api_key=APIKeyManager.get_key())
-        self.qgis = QgisConnection()
-        self.qgis.connect()  # Try initial connection but don't fail if it doesn't work
+    def stream_command(self, command: Dict[str, Any], timeout: float = 2.0):
+        """Send a streaming command and yield each message of the reply as it arrives
+
+        "partial" messages are yielded as soon as their frame is read; the last
+        message is the final success or error response.  Plugins without framing
+        answer with a single message.
+
+        If the caller stops early, unread frames of the reply are still on the
+        socket, so the connection is dropped rather than reused out of step.
+        """
+        if not self.framed:
+            yield self.send_command(command, timeout)
+            return
+            
+        finished = False
+        try:
+            self.socket.settimeout(timeout)
+            self.last_used = time.monotonic()
+            plugin_command = to_plugin_command(command)
+            plugin_command["params"] = dict(plugin_command["params"], stream=True)
+            self.socket.sendall(protocol.encode_json(plugin_command))
+            while True:
+                message = self._recv_message()
+                finished = message.get("status") != "partial"
+                yield message
+                if finished:
+                    return
+        except socket.timeout:
+            self._disconnect()
+            yield {"status": "error", "message": "No response from QGIS"}
+        except Exception as e:
+            logger.error(f"Streaming command failed: {str(e)}", exc_info=True)
+            self._disconnect()
+            yield {"status": "error", "message": str(e)}
+        finally:
+            if not finished and self.connected:
+                logger.info("Stream abandoned before its final message, dropping the connection")
+                self._disconnect()
+
+class QgisConnectionPool:
+    """Thread-safe pool of plugin connections
+
+    Every request checks out its own connection, so concurrent waitress
+    workers never interleave bytes on one socket.  Connections idle for
+    longer than health_check_after are pinged before reuse, idempotent
+    commands are retried with exponential backoff when the transport fails,
+    and each command gets its own timeout.
+    """
+    def __init__(self, host='localhost', port=9876, size=8, max_retries=2, backoff=0.2,
+                 health_check_after=30.0, checkout_timeout=10.0):
+        self.host = host
+        self.port = port
+        self.size = size
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.health_check_after = health_check_after
+        self.checkout_timeout = checkout_timeout
+        self.idle = []
+        self.created = 0
+        self.connected = False
+        self.lock = threading.Condition()
+
+    def timeout_for(self, command: Dict[str, Any]):
+        return timeout_for(command)
+
+    def _acquire(self):
+        deadline = time.monotonic() + self.checkout_timeout
+        with self.lock:
+            while not self.idle and self.created >= self.size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError("No QGIS connection available")
+                self.lock.wait(remaining)
+            if self.idle:
+                return self.idle.pop()
+            self.created += 1
+        return QgisConnection(self.host, self.port)
+
+    def _release(self, connection):
+        with self.lock:
+            if connection.connected:
+                self.idle.append(connection)
+            else:
+                self.created -= 1
+            self.lock.notify()
 
-    def _extract_json(self, text: str):
-        """Robust JSON extraction from text"""
+    def _healthy(self, connection):
+        """Make sure a checked-out connection is usable, reconnecting if needed"""
+        if connection.connected and time.monotonic() - connection.last_used > self.health_check_after:
+            if connection.send_command({"command": "ping", "params": {}}).get("status") != "success":
+                connection._disconnect()
+        if not connection.connected:
+            connection.connect()
+        self.connected = connection.connected
+        return connection.connected
+
+    @contextmanager
+    def checkout(self):
+        """Borrow a healthy connection for the duration of one request"""
+        connection = self._acquire()
         try:
-            return json.loads(text)
-        except json.JSONDecodeError:
-            json_match = re.search(r'\{.*\}', text, re.DOTALL)
-            if json_match:
-                try:
-                    return json.loads(json_match.group())
-                except json.JSONDecodeError:
-                    pass
-        raise ValueError("No valid JSON found in response")
-
-    def process_request(self, prompt: str):
-        """Process natural language prompt with LLM"""
+            self._healthy(connection)
+            yield connection
+        finally:
+            self._release(connection)
+
+    def connect(self):
+        """Check that the plugin is reachable"""
         try:
-            system_prompt = """You are a QGIS automation assistant. Respond ONLY with JSON:
-            {
-                "command": "create_project|add_vector_layer|add_raster_layer|load_project|save_project|get_layers|remove_layer|zoom_to_layer|get_layer_features|execute_processing|render_map|execute_code",
-                "params": {
-                    "path": "string",
-                    "name": "string",
-                    "provider": "string",
-                    "layer_id": "string",
-                    "limit": integer,
-                    "algorithm": "string",
-                    "parameters": {},
-                    "width": integer,
-                    "height": integer,
-                    "code": "string"
-                }
-            }"""
-            
+            with self.checkout() as connection:
+                return connection.connected
+        except TimeoutError:
+            return self.connected
+
+    def send_command(self, command: Dict[str, Any]):
+        retries = self.max_retries if is_idempotent(command) else 0
+        timeout = self.timeout_for(command)
+        for attempt in range(retries + 1):
+            try:
+                with self.checkout() as connection:
+                    if not connection.connected:
+                        result = {"status": "error", "message": "Not connected to QGIS"}
+                    else:
+                        result = connection.send_command(command, timeout)
+                    transport_failed = not connection.connected
+            except TimeoutError as e:
+                return {"status": "error", "message": str(e)}
+            self.connected = not transport_failed
+            if not transport_failed or attempt == retries:
+                return result
+            delay = self.backoff * (2 ** attempt)
+            logger.warning(f"Retrying {command['command']} in {delay:.1f}s: {result.get('message')}")
+            time.sleep(delay)
+        return result
+
+    def stream_command(self, command: Dict[str, Any]):
+        """Stream a command's reply on a connection held until the stream ends"""
+        try:
+            with self.checkout() as connection:
+                yield from connection.stream_command(command, self.timeout_for(command))
+                self.connected = connection.connected
+        except TimeoutError as e:
+            yield {"status": "error", "message": str(e)}
+
+    def send_batch(self, steps, stop_on_error: bool = True):
+        """Run an ordered list of {command, params} steps in one round trip
+
+        Later steps can use "$<step>.<path>" strings to refer to values in
+        earlier steps' responses, e.g. "$0.layer_id".
+        """
+        return self.send_command({"command": "batch", "params": {"steps": steps, "stop_on_error": stop_on_error}})
+
+class QGISAutomation(AutomationBase):
+    def __init__(self, openai_client=None, qgis=None):
+        super().__init__()
+        self.openai_client = openai_client or openai.OpenAI(api_key=APIKeyManager.get_key())
+        self.qgis = qgis or QgisConnectionPool()
+        self.qgis.connect()  # Try initial connection but don't fail if it doesn't work
+        threading.Thread(target=self.watch_layers, daemon=True).start()
+
+    def watch_layers(self, retry_delay: float = 5.0):
+        """Keep the layer index current from the layer events the plugin pushes
+
+        Runs on its own connection, outside the pool, since pushed events
+        arrive whenever the project changes.  Plugins without framing cannot
+        push; the index then stays unready and get_layers is asked instead.
+        """
+        while True:
+            connection = QgisConnection(self.qgis.host, self.qgis.port)
+            try:
+                if connection.connect() and connection.framed:
+                    reply = connection.send_command({"command": "subscribe_layers", "params": {}}, timeout=10.0)
+                    if reply.get("status") == "success":
+                        self.layer_index.load(reply["result"])
+                        logger.info(f"Layer index loaded: {len(reply['result']['layers'])} layers")
+                        connection.socket.settimeout(None)
+                        while self.layer_index.apply(connection._recv_message()):
+                            pass
+                        logger.warning("Layer index out of step, subscribing again")
+            except Exception as e:
+                logger.warning(f"Layer event stream failed: {str(e)}")
+            finally:
+                self.layer_index.invalidate()
+                connection._disconnect()
+            time.sleep(retry_delay)
+
+    def _layer_context(self):
+        """(id, name) of the project's layers; part of the intent cache key"""
+        if self.layer_index.ready:
+            return self.layer_index.context()
+        return self._layers_from_result(self.qgis.send_command({"command": "get_layers", "params": {}}))
+
+    def _parse_with_llm(self, prompt: str, session=None):
+        """Ask the LLM to turn a prompt into a {command, params} object"""
+        with METRICS.span("llm_seconds", mode="complete"):
             response = self.openai_client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": prompt}
-                ],
+                model=self.LLM_MODEL,
+                messages=self._llm_messages(prompt, session),
                 temperature=0.1
             )
+        
+        content = response.choices[0].message.content
+        with METRICS.span("json_extract_seconds"):
+            return self._validate_command(self._extract_json(content))
+
+    def _stream_with_llm(self, prompt: str, session=None):
+        """Like _parse_with_llm, but streamed: yields progress events and returns the command
+
+        The reply is parsed as it arrives and the stream is closed as soon as
+        the JSON object is complete.
+        """
+        started = time.perf_counter()
+        stream = self.openai_client.chat.completions.create(
+            model=self.LLM_MODEL,
+            messages=self._llm_messages(prompt, session),
+            temperature=0.1,
+            stream=True
+        )
+        parser = IncrementalJSONParser()
+        try:
+            for chunk in stream:
+                if not chunk.choices or not chunk.choices[0].delta.content:
+                    continue
+                command_name = parser.command
+                if parser.feed(chunk.choices[0].delta.content) is not None:
+                    break
+                if parser.command and not command_name:
+                    yield "progress", {"stage": "parsing", "command": parser.command}
+        finally:
+            stream.close()
+            # Up to the end of the JSON object; the time spent yielding progress is included
+            METRICS.observe("llm_seconds", time.perf_counter() - started, mode="stream")
+        with METRICS.span("json_extract_seconds"):
+            return self._validate_command(parser.close())
+
+    def parse_command(self, prompt: str, session=None):
+        """Turn a prompt into a command: fast-path matcher, then intent cache, then LLM
+
+        Returns (command, cache key); the key is set for LLM-parsed commands
+        that may be cached once they have run successfully.
+        """
+        layers = self._layer_context()
+        command, route = self._parse_without_llm(prompt, layers, session)
+        cache_key = None
+        if command is None:
+            command = self._parse_with_llm(prompt, session)
+            cache_key = self._intent_key(prompt, layers, session)
+        self._count_route(route)
+        return command, cache_key
+
+    def process_request(self, prompt: str, session_id: str = None):
+        """Process natural language prompt with LLM; with a session ID, earlier turns are part of the context"""
+        session = self.chat_sessions.get(session_id)
+        command = cache_key = None
+        try:
+            command, cache_key = self.parse_command(prompt, session)
+            logger.info(f"Executing command: {command}")
+            result = self._answer_locally(command) or self.qgis.send_command(command)
             
-            content = response.choices[0].message.content
-            command = self._extract_json(content)
+        except Exception as e:
+            logger.error(f"Processing failed: {str(e)}", exc_info=True)
+            result = {"status": "error", "message": str(e)}
+        self._cache_intent(cache_key, command, result)
+        self._remember(session, prompt, command, result)
+        return result
+
+    def process_request_stream(self, prompt: str, session_id: str = None):
+        """Process a prompt, yielding (event, data) pairs as each stage completes
+
+        Events: intent_parsed, dispatched, progress (LLM parsing, streamed
+        features, job progress) and finally result.
+        """
+        session = self.chat_sessions.get(session_id)
+        command = cache_key = None
+        try:
+            started = time.monotonic()
+            layers = self._layer_context()
+            command, route = self._parse_without_llm(prompt, layers, session)
+            if command is None:
+                yield "progress", {"stage": "llm"}
+                command = yield from self._stream_with_llm(prompt, session)
+                cache_key = self._intent_key(prompt, layers, session)
+            self._count_route(route)
+            yield "intent_parsed", {
+                "command": command,
+                "route": route,
+                "elapsed_ms": round((time.monotonic() - started) * 1000, 1)
+            }
             
-            if not all(k in command for k in ["command", "params"]):
-                raise ValueError("Missing required fields in command")
-                
             logger.info(f"Executing command: {command}")
-            return self.qgis.send_command(command)
-            
+            yield "dispatched", {"command": command["command"]}
+            if command["command"] == "get_layer_features":
+                result = yield from self._stream_features(command)
+            elif (command["command"] == "submit_job"
+                  or command["command"] == "load_project" and command["params"].get("lazy")):
+                result = yield from self._follow_job(command)
+            else:
+                result = self._answer_locally(command) or self.qgis.send_command(command)
         except Exception as e:
             logger.error(f"Processing failed: {str(e)}", exc_info=True)
-            return {"status": "error", "message": str(e)}
+            result = {"status": "error", "message": str(e)}
+        result.pop('body', None)
+        self._cache_intent(cache_key, command, result)
+        self._remember(session, prompt, command, result)
+        yield "result", result
+
+    def _stream_features(self, command):
+        """Read features in chunks, reporting how many have arrived"""
+        features = []
+        for message in self.qgis.stream_command(command):
+            message.pop('body', None)
+            if message.get("status") != "partial":
+                if message.get("status") == "success":
+                    message["result"]["features"] = features
+                return message
+            features.extend(message["result"].get("features", []))
+            yield "progress", {"stage": "features", "count": len(features)}
+        return {"status": "error", "message": "Feature stream ended early"}
+
+    def _follow_job(self, command, poll_interval: float = 0.5):
+        """Submit a job (processing or a lazy project load) and report its progress until it finishes"""
+        submitted = self.qgis.send_command(command)
+        if submitted.get("status") != "success":
+            return submitted
+        job_id = submitted["result"]["job_id"]
+        progress = None
+        while True:
+            job = self.qgis.send_command({"command": "job_status", "params": {"job_id": job_id}})
+            if job.get("status") != "success":
+                return job
+            if job["result"]["progress"] != progress:
+                progress = job["result"]["progress"]
+                yield "progress", {"stage": "job", "job": job["result"]}
+            if job["result"]["status"] in ("succeeded", "failed", "cancelled"):
+                return self.qgis.send_command({"command": "job_result", "params": {"job_id": job_id}})
+            time.sleep(poll_interval)
 
 class SystemStatus:
     def __init__(self):
@@ -216,7 +501,11 @@ def get_status():
     return jsonify({
         "qgis_connected": connected,
         "current_directory": status.current_directory,
-        "last_activity": status.last_activity
+        "last_activity": status.last_activity,
+        "intent_cache": status.automation.intent_cache.stats() if status.automation else None,
+        "intent_routes": dict(status.automation.route_counts) if status.automation else None,
+        "layer_index": status.automation.layer_index.stats() if status.automation else None,
+        "chat_sessions": status.automation.chat_sessions.stats() if status.automation else None
     })
 
 @app.route('/api/command', methods=['POST'])
@@ -229,13 +518,176 @@ def handle_command():
         return jsonify({"status": "error", "message": "Missing prompt"}), 400
     
     status.last_activity = time.strftime("%Y-%m-%d %H:%M:%S")
-    result = status.automation.process_request(data['prompt'])
+    with METRICS.span("request_seconds", route="command"):
+        result = status.automation.process_request(data['prompt'], data.get('session_id'))
+    METRICS.inc("requests_total", route="command", status=result.get('status', 'unknown'))
+    result.pop('body', None)  # binary payloads are served by dedicated routes
     
     if result.get('status') == 'success' and 'params' in result and 'path' in result['params']:
         status.update_directory(result['params']['path'])
     
     return jsonify(result)
 
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.route('/api/command/stream', methods=['POST'])
+def handle_command_stream():
+    """Same as /api/command, reported as Server-Sent Events while the request progresses"""
+    if not hasattr(status, 'automation') or not status.automation:
+        return jsonify({"status": "error", "message": "QGIS connection not available"}), 503
+    
+    data = request.get_json()
+    if not data or 'prompt' not in data:
+        return jsonify({"status": "error", "message": "Missing prompt"}), 400
+    
+    status.last_activity = time.strftime("%Y-%m-%d %H:%M:%S")
+    
+    def generate():
+        for event, payload in status.automation.process_request_stream(data['prompt'], data.get('session_id')):
+            if event == 'result' and payload.get('status') == 'success' and 'path' in payload.get('params', {}):
+                status.update_directory(payload['params']['path'])
+            yield _sse(event, payload)
+    
+    response = Response(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/api/features', methods=['POST'])
+def stream_features():
+    """Stream a layer's features as NDJSON: one feature per line, then the query summary"""
+    if not hasattr(status, 'automation') or not status.automation:
+        return jsonify({"status": "error", "message": "QGIS connection not available"}), 503
+    
+    data = request.get_json()
+    if not data or 'layer_id' not in data:
+        return jsonify({"status": "error", "message": "Missing layer_id"}), 400
+    
+    params = dict(data)
+    params.setdefault('limit', 0)  # 0 = no limit
+    
+    def generate():
+        for message in status.automation.qgis.stream_command({"command": "get_layer_features", "params": params}):
+            message.pop("body", None)
+            if message.get("status") == "partial":
+                for feature in message["result"].get("features", []):
+                    yield json.dumps(feature) + "\n"
+            else:
+                yield json.dumps(message) + "\n"
+    
+    return Response(generate(), mimetype='application/x-ndjson')
+
+def _plugin_call(command, params, http_status_on_error=400):
+    """Run one plugin command directly, without going through the LLM"""
+    if not hasattr(status, 'automation') or not status.automation:
+        return jsonify({"status": "error", "message": "QGIS connection not available"}), 503
+    result = status.automation.qgis.send_command({"command": command, "params": params})
+    result.pop('body', None)
+    return jsonify(result), (200 if result.get('status') == 'success' else http_status_on_error)
+
+@app.route('/api/sessions/<session_id>', methods=['DELETE'])
+def end_session(session_id):
+    """Forget a chat session's turns and summary, e.g. when the user starts a new conversation"""
+    if not hasattr(status, 'automation') or not status.automation:
+        return jsonify({"status": "error", "message": "QGIS connection not available"}), 503
+    return jsonify({"status": "success", "result": {"ended": status.automation.chat_sessions.drop(session_id)}})
+
+@app.route('/api/layers', methods=['GET'])
+def get_layers():
+    """Layers with fields and extents, from the layer index when it is in step with the plugin"""
+    if not hasattr(status, 'automation') or not status.automation:
+        return jsonify({"status": "error", "message": "QGIS connection not available"}), 503
+    if status.automation.layer_index.ready:
+        return jsonify(status.automation.layer_index.get_layers_result(details=True))
+    return _plugin_call("get_layers", {"details": True}, 502)
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Stage timings of the backend and the plugin in the Prometheus text format"""
+    text = prometheus_text(METRICS.snapshot(), "qgis_mcp_backend_")
+    plugin = None
+    if hasattr(status, 'automation') and status.automation and status.automation.qgis.connected:
+        plugin = status.automation.qgis.send_command({"command": "get_metrics", "params": {}})
+    up = bool(plugin) and plugin.get('status') == 'success'
+    if up:
+        text += prometheus_text(plugin['result'], "qgis_mcp_plugin_")
+    text += f"# TYPE qgis_mcp_plugin_up gauge\nqgis_mcp_plugin_up {int(up)}\n"
+    return Response(text, mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/jobs', methods=['POST'])
+def submit_job():
+    """Queue a processing algorithm; returns immediately with the job ID"""
+    data = request.get_json()
+    if not data or 'algorithm' not in data:
+        return jsonify({"status": "error", "message": "Missing algorithm"}), 400
+    return _plugin_call("submit_job", {"algorithm": data['algorithm'], "parameters": data.get('parameters', {})})
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    return _plugin_call("job_status", {"job_id": job_id}, 404)
+
+@app.route('/api/jobs/<job_id>/result', methods=['GET'])
+def job_result(job_id):
+    return _plugin_call("job_result", {"job_id": job_id}, 409)
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    return _plugin_call("cancel_job", {"job_id": job_id}, 404)
+
+@app.route('/api/tiles/<int:z>/<int:x>/<int:y>.png', methods=['GET'])
+def map_tile(z, x, y):
+    """XYZ tiles of the QGIS canvas layers, for the frontend's Leaflet map"""
+    if not hasattr(status, 'automation') or not status.automation:
+        return jsonify({"status": "error", "message": "QGIS connection not available"}), 503
+    
+    result = status.automation.qgis.send_command({"command": "render_tile", "params": {"z": z, "x": x, "y": y}})
+    body = result.pop('body', None)
+    if result.get('status') != 'success' or body is None:
+        return jsonify(result), 502
+    
+    response = Response(bytes(body), mimetype=result['result']['mime_type'])
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/api/render', methods=['GET'])
+def render_map_image():
+    """Render the QGIS canvas in memory and stream the image, honouring If-None-Match"""
+    if not hasattr(status, 'automation') or not status.automation:
+        return jsonify({"status": "error", "message": "QGIS connection not available"}), 503
+    
+    params = {
+        "width": request.args.get('width', 800, type=int),
+        "height": request.args.get('height', 600, type=int),
+        "dpi": request.args.get('dpi', 96, type=int),
+        "format": request.args.get('format', 'png'),
+        "quality": request.args.get('quality', -1, type=int)
+    }
+    if_none_match = request.headers.get('If-None-Match', '').strip('"')
+    if if_none_match:
+        params["if_none_match"] = if_none_match
+    
+    result = status.automation.qgis.send_command({"command": "render_map", "params": params})
+    body = result.pop('body', None)
+    if result.get('status') != 'success':
+        return jsonify(result), 502
+    
+    etag = result['result']['etag']
+    if result['result'].get('not_modified'):
+        response = Response(status=304)
+    elif body is None:
+        return jsonify({"status": "error", "message": "QGIS returned no image"}), 502
+    else:
+        chunk_size = 65536
+        response = Response(
+            (bytes(body[start:start + chunk_size]) for start in range(0, len(body), chunk_size)),
+            mimetype=result['result']['mime_type']
+        )
+        response.headers['Content-Length'] = str(len(body))
+    response.headers['ETag'] = f'"{etag}"'
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
 @app.route('/api/llm_test', methods=['POST'])
 def test_llm():
     data = request.get_json()
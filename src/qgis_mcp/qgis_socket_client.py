@@ -7,23 +7,62 @@ import socket
 import json
 import argparse
 import sys
+import time
+
+import protocol
+from columnar import decode_batch
 
 class QgisMCPClient:
     def __init__(self, host='localhost', port=9876):
         self.host = host
         self.port = port
         self.socket = None
-    
+        self.framed = False
+        self.next_id = 0
+
     def connect(self):
         """Connect to the QGIS MCP server"""
         try:
             self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.socket.connect((self.host, self.port))
+            self.framed = self._handshake()
             return True
         except Exception as e:
             print(f"Error connecting to server: {str(e)}")
             return False
     
+    def _handshake(self):
+        """Switch to framed messages if the server supports them"""
+        hello = {"type": "hello", "params": {"protocol": protocol.PROTOCOL_VERSION}}
+        self.socket.sendall(json.dumps(hello).encode('utf-8'))
+        reply = self._recv_legacy()
+        return reply.get("status") == "success" and reply.get("result", {}).get("protocol", 0) >= 1
+    
+    def _recv_legacy(self):
+        """Receive one bare JSON response from a server without framing"""
+        response_data = b''
+        while True:
+            chunk = self.socket.recv(65536)
+            if not chunk:
+                raise ConnectionError("Connection closed by server")
+            response_data += chunk
+            
+            # Only a buffer ending in a closing brace can hold the full message
+            if not response_data.rstrip().endswith(b'}'):
+                continue
+            try:
+                return json.loads(response_data.decode('utf-8'))
+            except json.JSONDecodeError:
+                continue  # Keep receiving
+    
+    def _recv_message(self):
+        """Receive one framed response; a binary body is attached under "body" as a memoryview"""
+        kind, payload = protocol.recv_frame(self.socket)
+        message, body = protocol.decode_message(kind, payload)
+        if body is not None:
+            message["body"] = body
+        return message
+    
     def disconnect(self):
         """Disconnect from the server"""
         if self.socket:
@@ -43,31 +82,59 @@ class QgisMCPClient:
         }
         
         try:
-            # Send the command
-            self.socket.sendall(json.dumps(command).encode('utf-8'))
-            
-            # Receive the response
-            response_data = b''
-            while True:
-                chunk = self.socket.recv(4096)
-                if not chunk:
-                    break
-                response_data += chunk
-                
-                # Try to decode as JSON to see if it's complete
-                try:
-                    json.loads(response_data.decode('utf-8'))
-                    break  # Valid JSON, we have the full message
-                except json.JSONDecodeError:
-                    continue  # Keep receiving
+            if self.framed:
+                self.socket.sendall(protocol.encode_json(command))
+                return self._recv_message()
             
-            # Parse and return the response
-            return json.loads(response_data.decode('utf-8'))
+            self.socket.sendall(json.dumps(command).encode('utf-8'))
+            return self._recv_legacy()
             
         except Exception as e:
             print(f"Error sending command: {str(e)}")
             return None
-    
+
+    def send_commands(self, commands):
+        """Send several (command_type, params) pairs at once and return the responses in order
+
+        With a framed connection every command is tagged with a request ID and
+        written before any response is read, so the server can work through
+        them without waiting on a round trip per command.
+        """
+        if not self.socket:
+            print("Not connected to server")
+            return None
+
+        if not self.framed:
+            return [self.send_command(command_type, params) for command_type, params in commands]
+
+        try:
+            requests = []
+            for command_type, params in commands:
+                self.next_id += 1
+                requests.append({"id": self.next_id, "type": command_type, "params": params or {}})
+            self.socket.sendall(b''.join(protocol.encode_json(request) for request in requests))
+
+            responses = {}
+            while len(responses) < len(requests):
+                response = self._recv_message()
+                responses[response.get("id")] = response
+            return [responses.get(request["id"]) for request in requests]
+
+        except Exception as e:
+            print(f"Error sending commands: {str(e)}")
+            return None
+
+    def send_batch(self, steps, stop_on_error=True):
+        """Run (command_type, params) steps in order in one round trip
+
+        Params may refer to an earlier step's response with "$<step>.<path>"
+        strings, e.g. "$0.layer_id".  The result holds one response per step.
+        """
+        return self.send_command("batch", {
+            "steps": [{"type": command_type, "params": params or {}} for command_type, params in steps],
+            "stop_on_error": stop_on_error
+        })
+
     def ping(self):
         """Simple ping command to check server connectivity"""
         return self.send_command("ping")
@@ -76,13 +143,24 @@ class QgisMCPClient:
         """Get QGIS information"""
         return self.send_command("get_qgis_info")
     
+    def get_metrics(self):
+        """Get the server's stage timings, cache statistics and execute_code timings per snippet"""
+        return self.send_command("get_metrics")
+    
     def get_project_info(self):
         """Get current project information"""
         return self.send_command("get_project_info")
     
-    def execute_code(self, code):
-        """Execute arbitrary PyQGIS code"""
-        return self.send_command("execute_code", {"code": code})
+    def execute_code(self, code, session=None, reset_session=False):
+        """Execute arbitrary PyQGIS code
+
+        With a session name, variables the code defines are kept for the
+        next execute_code call in the same session.
+        """
+        params = {"code": code}
+        if session:
+            params.update(session=session, reset_session=reset_session)
+        return self.send_command("execute_code", params)
     
     def add_vector_layer(self, path, name=None, provider="ogr"):
         """Add a vector layer to the project"""
@@ -106,6 +184,17 @@ class QgisMCPClient:
             
         return self.send_command("add_raster_layer", params)
     
+    def add_layers(self, paths, kind="auto", provider=None):
+        """Add many layers at once; paths may contain glob patterns
+
+        The reply lists the outcome of every path, so some layers can fail
+        while the others are added.
+        """
+        params = {"paths": paths, "kind": kind}
+        if provider:
+            params["provider"] = provider
+        return self.send_command("add_layers", params)
+    
     def get_layers(self):
         """Get all layers in the project"""
         return self.send_command("get_layers")
@@ -118,36 +207,140 @@ class QgisMCPClient:
         """Zoom to a layer's extent"""
         return self.send_command("zoom_to_layer", {"layer_id": layer_id})
     
-    def get_layer_features(self, layer_id, limit=10):
-        """Get features from a vector layer"""
-        return self.send_command("get_layer_features", {"layer_id": layer_id, "limit": limit})
+    def get_layer_features(self, layer_id, limit=10, **options):
+        """Get one page of features from a vector layer
+
+        Options: offset, fields, no_geometry, expression, bbox, page_token and
+        format.  With format "columnar" or "arrow" the result holds a decoded
+        "batch" (a ColumnarBatch of NumPy views, or a pyarrow Table) instead of
+        a "features" list.
+        """
+        params = {"layer_id": layer_id, "limit": limit}
+        params.update(options)
+        response = self.send_command("get_layer_features", params)
+        if response and "body" in response:
+            result = response["result"]
+            result["batch"] = decode_batch(result["batch"], response.pop("body"))
+        return response
+    
+    def iter_layer_features(self, layer_id, limit=0, chunk_size=1000, **options):
+        """Yield features as the server streams them; returns the query summary at the end
+
+        A limit of 0 reads every matching feature.  With a binary format every
+        item is a decoded batch of up to chunk_size features.
+        """
+        if not self.framed:
+            response = self.get_layer_features(layer_id, limit, **options) or {}
+            yield from response.get("result", {}).get("features", [])
+            return response.get("result")
+        
+        params = {"layer_id": layer_id, "limit": limit, "stream": True, "chunk_size": chunk_size}
+        params.update(options)
+        self.socket.sendall(protocol.encode_json({"type": "get_layer_features", "params": params}))
+        finished = False
+        try:
+            while True:
+                message = self._recv_message()
+                if message.get("status") == "partial" and "body" in message:
+                    yield decode_batch(message["result"]["batch"], message["body"])
+                elif message.get("status") == "partial":
+                    yield from message["result"]["features"]
+                else:
+                    finished = True
+                    if message.get("status") == "success":
+                        return message["result"]
+                    raise RuntimeError(message.get("message", "Feature stream failed"))
+        finally:
+            # Stopping early leaves the rest of the stream unread on the socket
+            if not finished:
+                self.disconnect()
     
     def execute_processing(self, algorithm, parameters):
-        """Execute a processing algorithm"""
+        """Run a processing algorithm and wait for its outputs; see submit_job for background runs"""
         return self.send_command("execute_processing", {
             "algorithm": algorithm,
             "parameters": parameters
         })
     
-    def save_project(self, path=None):
-        """Save the current project"""
-        params = {}
+    def submit_job(self, algorithm, parameters):
+        """Queue a processing algorithm as a background job"""
+        return self.send_command("submit_job", {
+            "algorithm": algorithm,
+            "parameters": parameters
+        })
+    
+    def job_status(self, job_id):
+        """Get the status and progress of a job"""
+        return self.send_command("job_status", {"job_id": job_id})
+    
+    def job_result(self, job_id):
+        """Get the outputs of a finished job"""
+        return self.send_command("job_result", {"job_id": job_id})
+    
+    def cancel_job(self, job_id):
+        """Cancel a queued or running job"""
+        return self.send_command("cancel_job", {"job_id": job_id})
+    
+    def wait_for_job(self, job_id, poll_interval=0.5, timeout=None):
+        """Poll a job until it finishes and return job_result's response"""
+        deadline = time.monotonic() + timeout if timeout else None
+        while True:
+            response = self.job_status(job_id)
+            if not response or response.get("status") != "success":
+                return response
+            if response["result"]["status"] in ("succeeded", "failed", "cancelled"):
+                return self.job_result(job_id)
+            if deadline and time.monotonic() > deadline:
+                return {"status": "error", "message": f"Timed out waiting for job {job_id}"}
+            time.sleep(poll_interval)
+    
+    def save_project(self, path=None, mode="full", force=False):
+        """Save the current project
+
+        Nothing is written when the project has not changed since the last
+        save, unless force is set.  mode "fast" writes an uncompressed .qgs
+        and "background" compresses a .qgz off the QGIS main thread; the
+        reply reports bytes_written and elapsed_ms.
+        """
+        params = {"mode": mode}
         if path:
             params["path"] = path
+        if force:
+            params["force"] = True
             
         return self.send_command("save_project", params)
     
-    def load_project(self, path):
-        """Load a project"""
-        return self.send_command("load_project", {"path": path})
+    def load_project(self, path, lazy=False, trust_metadata=True):
+        """Load a project
+
+        With lazy the reply is a job: the project file is read without
+        opening any layer, then the layers are opened one at a time, so the
+        first ones can be queried while the rest load.  Follow it with
+        wait_for_job or job_status.
+        """
+        params = {"path": path}
+        if lazy:
+            params.update(lazy=True, trust_metadata=trust_metadata)
+        return self.send_command("load_project", params)
     
-    def render_map(self, path, width=800, height=600):
-        """Render the current map view to an image"""
-        return self.send_command("render_map", {
-            "path": path,
+    def render_map(self, path=None, width=800, height=600, **options):
+        """Render the current map view to an image
+
+        Without a path the image is returned in memory: response["body"] holds
+        the encoded bytes.  Options: format (png/jpeg/webp), quality, dpi.
+        """
+        params = {
             "width": width,
             "height": height
-        })
+        }
+        if path:
+            params["path"] = path
+        params.update(options)
+        return self.send_command("render_map", params)
+    
+    def render_tile(self, z, x, y, size=256):
+        """Render an XYZ tile of the canvas layers; the PNG bytes are in response["body"]"""
+        return self.send_command("render_tile", {"z": z, "x": x, "y": y, "size": size})
 
 
 def print_json(data):
@@ -0,0 +1,9 @@
+import os
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# The plugin is imported as a package, the backend modules by their bare names as in src/qgis_mcp
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "src", "qgis_mcp"))
+os.environ.setdefault("INTENT_CACHE_DB", "")
@@ -0,0 +1,97 @@
+import json
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+from starlette.testclient import TestClient
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "benchmarks"))
+
+from async_server import AsyncQGISAutomation, AsyncQgisConnection, create_app
+from fake_plugin import FakePlugin
+
+
+class FakeCompletions:
+    """AsyncOpenAI stand-in that always answers with one command"""
+
+    def __init__(self, command):
+        self.command = command
+        self.calls = 0
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        content = json.dumps(self.command)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+@pytest.fixture
+def completions():
+    return FakeCompletions({"command": "aggregate", "params": {"layer_id": "points_0"}})
+
+
+@pytest.fixture
+def client(completions):
+    plugin = FakePlugin(layers=2, features=100).start()
+    app = create_app(lambda: AsyncQGISAutomation(
+        openai_client=SimpleNamespace(chat=SimpleNamespace(completions=completions)),
+        qgis=AsyncQgisConnection(port=plugin.port)
+    ))
+    with TestClient(app) as client:
+        yield client
+    plugin.stop()
+
+
+def sse_events(text):
+    events = []
+    for block in text.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def test_command_stream_reports_each_stage(client):
+    response = client.post("/api/command/stream", json={"prompt": "total population of points 0", "session_id": "t"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = sse_events(response.text)
+    assert [event for event, _ in events] == ["progress", "intent_parsed", "dispatched", "result"]
+    assert events[-1][1]["status"] == "success"
+
+
+def test_tiles_and_renders_are_served(client):
+    tile = client.get("/api/tiles/3/4/2.png")
+    assert tile.status_code == 200
+    assert tile.headers["content-type"] == "image/png"
+    assert len(tile.content) == 256 * 256 // 8
+
+    image = client.get("/api/render?width=80&height=60")
+    assert image.status_code == 200
+    assert len(image.content) == 80 * 60 // 8
+    assert image.headers["etag"]
+
+
+def test_render_rejects_bad_sizes(client):
+    assert client.get("/api/render?width=wide").status_code == 400
+
+
+def test_llm_commands_are_cached_only_after_they_succeed(client, completions):
+    completions.command = {"command": "aggregate", "params": {"layer_id": "missing"}}
+    for _ in range(2):
+        assert client.post("/api/command", json={"prompt": "total population of points 0"}).json()["status"] == "error"
+    assert completions.calls == 2
+
+    completions.command = {"command": "aggregate", "params": {"layer_id": "points_0"}}
+    for _ in range(2):
+        assert client.post("/api/command", json={"prompt": "total population of points 0"}).json()["status"] == "success"
+    assert completions.calls == 3
+
+
+def test_session_prompts_use_the_cache_unless_they_refer_to_earlier_turns(client, completions):
+    client.post("/api/command", json={"prompt": "total population of points 0", "session_id": "a"})
+    client.post("/api/command", json={"prompt": "total population of points 0", "session_id": "a"})
+    assert completions.calls == 1
+
+    client.post("/api/command", json={"prompt": "total population of that layer", "session_id": "a"})
+    client.post("/api/command", json={"prompt": "total population of that layer", "session_id": "a"})
+    assert completions.calls == 3
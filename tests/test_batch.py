@@ -0,0 +1,23 @@
+import pytest
+
+from qgis_mcp_plugin.batch import StepReferenceError, resolve_references
+
+RESPONSES = [
+    {"status": "success", "layer_id": "roads_1"},
+    {"status": "success", "result": {"layers": [{"id": "a"}, {"id": "b"}]}}
+]
+
+
+def test_references_resolve_in_response_and_result():
+    params = {"layer_id": "$0.layer_id", "ids": ["$1.layers.1.id", "$1.result.layers.0.id"], "keep": "$x"}
+    assert resolve_references(params, RESPONSES) == {"layer_id": "roads_1", "ids": ["b", "a"], "keep": "$x"}
+
+
+def test_reference_to_a_step_that_has_not_run():
+    with pytest.raises(StepReferenceError):
+        resolve_references("$2.layer_id", RESPONSES)
+
+
+def test_missing_path():
+    with pytest.raises(StepReferenceError):
+        resolve_references("$1.layers.5.id", RESPONSES)
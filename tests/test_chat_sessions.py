@@ -0,0 +1,48 @@
+from chat_sessions import ChatSessions, digest_result, message_tokens
+
+SYSTEM = [{"role": "system", "content": "You are a QGIS automation assistant."}]
+
+
+def test_turns_follow_the_layers_and_precede_the_prompt():
+    sessions = ChatSessions()
+    session = sessions.get("tab")
+    sessions.record(session, "add roads.shp", {"command": "add_vector_layer"}, {"status": "success", "layer_id": "r1"})
+    messages = sessions.messages(session, SYSTEM, "- roads", "zoom to it")
+    assert messages[0] == SYSTEM[0]
+    assert messages[1]["content"].startswith("Layers in the current project:")
+    assert messages[2] == {"role": "user", "content": "add roads.shp"}
+    assert '"layer_id":"r1"' in messages[4]["content"]
+    assert messages[-1] == {"role": "user", "content": "zoom to it"}
+
+
+def test_old_turns_are_folded_into_the_summary():
+    sessions = ChatSessions(recent_turns=4)
+    session = sessions.get("tab")
+    for index in range(5):
+        sessions.record(session, f"prompt {index}", {"command": "ping"}, {"status": "success"})
+    assert len(session.summary) == 3
+    assert len(session.turns) == 2
+    messages = sessions.messages(session, SYSTEM, None, "next")
+    assert messages[1]["content"].startswith("Earlier in this conversation:")
+
+
+def test_messages_stay_within_the_budget():
+    sessions = ChatSessions(token_budget=300)
+    session = sessions.get("tab")
+    for index in range(50):
+        sessions.record(session, f"prompt {index} " + "x" * 100, {"command": "ping"}, {"status": "success"})
+    layers = "\n".join(f"- layer {index}" for index in range(200))
+    messages = sessions.messages(session, [], layers, "next")
+    assert message_tokens(messages) <= 300
+
+
+def test_sessions_without_id_and_drop():
+    sessions = ChatSessions()
+    assert sessions.get(None) is None
+    sessions.get("tab")
+    assert sessions.drop("tab")
+    assert not sessions.drop("tab")
+
+
+def test_digest_of_an_error():
+    assert digest_result({"status": "error", "message": "Layer not found"}) == "error: Layer not found"
@@ -0,0 +1,50 @@
+import struct
+
+from columnar import decode_batch
+from qgis_mcp_plugin import protocol
+from qgis_mcp_plugin.columnar import ColumnarEncoder
+
+COLUMNS = [("id", "int64"), ("name", "string"), ("density", "float64")]
+
+
+def round_trip(encoder):
+    message, buffers = encoder.finish()
+    kind, payload = protocol.FrameDecoder().feed(protocol.encode_binary(message, buffers))[0]
+    message, body = protocol.decode_message(kind, payload)
+    return decode_batch(message, body)
+
+
+def test_columns_and_geometry_survive_encoding():
+    encoder = ColumnarEncoder(COLUMNS)
+    point = struct.pack("<BIdd", 1, 1, 2.0, 3.0)
+    encoder.append(10, [1, "alpha", 0.5], point)
+    encoder.append(11, [2, "béta", 1.5], None)
+    batch = round_trip(encoder)
+    assert batch.count == 2
+    assert list(batch.fids) == [10, 11]
+    assert list(batch.columns["id"]) == [1, 2]
+    assert list(batch.columns["name"]) == ["alpha", "béta"]
+    assert list(batch.columns["density"]) == [0.5, 1.5]
+    assert bytes(batch.wkb(0)) == point
+    assert batch.wkb(1) is None
+
+
+def test_nulls_get_a_validity_mask():
+    encoder = ColumnarEncoder(COLUMNS, with_geometry=False)
+    encoder.append(1, [None, "a", 1.0])
+    encoder.append(2, [5, None, 2.0])
+    batch = round_trip(encoder)
+    assert list(batch.validity["id"]) == [0, 1]
+    assert list(batch.validity["name"]) == [1, 0]
+    assert "density" not in batch.validity
+    assert not batch.has_geometry
+
+
+def test_buffers_are_aligned():
+    encoder = ColumnarEncoder(COLUMNS)
+    encoder.append(1, [1, "abc", 1.0], b"\x01")
+    message, _ = encoder.finish()
+    offsets = [message["fids"]["offset"]]
+    for column in message["columns"]:
+        offsets += [column[key]["offset"] for key in ("values", "offsets") if column.get(key)]
+    assert all(offset % 8 == 0 for offset in offsets)
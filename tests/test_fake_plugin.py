@@ -0,0 +1,28 @@
+import base64
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "benchmarks"))
+
+from fake_plugin import FakePlugin
+from qgis_mcp_plugin import protocol
+
+PNG = b"\x89PNG\r\n\x1a\n\x00\x00\x00\r"
+
+
+@pytest.mark.parametrize("body", [PNG, [PNG[:4], PNG[4:]]])
+def test_legacy_clients_get_the_body_base64_encoded(body):
+    data = FakePlugin.encode(protocol.BinaryMessage({"status": "success"}, body), None, framed=False)
+    assert base64.b64decode(json.loads(data)["body_base64"]) == PNG
+
+
+@pytest.mark.parametrize("body", [PNG, [PNG[:4], PNG[4:]]])
+def test_framed_clients_get_a_binary_frame(body):
+    data = FakePlugin.encode(protocol.BinaryMessage({"status": "success"}, body), 3, framed=True)
+    kind, payload = protocol.FrameDecoder().feed(data)[0]
+    message, received = protocol.decode_message(kind, payload)
+    assert message == {"status": "success", "id": 3}
+    assert bytes(received) == PNG
@@ -0,0 +1,36 @@
+from intent_cache import IntentCache
+
+
+def test_key_ignores_case_whitespace_and_layer_order():
+    cache = IntentCache()
+    assert cache.key("Zoom  to roads!", [("b", "B"), ("a", "A")]) == cache.key("zoom to roads", [("a", "A"), ("b", "B")])
+    assert cache.key("zoom to roads", [("a", "A")]) != cache.key("zoom to roads", [])
+
+
+def test_key_depends_on_namespace():
+    assert IntentCache(namespace="a").key("zoom to roads", []) != IntentCache(namespace="b").key("zoom to roads", [])
+
+
+def test_entries_are_copies_and_expire():
+    cache = IntentCache(ttl=60)
+    cache.put("k", {"command": "get_layers", "params": {}})
+    cached = cache.get("k")
+    cached["params"]["x"] = 1
+    assert cache.get("k") == {"command": "get_layers", "params": {}}
+    cache.ttl = -1
+    assert cache.get("k") is None
+    assert cache.stats()["hits"] == 2
+
+
+def test_lru_bound():
+    cache = IntentCache(max_entries=2)
+    for key in "abc":
+        cache.put(key, {"command": key})
+    assert cache.get("a") is None
+    assert cache.get("c") == {"command": "c"}
+
+
+def test_persistent_entries_survive_a_restart(tmp_path):
+    path = str(tmp_path / "intents.db")
+    IntentCache(db_path=path).put("k", {"command": "get_layers"})
+    assert IntentCache(db_path=path).get("k") == {"command": "get_layers"}
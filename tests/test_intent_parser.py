@@ -0,0 +1,43 @@
+from intent_parser import FastIntentParser
+
+LAYERS = [("roads_1", "roads"), ("layer_1", "Layer 1"), ("parcels_2", "parcels")]
+
+
+def parse(prompt, layers=LAYERS):
+    return FastIntentParser().parse(prompt, layers)
+
+
+def test_layer_names_resolve_to_ids():
+    assert parse("Zoom to the roads layer.") == ({"command": "zoom_to_layer", "params": {"layer_id": "roads_1"}}, 1.0)
+    assert parse("show 5 features from parcels")[0] == {
+        "command": "get_layer_features", "params": {"limit": 5, "layer_id": "parcels_2"}
+    }
+
+
+def test_layer_named_layer():
+    assert parse("zoom to layer 1")[0]["params"]["layer_id"] == "layer_1"
+
+
+def test_paths_pick_the_command():
+    assert parse("add /data/dem.tif")[0] == {"command": "add_raster_layer", "params": {"path": "/data/dem.tif"}}
+    assert parse("open /data/site.qgz")[0]["command"] == "load_project"
+    assert parse("load data/*.gpkg")[0] == {"command": "add_layers", "params": {"paths": ["data/*.gpkg"]}}
+
+
+def test_fuzzy_match_has_lower_confidence():
+    command, confidence = parse("zoom to rods")
+    assert command["params"]["layer_id"] == "roads_1"
+    assert confidence < 1.0
+
+
+def test_unknown_prompt_falls_through():
+    assert parse("buffer the roads by 10 metres") == (None, 0.0)
+
+
+def test_remove_layer_needs_an_exact_name():
+    layers = [("parcels_2024", "parcels_2024"), ("roads_main", "roads_main")]
+    assert parse("remove parcels_2025", layers) == (None, 0.0)
+    assert parse("remove roads_mains", layers) == (None, 0.0)
+    assert parse("remove the roads_main layer", layers) == (
+        {"command": "remove_layer", "params": {"layer_id": "roads_main"}}, 1.0
+    )
@@ -0,0 +1,26 @@
+import pytest
+
+from json_stream import IncrementalJSONParser
+
+
+def test_object_is_found_across_deltas_and_prose():
+    text = 'Sure:\n```json\n{"command": "zoom_to_layer", "params": {"layer_id": "a}b"}}\n```\nmore'
+    parser = IncrementalJSONParser()
+    results = [parser.feed(text[i:i + 3]) for i in range(0, len(text), 3)]
+    assert parser.command == "zoom_to_layer"
+    assert parser.close() == {"command": "zoom_to_layer", "params": {"layer_id": "a}b"}}
+    assert results[-1] == parser.result
+
+
+def test_command_is_known_before_the_object_ends():
+    parser = IncrementalJSONParser()
+    parser.feed('{"command": "get_layers", "params": {')
+    assert parser.command == "get_layers"
+    assert not parser.done
+
+
+def test_stream_without_object():
+    parser = IncrementalJSONParser()
+    parser.feed("no json here")
+    with pytest.raises(ValueError):
+        parser.close()
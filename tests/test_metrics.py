@@ -0,0 +1,44 @@
+import metrics
+from metrics import Metrics, prometheus_text
+from qgis_mcp_plugin import metrics as plugin_metrics
+
+
+def test_snapshot_and_prometheus_text():
+    metrics = Metrics()
+    metrics.observe("execute_seconds", 0.003, command="ping")
+    metrics.observe("execute_seconds", 2.0, command="ping")
+    metrics.inc("commands_total", command="ping", status="success")
+    snapshot = metrics.snapshot()
+    histogram = snapshot["histograms"][0]
+    assert histogram["count"] == 2
+    assert dict(histogram["buckets"])[0.005] == 1
+    text = prometheus_text(snapshot, "qgis_mcp_")
+    assert "# TYPE qgis_mcp_execute_seconds histogram" in text
+    assert 'qgis_mcp_execute_seconds_bucket{command="ping",le="+Inf"} 2' in text
+    assert 'qgis_mcp_commands_total{command="ping",status="success"} 1' in text
+
+
+def test_span_records_on_error():
+    metrics = Metrics()
+    try:
+        with metrics.span("llm_seconds"):
+            raise RuntimeError
+    except RuntimeError:
+        pass
+    assert metrics.snapshot()["histograms"][0]["count"] == 1
+
+
+def test_none_label_values_do_not_break_the_snapshot():
+    metrics = Metrics()
+    metrics.observe("execute_seconds", 0.1, command="ping")
+    metrics.observe("execute_seconds", 0.1, command=None)
+    metrics.inc("commands_total", command=None, status="error")
+    metrics.inc("commands_total", command="ping", status="success")
+    snapshot = metrics.snapshot()
+    assert [histogram["labels"]["command"] for histogram in snapshot["histograms"]] == ["None", "ping"]
+    assert 'commands_total{command="None",status="error"} 1' in prometheus_text(snapshot, "")
+
+
+def test_plugin_and_backend_copies_are_identical():
+    with open(metrics.__file__, "rb") as backend, open(plugin_metrics.__file__, "rb") as plugin:
+        assert backend.read() == plugin.read()
@@ -0,0 +1,56 @@
+import pytest
+
+import protocol
+from qgis_mcp_plugin import protocol as plugin_protocol
+
+
+def test_json_frame_round_trip():
+    data = protocol.encode_json({"type": "ping", "id": 7})
+    frames = protocol.FrameDecoder().feed(data)
+    assert len(frames) == 1
+    kind, payload = frames[0]
+    assert kind == protocol.KIND_JSON
+    assert protocol.decode_json(payload) == {"type": "ping", "id": 7}
+
+
+def test_decoder_reassembles_frames_split_at_any_byte():
+    data = protocol.encode_json({"a": 1}) + protocol.encode_binary({"b": 2}, b"body")
+    decoder = protocol.FrameDecoder()
+    frames = []
+    for index in range(len(data)):
+        frames += decoder.feed(data[index:index + 1])
+    assert decoder.idle
+    assert [protocol.decode_message(kind, payload)[0] for kind, payload in frames] == [{"a": 1}, {"b": 2}]
+
+
+@pytest.mark.parametrize("body", [b"\x89PNG\r\n", [b"ab", bytearray(b"cd"), memoryview(b"ef")]])
+def test_binary_frame_round_trip(body):
+    kind, payload = protocol.FrameDecoder().feed(protocol.encode_binary({"status": "success"}, body))[0]
+    message, received = protocol.decode_message(kind, payload)
+    assert message == {"status": "success"}
+    expected = body if isinstance(body, bytes) else b"".join(bytes(part) for part in body)
+    assert bytes(received) == expected
+
+
+def test_bad_magic_is_rejected():
+    with pytest.raises(protocol.ProtocolError):
+        protocol.FrameDecoder().feed(b"XX" + bytes(6))
+
+
+def test_looks_framed():
+    assert protocol.looks_framed(b"Q")
+    assert protocol.looks_framed(protocol.encode_json({}))
+    assert not protocol.looks_framed(b'{"type": "ping"}')
+
+
+def test_plugin_and_backend_copies_are_identical():
+    with open(protocol.__file__, "rb") as backend, open(plugin_protocol.__file__, "rb") as plugin:
+        assert backend.read() == plugin.read()
+
+
+@pytest.mark.parametrize("body", [b"\x89PNG\r\n\x1a\n\x00\x00\x00\r", [b"\x89PNG", bytearray(b"\r\n"), memoryview(b"\x1a\n")]])
+def test_body_bytes_keeps_bytes_bodies_intact(body):
+    # A bytes body must not be iterated as integers (each byte N became N zero bytes)
+    expected = body if isinstance(body, bytes) else b"\x89PNG\r\n\x1a\n"
+    assert protocol.body_bytes(body) == expected
+    assert plugin_protocol.body_bytes(body) == expected
@@ -0,0 +1,78 @@
+import os
+import zipfile
+
+import pytest
+
+from qgis_mcp_plugin.saving import BackgroundSave, ProjectSaver
+
+
+class FakeProject:
+    """The parts of QgsProject that ProjectSaver uses"""
+
+    def __init__(self):
+        self.file_name = ""
+        self.dirty = True
+        self.writes = 0
+
+    def isDirty(self):
+        return self.dirty
+
+    def setDirty(self, dirty):
+        self.dirty = dirty
+
+    def fileName(self):
+        return self.file_name
+
+    def setFileName(self, path):
+        self.file_name = path
+
+    def write(self, path):
+        with open(path, "w") as project_file:
+            project_file.write("<qgis/>")
+        self.file_name = path
+        self.dirty = False
+        self.writes += 1
+        return True
+
+    def error(self):
+        return ""
+
+
+@pytest.mark.parametrize("mode", ["full", "fast"])
+def test_unchanged_saves_are_skipped(tmp_path, mode):
+    project = FakeProject()
+    saver = ProjectSaver()
+    path = str(tmp_path / "a.qgz")
+    results = [saver.save(project, path, mode) for _ in range(3)]
+    assert project.writes == 1
+    assert [result["skipped"] for result in results] == [False, True, True]
+    if mode == "fast":
+        assert results[-1]["path"] == str(tmp_path / "a.qgs")
+
+
+def test_background_save_zips_the_project(tmp_path):
+    project = FakeProject()
+    path = str(tmp_path / "a.qgz")
+    saved = ProjectSaver().save(project, path, "background")
+    assert isinstance(saved, BackgroundSave)
+    result = saved.finish(saved.work())
+    assert result["bytes_written"] == os.path.getsize(path)
+    assert zipfile.ZipFile(path).namelist() == ["a.qgs"]
+    assert os.listdir(tmp_path) == ["a.qgz"]
+    assert project.fileName() == path and not project.isDirty()
+
+
+def test_failed_background_compression_leaves_the_project_dirty(tmp_path):
+    project = FakeProject()
+    saver = ProjectSaver()
+    path = str(tmp_path / "a.qgz")
+    saved = saver.save(project, path, "background")
+
+    def fail(*args):
+        raise OSError("disk full")
+    saver.compress = fail
+    with pytest.raises(OSError):
+        saved.finish(saved.work())
+    assert project.isDirty()
+    assert not isinstance(saver.save(project, path, "full"), BackgroundSave)
+    assert project.writes == 2